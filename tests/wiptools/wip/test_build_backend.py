@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the PEP 517 build backend `wiptools.build_backend`."""
+
+import json
+from pathlib import Path
+import sys
+import tarfile
+import zipfile
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import test_workspace
+import wiptools.build_backend as build_backend
+import wiptools.toolchain as toolchain
+import wiptools.utils as utils
+from wiptools.wip.wip_build import EXT_SUFFIX, BinaryExtensionBuilder
+
+
+def test_pep440_constraint():
+    assert build_backend.pep440_constraint('^1.2.3') == '>=1.2.3,<2'
+    assert build_backend.pep440_constraint('^0.2.3') == '>=0.2.3,<0.3'
+    assert build_backend.pep440_constraint('^0.0.3') == '>=0.0.3,<0.0.4'
+    assert build_backend.pep440_constraint('~1.2.3') == '>=1.2.3,<1.3'
+    assert build_backend.pep440_constraint('~1') == '>=1,<2'
+    assert build_backend.pep440_constraint('1.2') == '==1.2'
+    assert build_backend.pep440_constraint('>=1.0, <3') == '>=1.0,<3'
+    assert build_backend.pep440_constraint('*') == ''
+    assert build_backend.pep440_constraint('^1.2.3-beta') == '>=1.2.3-beta,<2'
+    assert build_backend.pep440_constraint('~2.0rc1') == '>=2.0rc1,<2.1'
+    assert build_backend.pep440_constraint('>= 1.0.post1, < 2.0.dev0') == '>=1.0.post1,<2.0.dev0'
+    assert build_backend.pep440_constraint('1.2.*') == '==1.2.*'
+    for constraint in ('^1 || ^2', '^1.x', '>=one', '=>1.0'):
+        with pytest.raises(build_backend.MetadataError):
+            build_backend.pep440_constraint(constraint)
+    assert build_backend.requirement('numpy', '^1.24') == 'numpy>=1.24,<2'
+    assert build_backend.requirement('mkdocstrings', {'extras': ['python'], 'version': '^0.22.0', 'python': '^3.9'}) \
+        == 'mkdocstrings[python]>=0.22.0,<0.23; python_version >= "3.9" and python_version < "4"'
+
+
+def make_project(workspace: Path, binary: bool = False):
+    """Create a minimal wip project `foo` in the workspace."""
+    project = workspace / 'foo'
+    (project / 'foo' / 'bar').mkdir(parents=True)
+    (project / 'pyproject.toml').write_text(
+        '[tool.poetry]\nname = "foo"\nversion = "1.0.0"\ndescription = "Foo"\nauthors = ["A B <a@b.c>"]\n'
+        'readme = "README.md"\n\n[tool.poetry.dependencies]\npython = "^3.9"\nnumpy = "^1.24"\n\n'
+        '[tool.poetry.scripts]\nfoo = "foo.cli:main"\n'
+    )
+    (project / 'README.md').write_text('# Foo\n')
+    with open(project / 'wip-cookiecutter.json', mode='w') as fp:
+        json.dump({'project_name': 'foo', 'package_name': 'foo'}, fp)
+    (project / 'foo' / '__init__.py').write_text('"""foo"""\n')
+    (project / 'foo' / 'cli.py').write_text('def main(): pass\n')
+    (project / 'foo' / 'bar' / '__init__.py').touch()
+    (project / 'foo' / '__pycache__').mkdir()
+    (project / 'foo' / '__pycache__' / 'cli.cpython-311.pyc').touch()
+    if binary:
+        component = project / 'foo' / 'baz'
+        (component / '_cmake_build').mkdir(parents=True)
+        (component / 'baz.cpp').touch()
+        (component / 'CMakeLists.txt').touch()
+        (component / f'baz{EXT_SUFFIX}').write_bytes(b'binary')
+    return project
+
+
+def test_wheel_pure_python():
+    workspace = test_workspace(clear=True)
+    project = make_project(workspace)
+    with utils.in_directory(project):
+        filename = build_backend.build_wheel(str(workspace / 'dist'))
+        assert filename == 'foo-1.0.0-py3-none-any.whl'
+        hash1 = (workspace / 'dist' / filename).read_bytes()
+        assert build_backend.build_wheel(str(workspace / 'dist')) == filename
+        assert (workspace / 'dist' / filename).read_bytes() == hash1  # reproducible
+        assert build_backend.get_requires_for_build_wheel() == []
+
+    with zipfile.ZipFile(workspace / 'dist' / filename) as whl:
+        names = whl.namelist()
+        assert names == [ 'foo/__init__.py', 'foo/cli.py', 'foo/bar/__init__.py'
+                        , 'foo-1.0.0.dist-info/METADATA', 'foo-1.0.0.dist-info/WHEEL'
+                        , 'foo-1.0.0.dist-info/entry_points.txt', 'foo-1.0.0.dist-info/RECORD'
+                        ]
+        metadata = whl.read('foo-1.0.0.dist-info/METADATA').decode()
+        assert 'Requires-Python: >=3.9,<4\n' in metadata
+        assert 'Requires-Dist: numpy>=1.24,<2\n' in metadata
+        assert metadata.endswith('# Foo\n')
+        assert whl.read('foo-1.0.0.dist-info/entry_points.txt') == b'[console_scripts]\nfoo = foo.cli:main\n'
+        assert len(whl.read('foo-1.0.0.dist-info/RECORD').decode().splitlines()) == len(names)
+
+
+def test_editable():
+    workspace = test_workspace(clear=True)
+    project = make_project(workspace)
+    with utils.in_directory(project):
+        assert build_backend.get_requires_for_build_editable() == []
+        dist_info = build_backend.prepare_metadata_for_build_editable(str(workspace / 'metadata'))
+        assert dist_info == 'foo-1.0.0.dist-info'
+        filename = build_backend.build_editable(str(workspace / 'dist'))
+    assert filename == 'foo-1.0.0-py3-none-any.whl'
+    with zipfile.ZipFile(workspace / 'dist' / filename) as whl:
+        assert whl.namelist() == [ 'foo.pth', 'foo-1.0.0.dist-info/METADATA', 'foo-1.0.0.dist-info/WHEEL'
+                                 , 'foo-1.0.0.dist-info/entry_points.txt', 'foo-1.0.0.dist-info/RECORD'
+                                 ]
+        assert whl.read('foo.pth').decode() == f"{project}\n"
+
+
+def test_wheel_files_binary():
+    workspace = test_workspace(clear=True)
+    project = make_project(workspace, binary=True)
+    (project / 'foo' / 'libnanobind.so').touch()
+    # left over from a build for another Python version
+    (project / 'foo' / 'baz' / 'baz.cpython-27-x86_64-linux-gnu.so').touch()
+    with utils.in_directory(project):
+        assert build_backend.wheel_tag(project / 'foo').startswith(f"cp{sys.version_info.major}")
+        files = [p.relative_to(project / 'foo').as_posix() for p in build_backend.wheel_files(project / 'foo')]
+        assert files == ['__init__.py', 'cli.py', 'bar/__init__.py', f'baz/baz{EXT_SUFFIX}']
+        assert 'libnanobind.so' in [p.name for p in build_backend.wheel_files(project / 'foo', nanobind_shared=True)]
+
+        filename = build_backend.build_sdist(str(workspace / 'dist'))
+    with tarfile.open(workspace / 'dist' / filename) as tar:
+        names = tar.getnames()
+    assert 'foo-1.0.0/foo/baz/baz.cpp' in names
+    assert 'foo-1.0.0/PKG-INFO' in names
+    assert not [name for name in names if name.endswith('.so') or '_cmake_build' in name or '__pycache__' in name]
+
+
+def test_wheel_binary(monkeypatch):
+    workspace = test_workspace(clear=True)
+    project = make_project(workspace, binary=True)
+    (project / 'foo' / 'baz' / f'baz{EXT_SUFFIX}').unlink()
+    probed = []
+    probe = toolchain.probe
+
+    def recording_probe(names=None, refresh=False):
+        probed.extend(names or [])
+        return probe(names, refresh)
+    monkeypatch.setattr(toolchain, 'probe', recording_probe)
+
+    configured = {}
+
+    def build_ext(self, path_to_component):
+        configured.update(self.configure_stamp(path_to_component)['toolchain'])
+        (path_to_component / f"{path_to_component.name}{self.python['ext_suffix']}").write_bytes(b'binary')
+    monkeypatch.setattr(BinaryExtensionBuilder, 'build_ext', build_ext)
+
+    with utils.in_directory(project):
+        filename = build_backend.build_wheel( str(workspace / 'dist')
+                                            , {'artifact-cache': 'false', 'stubs': 'false'}
+                                            )
+    # the binary extension module is built for the Python interpreter running the backend
+    assert configured['Python_EXECUTABLE'] == sys.executable
+    assert 'python' not in probed
+    tag = filename[:-len('.whl')].split('-', 2)[2]
+    assert tag == build_backend.wheel_tag(project / 'foo')
+    with zipfile.ZipFile(workspace / 'dist' / filename) as whl:
+        assert f'foo/baz/baz{EXT_SUFFIX}' in whl.namelist()
+    if sys.implementation.name == 'cpython':
+        assert EXT_SUFFIX.startswith(f".cpython-{tag.split('-')[0][2:]}")
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the component index."""
+
+import json
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+from helpers import test_workspace
+import wiptools.component_index as component_index
+import wiptools.utils as utils
+
+
+def make_package(workspace: Path) -> Path:
+    (workspace / 'wip-cookiecutter.json').write_text('{}')
+    package = workspace / 'foo'
+    for directory, filename in [ ('', '__init__.py'), ('bar', '__init__.py'), ('bar/baz_cpp', 'baz_cpp.cpp')
+                               , ('qux_f90', 'qux_f90.f90'), ('cli', '__main__.py'), ('data', 'data.txt')
+                               , ('data/nested', '__init__.py'), ('bar/baz_cpp/_cmake_build/CMakeFiles', 'x.cpp')
+                               , ('__pycache__', '__init__.py')
+                               ]:
+        (package / directory).mkdir(parents=True, exist_ok=True)
+        (package / directory / filename).touch()
+    return package
+
+
+def test_component_index():
+    workspace = test_workspace(clear=True)
+    package = make_package(workspace)
+    index = component_index.ComponentIndex(package)
+    expected = { package / 'bar': 'py', package / 'bar' / 'baz_cpp': 'cpp'
+               , package / 'cli': 'cli', package / 'qux_f90': 'f90'
+               }
+    assert index.components == expected
+    assert list(index.components) == list(expected)  # depth-first, sorted
+    assert index.rescanned == 6  # the package directory, its 4 subdirectories, and bar/baz_cpp
+    assert (workspace / component_index.INDEX).is_file()
+
+    # nothing changed: no directory is rescanned
+    index = component_index.ComponentIndex(package)
+    assert index.components == expected
+    assert index.rescanned == 0
+
+    # a new component: only the modified directory and the new one are rescanned
+    (package / 'bar' / 'new').mkdir()
+    (package / 'bar' / 'new' / '__init__.py').touch()
+    index = component_index.ComponentIndex(package)
+    assert index.components[package / 'bar' / 'new'] == 'py'
+    assert index.rescanned == 2
+
+    # a corrupt index is rebuilt
+    (workspace / component_index.INDEX).write_text('{')
+    assert component_index.ComponentIndex(package).components.keys() == index.components.keys()
+    with open(workspace / component_index.INDEX) as fp:
+        assert json.load(fp)['version'] == component_index.INDEX_VERSION
+
+
+def test_iter_components():
+    workspace = test_workspace(clear=True)
+    package = make_package(workspace)
+    components = []
+    utils.iter_components(package, apply=components.append)
+    assert components == [package / 'bar', package / 'bar' / 'baz_cpp', package / 'cli', package / 'qux_f90']
+    assert utils.component_type(package / 'bar' / 'baz_cpp') == 'cpp'
+    (package / 'bar' / 'baz_cpp' / 'baz_cpp.cpp').unlink()
+    assert utils.component_type(package / 'bar' / 'baz_cpp') == ''
+    assert utils.component_type(package / 'missing') == ''
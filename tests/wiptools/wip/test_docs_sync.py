@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the synchronization of the API reference with the components (`wip docs --sync`)."""
+
+import json
+import os
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import run_wip, test_workspace
+import wiptools.docs_sync as docs_sync
+from wiptools.project_state import ProjectState
+
+
+def make_project(workspace: Path) -> Path:
+    project = workspace / 'foo'
+    for component, filename in (('a', '__init__.py'), ('a/b_cpp', 'b_cpp.cpp'), ('c_f90', 'c_f90.f90')):
+        (project / 'foo' / component).mkdir(parents=True)
+        (project / 'foo' / component / filename).touch()
+    (project / 'foo' / '__init__.py').touch()
+    (project / 'docs').mkdir()
+    (project / 'docs' / 'index.md').touch()
+    (project / 'docs' / 'api-reference.md').write_text('# API reference\n\n::: foo\n::: foo.a')
+    (project / 'mkdocs.yml').touch()
+    (project / 'pyproject.toml').write_text('[tool.poetry]\nname = "foo"\n')
+    with open(project / 'wip-cookiecutter.json', mode='w') as fp:
+        json.dump({'project_name': 'foo', 'package_name': 'foo'}, fp)
+    return project
+
+
+def test_update_api_reference():
+    modules = {'foo.a': 'py', 'foo.a.b_cpp': 'cpp'}
+    text = docs_sync.update_api_reference('# API reference\n\n::: foo\n::: foo.a\n', modules)
+    assert text == f"# API reference\n\n::: foo\n\n{docs_sync.section(modules)}\n"
+    # the section is replaced in place, the rest is kept
+    modules = {'foo.a': 'py'}
+    assert docs_sync.update_api_reference(text + '\nMore text.\n', modules) == \
+        f"# API reference\n\n::: foo\n\n{docs_sync.section(modules)}\n\nMore text.\n"
+
+
+def test_sync(monkeypatch):
+    project = make_project(test_workspace(clear=True))
+    monkeypatch.chdir(project)
+    pages = project / 'docs' / 'api'
+
+    run_wip(['docs', '--sync'])
+    assert sorted(p.name for p in pages.iterdir()) == ['foo.a.b_cpp.md', 'foo.a.md', 'foo.c_f90.md']
+    assert '::: foo.a.b_cpp.b_cpp\n' in (pages / 'foo.a.b_cpp.md').read_text()
+    api_reference = (project / 'docs' / 'api-reference.md').read_text()
+    assert api_reference.count('::: foo.a') == 0
+    assert '[`foo.c_f90`](api/foo.c_f90.md)' in api_reference
+
+    # only the pages of components that changed are rewritten
+    mtimes = {p: p.stat().st_mtime_ns for p in pages.iterdir()}
+    os.utime(project / 'foo' / 'a' / 'b_cpp' / 'b_cpp.cpp', ns=(0, 0))
+    result = run_wip(['docs', '--sync'])
+    assert 'updated `docs/api/foo.a.b_cpp.md`' in result.output
+    assert '2 page(s) unchanged' in result.output
+    assert {p: p.stat().st_mtime_ns for p in pages.iterdir() if p.name != 'foo.a.b_cpp.md'} == \
+        {p: mtime for p, mtime in mtimes.items() if p.name != 'foo.a.b_cpp.md'}
+    assert (project / 'docs' / 'api-reference.md').read_text() == api_reference
+
+    # edited pages are restored, pages of removed components are removed
+    (pages / 'foo.a.md').write_text('edited')
+    (project / 'foo' / 'c_f90' / 'c_f90.f90').unlink()
+    (project / 'foo' / 'c_f90').rmdir()
+    result = run_wip(['docs', '--sync'])
+    assert 'removed `docs/api/foo.c_f90.md`' in result.output
+    assert sorted(p.name for p in pages.iterdir()) == ['foo.a.b_cpp.md', 'foo.a.md']
+    assert '::: foo.a\n' in (pages / 'foo.a.md').read_text()
+    assert 'foo.c_f90' not in (project / 'docs' / 'api-reference.md').read_text()
+
+
+def test_sync_failure():
+    project = make_project(test_workspace(clear=True))
+    # nothing is written if the command fails after synchronizing
+    with pytest.raises(SystemExit):
+        with ProjectState(project) as state:
+            assert docs_sync.sync(state)['written'] == ['foo.a', 'foo.a.b_cpp', 'foo.c_f90']
+            sys.exit(1)
+    assert not (project / 'docs' / 'api').exists()
+    assert not (project / docs_sync.CACHE).exists()
+    assert (project / 'docs' / 'api-reference.md').read_text() == '# API reference\n\n::: foo\n::: foo.a'
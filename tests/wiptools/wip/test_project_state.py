@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the project state."""
+
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+import tomlkit
+
+from helpers import test_workspace
+from wiptools.project_state import ProjectState
+
+
+def make_project(workspace: Path) -> Path:
+    project = workspace / 'foo'
+    (project / 'docs').mkdir(parents=True)
+    (project / 'docs' / 'api-reference.md').write_text('# API reference\n\n::: foo')
+    (project / 'pyproject.toml').write_text('[tool.poetry]\nname = "foo"  # the name\n\n[tool.poetry.scripts]\n')
+    (project / 'wip-cookiecutter.json').write_text('{"project_name": "foo", "package_name": "foo"}')
+    return project
+
+
+def test_project_state():
+    project = make_project(test_workspace(clear=True))
+    mtimes = {p: p.stat().st_mtime_ns for p in project.rglob('*') if p.is_file()}
+
+    # reading does not write anything
+    with ProjectState(project) as state:
+        assert state.cookiecutter_params['project_path'] == str(project)
+        assert state.pyproject['tool']['poetry']['name'] == 'foo'
+        assert state.api_reference.endswith('::: foo')
+        assert state.modified() == {}
+    assert mtimes == {p: p.stat().st_mtime_ns for p in mtimes}
+
+    # edits are written at the end, once
+    with ProjectState(project) as state:
+        state.pyproject['tool']['poetry']['scripts']['bar'] = 'foo.bar.__main__:main'
+        assert state.add_api_reference('foo.bar')
+        assert not state.add_api_reference('foo.bar')
+        state.cookiecutter_params['github_username'] = 'jdoe'
+        assert (project / 'pyproject.toml').stat().st_mtime_ns == mtimes[project / 'pyproject.toml']
+    assert (project / 'docs' / 'api-reference.md').read_text() == '# API reference\n\n::: foo\n::: foo.bar'
+    assert 'name = "foo"  # the name' in (project / 'pyproject.toml').read_text()
+    assert tomlkit.parse((project / 'pyproject.toml').read_text())['tool']['poetry']['scripts']['bar'] == \
+        'foo.bar.__main__:main'
+    with open(project / 'wip-cookiecutter.json') as fp:
+        assert json.load(fp) == {'project_name': 'foo', 'package_name': 'foo', 'github_username': 'jdoe'}
+
+    # nothing is written if the command fails
+    with pytest.raises(SystemExit):
+        with ProjectState(project) as state:
+            state.add_api_reference('foo.baz')
+            sys.exit(1)
+    assert 'foo.baz' not in (project / 'docs' / 'api-reference.md').read_text()
+    assert sorted(p.name for p in project.iterdir()) == ['.wip', 'docs', 'pyproject.toml', 'wip-cookiecutter.json']
+
+
+def test_pending_writes():
+    project = make_project(test_workspace(clear=True))
+    (project / 'docs' / 'old.md').write_text('old')
+
+    # other files are written and removed at the end, together with the project files
+    with ProjectState(project) as state:
+        state.add_api_reference('foo.bar')
+        state.write(Path('docs') / 'api' / 'foo.bar.md', '::: foo.bar', mtime_ns=10**18)
+        state.remove(Path('docs') / 'old.md')
+        assert not (project / 'docs' / 'api').exists()
+        assert (project / 'docs' / 'old.md').exists()
+    assert (project / 'docs' / 'api' / 'foo.bar.md').read_text() == '::: foo.bar'
+    assert (project / 'docs' / 'api' / 'foo.bar.md').stat().st_mtime_ns == 10**18
+    assert not (project / 'docs' / 'old.md').exists()
+
+    # if one file cannot be written, none is
+    with pytest.raises(OSError):
+        with ProjectState(project) as state:
+            state.add_api_reference('foo.baz')
+            state.write(Path('docs') / 'api' / 'foo.baz.md', '::: foo.baz')
+            state.remove(Path('docs') / 'api' / 'foo.bar.md')
+            state.write(Path('pyproject.toml') / 'not-a-directory', '')
+    assert 'foo.baz' not in (project / 'docs' / 'api-reference.md').read_text()
+    assert sorted(p.name for p in (project / 'docs').rglob('*')) == ['api', 'api-reference.md', 'foo.bar.md']
+
+
+def add_script(project: Path, name: str):
+    with ProjectState(project) as state:
+        state.pyproject['tool']['poetry']['scripts'][name] = f"foo.{name}.__main__:main"
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="the project lock is only available on POSIX systems")
+def test_concurrent_project_state():
+    project = make_project(test_workspace(clear=True))
+    names = [f"cli{i}" for i in range(8)]
+    processes = [multiprocessing.Process(target=add_script, args=(project, name)) for name in names]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    scripts = tomlkit.parse((project / 'pyproject.toml').read_text())['tool']['poetry']['scripts']
+    assert sorted(scripts) == names
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Startup benchmark for `wip`: `wip --version` and `wip info` must not pay for subcommands they do not use.
+
+The startup latency is measured relative to a Python process which only imports click, so that the test does not
+depend on the speed of the machine. Wall clock measurements are noisy on shared CI runners, so the timing test only
+runs if `$WIP_STARTUP_BENCHMARK` is set; `test_lazy_subcommands` guards against regressions deterministically. The
+allowed overhead (in seconds) can be changed with `$WIP_STARTUP_BUDGET`.
+"""
+
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import test_workspace
+
+
+STARTUP_BUDGET = float(os.environ.get('WIP_STARTUP_BUDGET', 0.15))
+
+
+def make_project() -> Path:
+    project = test_workspace(clear=True) / 'foo'
+    (project / 'foo' / 'bar').mkdir(parents=True)
+    (project / 'foo' / '__init__.py').touch()
+    (project / 'foo' / 'bar' / '__init__.py').touch()
+    (project / 'pyproject.toml').write_text('[tool.poetry]\nversion = "1.0.0"\nrepository = ""\nhomepage = ""\n')
+    with open(project / 'wip-cookiecutter.json', mode='w') as fp:
+        json.dump({'project_name': 'foo', 'package_name': 'foo'}, fp)
+    return project
+
+
+def run_python(code: str, cwd: Path) -> subprocess.CompletedProcess:
+    env = {**os.environ, 'PYTHONPATH': str(path)}
+    return subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def startup_time(code: str, cwd: Path, repeat: int = 5) -> float:
+    """Return the shortest wall clock time of running `code` in a fresh Python process."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(code, cwd)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+WIP = "import sys; from wiptools.wip.__main__ import main; main({args}, standalone_mode=False); " \
+      "print(sorted(m for m in sys.modules if m.startswith(('cookiecutter', 'wiptools.wip.wip_'))), file=sys.stderr)"
+
+
+def test_lazy_subcommands():
+    project = make_project()
+    completed_process = run_python(WIP.format(args=['--version']), project)
+    assert completed_process.stdout.startswith('wip CLI v')
+    assert completed_process.stderr.strip() == '[]'
+    completed_process = run_python(WIP.format(args=['info']), project)
+    assert 'foo [Python module]' in completed_process.stdout
+    assert completed_process.stderr.strip() == "['wiptools.wip.wip_info']"
+
+
+@pytest.mark.skipif(not os.environ.get('WIP_STARTUP_BENCHMARK'), reason="set $WIP_STARTUP_BENCHMARK to run")
+def test_startup_time():
+    project = make_project()
+    baseline = startup_time('import click', project)
+    for args in (['--version'], ['info']):
+        overhead = startup_time(WIP.format(args=args), project) - baseline
+        assert overhead < STARTUP_BUDGET, f"`wip {' '.join(args)}` startup overhead: {overhead:.3f}s"
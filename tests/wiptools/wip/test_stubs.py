@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the generation of stub files for binary extension modules."""
+
+import ast
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+from helpers import test_workspace
+import wiptools.stubs as stubs
+
+
+SIGNATURE = """\
+python module bar ! in
+    interface  ! in :bar
+        module tools ! in :bar:bar.f90
+            integer, optional :: counter=0
+            function norm(x) result (r) ! in :bar:bar.f90:tools
+                real(kind=8) dimension(:),intent(in) :: x
+                real(kind=8) :: r
+            end function norm
+        end module tools
+        subroutine add(x,y,z,n) ! in :bar:bar.f90
+            real(kind=8) dimension(n),intent(in) :: x
+            real(kind=8) dimension(n),intent(in),depend(n) :: y
+            real(kind=8) dimension(n),intent(out),depend(n) :: z
+            integer, optional,intent(in),check(shape(x, 0) == n),depend(x) :: n=shape(x, 0)
+        end subroutine add
+        subroutine stats(x,mean,flag) ! in :bar:bar.f90
+            real(kind=8) dimension(:),intent(in,out) :: x
+            real(kind=8) intent(out) :: mean
+            logical intent(out) :: flag
+        end subroutine stats
+    end interface
+end python module bar
+"""
+
+
+def test_f2py_stub():
+    stub = stubs.f2py_stub(SIGNATURE, 'foo.bar')
+    ast.parse(stub)
+    assert "    counter: int\n" in stub
+    assert "    def norm(x: numpy.typing.ArrayLike) -> float:\n" in stub
+    assert "\ntools: _tools\n" in stub
+    assert "\ndef add(x: numpy.typing.ArrayLike, y: numpy.typing.ArrayLike, n: int = ...) -> numpy.ndarray:\n" in stub
+    assert "\ndef stats(x: numpy.ndarray) -> tuple[numpy.ndarray, float, bool]:\n" in stub
+
+
+def test_update_stub():
+    project = test_workspace(clear=True) / 'foo'
+    component = project / 'foo' / 'bar'
+    (component / '_cmake_build' / 'f2py').mkdir(parents=True)
+    (component / '_cmake_build' / 'f2py' / 'bar.pyf').write_text(SIGNATURE)
+    extension = component.parent / 'bar.cpython-311-x86_64-linux-gnu.so'
+    extension.touch()
+    assert stubs.extension_module(project, extension) == 'foo.bar'
+
+    # the stub file is only written if the interface changed
+    assert stubs.update_stub(project, component, 'f90', extension)
+    path_to_stub = component.parent / 'bar.pyi'
+    assert path_to_stub.read_text() == stubs.f2py_stub(SIGNATURE, 'foo.bar')
+    assert not stubs.update_stub(project, component, 'f90', extension)
+    (component / '_cmake_build' / 'f2py' / 'bar.pyf').write_text(SIGNATURE.replace('add', 'plus'))
+    assert stubs.update_stub(project, component, 'f90', extension)
+    assert 'def plus(' in path_to_stub.read_text()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the built-in template engine."""
+
+import os
+from pathlib import Path
+import stat
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import test_workspace
+import wiptools.templates as templates
+import wiptools.utils as utils
+
+
+CONTEXT = { 'project_name': 'foo', 'package_name': 'foo', 'project_short_description': 'A project.'
+          , 'full_name': 'John Doe', 'email_address': 'john@doe.com', 'github_username': 'jdoe'
+          , 'minimal_python_version': '3.9', 'module_name': 'bar_cpp', 'parent_pypath': 'foo', 'cli_name': 'baz'
+          }
+
+
+def expanded_files(path_to_dir: Path) -> dict:
+    return { p.relative_to(path_to_dir).as_posix(): (p.is_file() and p.read_bytes(), stat.S_IMODE(p.stat().st_mode))
+             for p in sorted(path_to_dir.rglob('*')) if '__pycache__' not in p.parts
+           }
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    workspace = test_workspace(clear=True)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(workspace / 'cache'))
+    templates._compiled.clear()
+    return workspace
+
+
+def test_tokenize():
+    assert templates.tokenize("a {{ cookiecutter.x }} b{{cookiecutter.y}}", 'x') == ['a ', 'x', ' b', 'y', '']
+    with pytest.raises(templates.TemplateError):
+        templates.tokenize("{% if cookiecutter.x %}a{% endif %}", 'x')
+    with pytest.raises(templates.TemplateError):
+        templates.tokenize("{{ cookiecutter.x|lower }}", 'x')
+    with pytest.raises(templates.TemplateError):
+        templates.render(['a', 'x', ''], {}, 'x')
+
+
+@pytest.mark.parametrize('template', ['module-cpp', 'module-py-tests', 'CLIsub', 'project'])
+def test_expand_like_cookiecutter(cache, template):
+    cookiecutter = pytest.importorskip('cookiecutter.main').cookiecutter
+    path_to_template = utils.cookiecutters() / template
+    expected = cookiecutter( template=str(path_to_template), extra_context=CONTEXT, output_dir=str(cache / 'cc')
+                           , no_input=True
+                           )
+    output = templates.expand(path_to_template, extra_context=CONTEXT, output_dir=cache / 'wip')
+    assert output == cache / 'wip' / Path(expected).name
+    assert expanded_files(output) == expanded_files(Path(expected))
+
+
+def test_template_cache(cache):
+    path_to_template = utils.cookiecutters() / 'module-py'
+    templates.expand(path_to_template, extra_context=CONTEXT, output_dir=cache / 'a')
+    cached = list((cache / 'cache' / 'wip' / 'templates').glob('module-py-*.json'))
+    assert len(cached) == 1
+
+    # the cached template is used by other processes
+    templates._compiled.clear()
+    os.utime(cached[0], ns=(0, 0))
+    templates.expand(path_to_template, extra_context=CONTEXT, output_dir=cache / 'b')
+    assert cached[0].stat().st_mtime_ns == 0
+    assert expanded_files(cache / 'a') == expanded_files(cache / 'b')
+
+    # existing output is only overwritten on request
+    with pytest.raises(SystemExit):
+        templates.expand(path_to_template, extra_context=CONTEXT, output_dir=cache / 'b')
+    templates.expand(path_to_template, extra_context=CONTEXT, output_dir=cache / 'b', overwrite_if_exists=True)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `wip add`."""
+
+import json
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import run_wip, test_workspace
+import wiptools.docs_sync as docs_sync
+from wiptools.wip.wip_add import check_components, read_manifest
+
+
+def make_project(workspace: Path) -> Path:
+    project = workspace / 'foo'
+    (project / 'foo').mkdir(parents=True)
+    (project / 'foo' / '__init__.py').touch()
+    (project / 'tests' / 'foo').mkdir(parents=True)
+    (project / 'docs').mkdir()
+    (project / 'docs' / 'api-reference.md').write_text('# API reference\n\n::: foo')
+    (project / 'mkdocs.yml').touch()
+    (project / 'pyproject.toml').write_text('[tool.poetry]\nname = "foo"\n\n[tool.poetry.scripts]\n')
+    with open(project / 'wip-cookiecutter.json', mode='w') as fp:
+        json.dump( { 'project_name': 'foo', 'package_name': 'foo', 'project_short_description': 'A project.'
+                   , 'full_name': 'John Doe', 'email_address': 'john@doe.com', 'github_username': 'jdoe'
+                   , 'minimal_python_version': '3.9'
+                   }
+                 , fp
+                 )
+    return project
+
+
+def test_read_manifest():
+    workspace = test_workspace(clear=True)
+    manifest = workspace / 'manifest.txt'
+    manifest.write_text("# components\nbar --py\n\nbar/baz_cpp --cpp  # C++\nqux\n")
+    assert read_manifest(manifest, 'f90') == [('bar', 'py'), ('bar/baz_cpp', 'cpp'), ('qux', 'f90')]
+    manifest.write_text("bar --java\n")
+    with pytest.raises(SystemExit):
+        read_manifest(manifest)
+
+
+def test_check_components():
+    workspace = test_workspace(clear=True)
+    package = make_project(workspace) / 'foo'
+    check_components([('bar', 'py'), ('bar/baz_cpp', 'cpp'), ('cli', 'cli')], package)
+    for components in ( [('bar/baz_cpp', 'cpp')]  # parent does not exist
+                      , [('bar', '')]             # no component flag
+                      , [('bar/cli', 'cli')]      # CLIs are added to the package directory
+                      ):
+        with pytest.raises(SystemExit):
+            check_components(components, package)
+
+
+def test_add_batch(monkeypatch):
+    workspace = test_workspace(clear=True)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(workspace / 'cache'))
+    project = make_project(workspace)
+    (workspace / 'manifest.txt').write_text("bar --py\nbar/baz_cpp --cpp\nbar/qux\napp --cli\n")
+    monkeypatch.chdir(project)
+    result = run_wip(['add', '--py', 'a', '--manifest', str(workspace / 'manifest.txt'), 'b'])
+    assert 'Updating pyproject.toml and `docs/api-reference.md`' in result.output
+
+    for component in ('a', 'b', 'bar', 'bar/baz_cpp', 'bar/qux', 'app'):
+        assert (project / 'foo' / component).is_dir()
+    assert (project / 'foo' / 'bar' / 'baz_cpp' / 'baz_cpp.cpp').is_file()
+    assert (project / 'tests' / 'foo' / 'bar' / 'baz_cpp' / 'test_baz_cpp.py').is_file()
+    assert 'app = "foo.app.__main__:main"' in (project / 'pyproject.toml').read_text()
+    assert (project / 'docs' / 'api-reference.md').read_text() == \
+        '# API reference\n\n::: foo\n\n' + docs_sync.section( { 'foo.a': 'py', 'foo.app': 'cli', 'foo.b': 'py'
+                                                           , 'foo.bar': 'py', 'foo.bar.baz_cpp': 'cpp'
+                                                           , 'foo.bar.qux': 'py'
+                                                           }
+                                                         ) + '\n'
+    assert (project / 'docs' / 'api' / 'foo.bar.baz_cpp.md').is_file()
+
+    # adding a component again does not duplicate its documentation
+    api_reference = (project / 'docs' / 'api-reference.md').read_text()
+    run_wip(['add', '--py', 'a'])
+    assert (project / 'docs' / 'api-reference.md').read_text() == api_reference
+
+    # without mkdocs documentation, the documentation is not updated
+    (project / 'mkdocs.yml').unlink()
+    result = run_wip(['add', '--py', 'c'])
+    assert 'Updating pyproject.toml' in result.output
+    assert 'docs/api-reference.md' not in result.output
+    assert (project / 'docs' / 'api-reference.md').read_text() == api_reference
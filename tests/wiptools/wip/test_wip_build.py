@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `wip build`."""
+
+import json
+from pathlib import Path
+import shlex
+import shutil
+import subprocess
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import pytest
+
+from helpers import run_wip, test_workspace
+import wiptools.utils as utils
+import wiptools.watcher as watcher
+import wiptools.wip.wip_build as wip_build
+from wiptools.wip.wip_build import BinaryExtensionBuilder, BuildError, job_budget
+
+
+def test_job_budget():
+    assert job_budget(1, 10) == (1, 1)
+    assert job_budget(8, 2) == (2, 4)
+    assert job_budget(8, 3) == (3, 2)
+    assert job_budget(8, 20) == (8, 1)
+    workers, parallel = job_budget(0, 1)
+    assert workers == 1
+    assert parallel == utils.available_cores()
+
+
+class FailingBuilder(BinaryExtensionBuilder):
+    """Builder that pretends to build, and fails for components whose name starts with 'fail'."""
+    def build_ext(self, path_to_component):
+        if path_to_component.name.startswith('fail'):
+            raise BuildError(1, 'cmake --build _cmake_build')
+
+
+def make_components(names):
+    workspace = test_workspace(clear=True)
+    components = []
+    for name in names:
+        component = workspace / name
+        component.mkdir()
+        (component / f'{name}.cpp').touch()
+        components.append(component)
+    return workspace, components
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_build_all_keep_going(jobs):
+    workspace, components = make_components(['fail_a', 'ok_b', 'fail_c', 'ok_d'])
+    build = FailingBuilder({'project_path': str(workspace)})
+    build.cpp_flag = True
+    failures = build.build_all(components, jobs=jobs, keep_going=True)
+    assert sorted(p.name for p in failures) == ['fail_a', 'fail_c']
+
+
+def test_build_all_fail_fast():
+    workspace, components = make_components(['fail_a', 'ok_b', 'fail_c', 'ok_d'])
+    build = FailingBuilder({'project_path': str(workspace)})
+    build.cpp_flag = True
+    failures = build.build_all(components, jobs=1, keep_going=False)
+    assert [p.name for p in failures] == ['fail_a']
+
+
+def test_build_all_language_flags():
+    workspace, components = make_components(['fail_a'])
+    build = FailingBuilder({'project_path': str(workspace)})
+    build.f90_flag = True # fail_a is a C++ component, and must not be built
+    assert not build.build_all(components, jobs=2)
+
+
+def test_topological_order():
+    a, b, c, d = (Path(name) for name in 'abcd')
+    graph = {a: [c], c: [d], b: [d]}
+    assert wip_build.topological_order([a, b, c, d], graph) == [d, c, a, b]
+    assert wip_build.topological_order([a, b], graph) == [a, b]  # dependencies not selected are ignored
+    assert wip_build.with_dependencies([a], graph) == [a, c, d]
+    with pytest.raises(SystemExit):
+        wip_build.topological_order([a, b, c, d], {**graph, d: [a]})
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_build_all_dependencies(jobs):
+    workspace, components = make_components(['app', 'fail_core', 'lib', 'other'])
+    app, fail_core, lib, other = components
+    built = []
+
+    class RecordingBuilder(FailingBuilder):
+        def build_ext(self, path_to_component):
+            super().build_ext(path_to_component)
+            built.append(path_to_component.name)
+
+    build = RecordingBuilder({'project_path': str(workspace)})
+    build.cpp_flag = True
+    build.dependencies = {app: [lib, fail_core], lib: [other]}
+    failures = build.build_all(components, jobs=jobs, keep_going=True)
+    assert sorted(built) == ['lib', 'other']
+    assert built.index('other') < built.index('lib')
+    assert isinstance(failures[app], wip_build.DependencyError)
+    assert sorted(p.name for p in failures) == ['app', 'fail_core']
+
+
+def test_fingerprint_dependencies():
+    workspace, (app, lib) = make_components(['app', 'lib'])
+    build = BinaryExtensionBuilder({'project_path': str(workspace)})
+    build.dependencies = {app: [lib]}
+    fp = build.fingerprint(app)
+    (lib / 'lib.cpp').write_text('// modified')
+    assert build.fingerprint(app) != fp
+
+
+def test_fingerprint():
+    workspace, components = make_components(['foo'])
+    foo = components[0]
+    fp = wip_build.fingerprint(foo, 'Release')
+    assert fp == wip_build.fingerprint(foo, 'Release')
+    assert fp != wip_build.fingerprint(foo, 'Debug')
+    (foo / '_cmake_build').mkdir()
+    (foo / '_cmake_build' / 'foo.h').write_text('// build output is ignored')
+    assert fp == wip_build.fingerprint(foo, 'Release')
+    (foo / 'foo.cpp').write_text('// modified')
+    assert fp != wip_build.fingerprint(foo, 'Release')
+    # private source directories are part of the component
+    fp = wip_build.fingerprint(foo, 'Release')
+    (foo / '_detail').mkdir()
+    (foo / '_detail' / 'impl.h').write_text('// implementation detail')
+    assert fp != wip_build.fingerprint(foo, 'Release')
+
+
+def test_python_interpreter():
+    workspace, components = make_components(['foo'])
+    foo = components[0]
+    build = BinaryExtensionBuilder({'project_path': str(workspace)})
+    assert build.python == wip_build.python_interpreter()
+    fp = build.fingerprint(foo)
+    build.python = {**build.python, 'version': '3.99.0', 'ext_suffix': '.cpython-399-x86_64-linux-gnu.so'}
+    assert build.fingerprint(foo) != fp
+    (foo / 'foo.cpython-399-x86_64-linux-gnu.so').write_text('binary extension module')
+    assert wip_build.installed_extension(foo, build.python['ext_suffix']).name == 'foo.cpython-399-x86_64-linux-gnu.so'
+
+
+def test_is_up_to_date():
+    workspace, components = make_components(['foo'])
+    foo = components[0]
+    fp = wip_build.fingerprint(foo, 'Release')
+    assert not wip_build.is_up_to_date(foo, fp)
+    path_to_extension = foo / f'foo{wip_build.EXT_SUFFIX}'
+    path_to_extension.write_text('binary extension module')
+    wip_build.write_build_record(foo, {'fingerprint': fp, 'build_type': 'Release'})
+    assert wip_build.is_up_to_date(foo, fp)
+    assert not wip_build.is_up_to_date(foo, wip_build.fingerprint(foo, 'Debug'))
+    path_to_extension.write_text('replaced binary extension module')
+    assert not wip_build.is_up_to_date(foo, fp)
+
+
+def test_configure_is_valid():
+    workspace, components = make_components(['foo'])
+    foo = components[0]
+    (foo / 'CMakeLists.txt').write_text('project(foo)')
+    stamp = BinaryExtensionBuilder({'project_path': str(workspace)}).configure_stamp(foo)
+    assert not wip_build.configure_is_valid(foo, stamp)
+
+    build_dir = foo / '_cmake_build'
+    build_dir.mkdir()
+    with open(build_dir / wip_build.CONFIGURE_STAMP, mode='w') as fp:
+        json.dump(stamp, fp)
+    (build_dir / 'CMakeCache.txt').write_text(f'CMAKE_HOME_DIRECTORY:INTERNAL={foo.resolve()}\n')
+    assert wip_build.configure_is_valid(foo, stamp)
+    assert not wip_build.configure_is_valid(foo, {**stamp, 'build_type': 'Debug'})
+
+    (build_dir / 'CMakeCache.txt').write_text(f'CMAKE_HOME_DIRECTORY:INTERNAL={workspace.resolve()}\n')
+    assert not wip_build.configure_is_valid(foo, stamp)
+
+
+def test_clear_generator(monkeypatch):
+    build_dir = test_workspace(clear=True) / '_cmake_build'
+    (build_dir / 'CMakeFiles').mkdir(parents=True)
+    (build_dir / 'CMakeCache.txt').write_text('CMAKE_GENERATOR:INTERNAL=Unix Makefiles\n')
+    wip_build.clear_generator(build_dir, 'Unix Makefiles')
+    assert (build_dir / 'CMakeCache.txt').is_file()
+    wip_build.clear_generator(build_dir, 'Ninja')
+    assert not (build_dir / 'CMakeCache.txt').exists()
+    assert not (build_dir / 'CMakeFiles').exists()
+
+    # back to CMake's default generator, after configuring with an explicit one
+    monkeypatch.delenv('CMAKE_GENERATOR', raising=False)
+    (build_dir / 'CMakeCache.txt').write_text('CMAKE_GENERATOR:INTERNAL=Ninja\n')
+    (build_dir / wip_build.CONFIGURE_STAMP).write_text(json.dumps({'generator': ''}))
+    wip_build.clear_generator(build_dir, '')
+    assert (build_dir / 'CMakeCache.txt').is_file()
+    (build_dir / wip_build.CONFIGURE_STAMP).write_text(json.dumps({'generator': 'Ninja'}))
+    wip_build.clear_generator(build_dir, '')
+    assert not (build_dir / 'CMakeCache.txt').exists()
+    (build_dir / 'CMakeCache.txt').write_text('CMAKE_GENERATOR:INTERNAL=Ninja\n')
+    monkeypatch.setenv('CMAKE_GENERATOR', 'Unix Makefiles')
+    wip_build.clear_generator(build_dir, '')
+    assert not (build_dir / 'CMakeCache.txt').exists()
+
+
+def test_configure_command(monkeypatch):
+    workspace, components = make_components(['foo'])
+    foo = components[0]
+    (foo / '_cmake_build').mkdir()
+    commands = []
+    monkeypatch.setattr(utils, 'subprocess_run_cmds', lambda cmds, **kwargs: commands.extend(cmds))
+    build = BinaryExtensionBuilder({'project_path': str(workspace)})
+    build.compiler_launcher = '/opt/my tools/ccache'
+    build.build_ext(foo)
+    assert '-DWIP_COMPILER_LAUNCHER=/opt/my tools/ccache' in shlex.split(commands[0])
+
+
+def test_ccache_statistics():
+    path_to_stats_log = test_workspace(clear=True) / 'ccache-stats.log'
+    assert wip_build.ccache_statistics(path_to_stats_log) == (0, 0)
+    path_to_stats_log.write_text( '# foo.cpp\ndirect_cache_hit\n'
+                                  '# bar.cpp\ncache_miss\n'
+                                  '# nb_func.cpp\npreprocessed_cache_hit\n'
+                                  '# foo.f90\nunsupported_source_language\n'
+                                )
+    assert wip_build.ccache_statistics(path_to_stats_log) == (2, 1)
+
+
+def test_nanobind_shared_cmakelists():
+    workspace, components = make_components(['foo', 'bar'])
+    cmakelists = wip_build.nanobind_shared_cmakelists(components, workspace)
+    assert 'nanobind_build_library(nanobind)' in cmakelists
+    assert f'add_subdirectory("{(workspace / "bar").as_posix()}" "bar")\n' \
+           f'add_subdirectory("{(workspace / "foo").as_posix()}" "foo")\n' in cmakelists
+
+    foo, bar = components
+    cmakelists = wip_build.nanobind_shared_cmakelists(components, workspace, {bar: [foo]})
+    assert cmakelists.index('"foo")') < cmakelists.index('"bar")')
+    assert f'set(WIP_DEPENDENCY_DIRS "{foo.as_posix()};{(foo / "_cmake_build").as_posix()}")' in cmakelists
+    assert 'add_dependencies(bar foo)' in cmakelists
+
+
+def test_ninja_log_timings():
+    before = { 'CMakeFiles/foo.dir/foo.cpp.o': (0, 1000, '1')
+             , 'foo.so': (1000, 1200, '1')
+             }
+    after  = { 'CMakeFiles/foo.dir/foo.cpp.o': (0, 1000, '1')
+             , 'CMakeFiles/foo.dir/bar.cpp.o': (0, 2500, '2')
+             , 'foo.so': (2500, 2800, '2')
+             , 'build.ninja': (0, 100, '2')
+             }
+    assert wip_build.ninja_log_timings(before, after) == {'compile': 2.5, 'link': 0.3}
+    assert wip_build.ninja_log_timings({}, {}) == {}
+
+
+def test_phase_timings():
+    timings = [ ('cmake -S . -B _cmake_build', 2.0, 1.0)
+              , ('cmake --build _cmake_build --parallel 1', 10.0, 9.0)
+              , ('cmake --install _cmake_build', 0.5, 0.25)
+              ]
+    t = wip_build.phase_timings(timings, {'compile': 8.0, 'link': 1.0})
+    assert t['wall'] == 12.5
+    assert t['cpu'] == 10.25
+    assert t['phases']['configure'] == {'wall': 2.0, 'cpu': 1.0}
+    assert t['phases']['link'] == {'wall': 1.0, 'cpu': None}
+
+
+def test_pgo_flags(monkeypatch):
+    workspace, (component,) = make_components(['foo_cpp'])
+    profile_dir = workspace / '.wip' / 'pgo' / 'foo_cpp'
+    compile_flags, link_flags = wip_build.pgo_flags(component, profile_dir, generate=True)
+    assert f'-fprofile-generate={profile_dir}' in compile_flags
+    assert compile_flags == link_flags
+
+    monkeypatch.setattr(wip_build, 'is_clang', lambda path_to_component: False)
+    assert wip_build.pgo_flags(component, profile_dir) == ([], [])  # no profile data yet
+    assert wip_build.profile_digest(workspace) == ''
+    profile_dir.mkdir(parents=True)
+    (profile_dir / '#foo_cpp.cpp.gcda').write_bytes(b'gcda')
+    compile_flags, link_flags = wip_build.pgo_flags(component, profile_dir)
+    assert f'-fprofile-use={profile_dir}' in compile_flags
+    assert f'-fprofile-use={profile_dir}' in link_flags
+
+    digest = wip_build.profile_digest(profile_dir)
+    assert digest
+    (profile_dir / '#foo_cpp.cpp.gcda').write_bytes(b'other gcda')
+    assert wip_build.profile_digest(profile_dir) != digest
+
+
+class RecordingBuilder(BinaryExtensionBuilder):
+    """Builder that pretends to build, recording the flags of every build."""
+    def build_ext(self, path_to_component):
+        self.built[path_to_component.name] = self.flags(path_to_component)
+        if utils.component_type(path_to_component) == 'cpp':
+            (path_to_component / f'{path_to_component.name}{wip_build.EXT_SUFFIX}').write_bytes(b'so')
+        elif utils.component_type(path_to_component) == 'f90':
+            (path_to_component.parent / f'{path_to_component.name}{wip_build.EXT_SUFFIX}').write_bytes(b'so')
+
+
+def test_nanobind_shared_pgo(monkeypatch):
+    """After a nanobind-shared build of the C++ components, Modern Fortran components still get their PGO flags."""
+    workspace = test_workspace(clear=True)
+    foo_cpp, bar_f90 = workspace / 'foo' / 'foo_cpp', workspace / 'foo' / 'bar_f90'
+    for component, filename in ((foo_cpp, 'foo_cpp.cpp'), (bar_f90, 'bar_f90.f90')):
+        component.mkdir(parents=True)
+        (component / filename).touch()
+    monkeypatch.setattr(wip_build, 'is_clang', lambda path_to_component: False)
+    build = RecordingBuilder({'project_path': str(workspace), 'package_name': 'foo'})
+    build.built = {}
+    build.stubs = False
+    for component in (foo_cpp, bar_f90):  # profile data of an earlier `wip build --pgo`
+        build.profile_dir(component).mkdir(parents=True)
+        (build.profile_dir(component) / 'x.gcda').write_bytes(b'gcda')
+
+    # as `wip build --nb-shared`: the C++ components together (installed by the shared CMake project), then the others
+    (foo_cpp / f'foo_cpp{wip_build.EXT_SUFFIX}').write_bytes(b'so')
+    assert build.build_nanobind_shared([foo_cpp]) == {}
+    build.f90_flag = True
+    assert build.build_all([foo_cpp, bar_f90]) == {}
+
+    assert not any(flag.startswith('-fprofile-use') for flag in build.flags(foo_cpp)[0])
+    compile_flags, link_flags = build.built['bar_f90']
+    assert f'-fprofile-use={build.profile_dir(bar_f90)}' in compile_flags
+    assert f'-fprofile-use={build.profile_dir(bar_f90)}' in link_flags
+    assert wip_build.read_build_record(foo_cpp)['nanobind_shared'] is True
+    assert wip_build.read_build_record(bar_f90)['nanobind_shared'] is False
+
+
+def test_build_profile_flags():
+    assert wip_build.build_profile_flags('portable') == ([], [])
+    compile_flags, link_flags = wip_build.build_profile_flags('release-lto', fast_math=True)
+    assert compile_flags == ['-march=native', '-flto', '-ffast-math']
+    assert link_flags == ['-flto']
+    compile_flags.append('-O3')  # must not modify the profile
+    assert wip_build.BUILD_PROFILES['release-lto'][0] == ['-march=native', '-flto']
+    with pytest.raises(SystemExit):
+        wip_build.build_profile_flags('fastest')
+
+
+def test_write_build_record_profile():
+    workspace, (component,) = make_components(['foo_cpp'])
+    (component / f'foo_cpp{wip_build.EXT_SUFFIX}').write_bytes(b'so')
+    wip_build.write_build_record(component, {'profile': 'release-native'}, {'profile': 'release-native'})
+    assert wip_build.read_build_record(component)['profile'] == 'release-native'
+    with open(component / f'foo_cpp{wip_build.BUILD_PROFILE_SUFFIX}') as fp:
+        assert json.load(fp) == {'module': f'foo_cpp{wip_build.EXT_SUFFIX}', 'profile': 'release-native'}
+
+
+def test_pgo_training_command():
+    workspace = test_workspace(clear=True)
+    params = {'project_path': str(workspace), 'package_name': 'foo'}
+    component = workspace / 'foo' / 'bar_cpp'
+    command = wip_build.pgo_training_command(params, component, {'bar_cpp': 'python train.py'})
+    assert command == 'python train.py'
+    (workspace / 'tests' / 'foo' / 'bar_cpp').mkdir(parents=True)
+    assert wip_build.pgo_training_command(params, component, {}) == 'python -m pytest tests/foo/bar_cpp'
+
+
+@pytest.mark.parametrize('polling', [True, False])
+def test_watcher(polling):
+    workspace, (foo,) = make_components(['foo'])
+    (foo / '_cmake_build').mkdir()
+    with watcher.watcher([foo], polling=polling) as watcher_:
+        if polling:
+            watcher_.interval = 0.01
+        assert watcher_.wait(timeout=0.05) == set()
+        (foo / '_cmake_build' / 'foo.o').write_text('ignored')
+        (foo / 'foo.cpp').write_text('// modified')
+        changes = watcher_.wait(timeout=5)
+        assert foo / 'foo.cpp' in changes
+        assert foo / '_cmake_build' / 'foo.o' not in changes
+        (foo / 'sub').mkdir()
+        (foo / 'sub' / 'bar.h').write_text('// new')
+        (foo / '_detail').mkdir()
+        (foo / '_detail' / 'impl.h').write_text('// new')
+        changes = watcher_.wait(timeout=5) | watcher_.wait(timeout=0.2)
+        assert {foo / 'sub' / 'bar.h', foo / '_detail' / 'impl.h'} <= changes
+
+
+def test_component_of():
+    foo = Path('/p/pkg/foo')
+    bar = foo / 'bar'
+    assert wip_build.component_of(bar / 'bar.cpp', [foo, bar]) == bar
+    assert wip_build.component_of(foo / 'sub' / 'foo.h', [foo, bar]) == foo
+    assert wip_build.component_of(Path('/p/pkg/baz.cpp'), [foo, bar]) is None
+
+
+@pytest.mark.skipif(not (shutil.which('cmake') and shutil.which('gfortran')), reason='needs cmake and gfortran')
+def test_f90_template_incremental():
+    workspace = test_workspace(clear=True)
+    component = workspace / 'foo_f90'
+    template = utils.cookiecutters() / 'module-f90' / '{{cookiecutter.module_name}}'
+    component.mkdir()
+    for name in ('CMakeLists.txt', '{{cookiecutter.module_name}}.f90'):
+        text = (template / name).read_text() \
+            .replace('{{cookiecutter.module_name}}', 'foo_f90').replace('{{cookiecutter.parent_pypath}}', '') \
+            .replace('{{cookiecutter.package_name}}', 'foo')
+        (component / name.replace('{{cookiecutter.module_name}}', 'foo_f90')).write_text(text)
+
+    def build():
+        for cmd in ( 'cmake -S . -B _cmake_build'
+                   , 'cmake --build _cmake_build'
+                   , 'cmake --install _cmake_build'
+                   ):
+            subprocess.run(cmd.split(), cwd=component, check=True, capture_output=True)
+
+    build()
+    assert (workspace / f'foo_f90{wip_build.EXT_SUFFIX}').is_file()
+    wrapper = component / '_cmake_build' / 'f2py' / 'foo_f90module.c'
+    mtime = wrapper.stat().st_mtime_ns
+
+    # changing the implementation does not regenerate the wrapper code
+    with open(component / 'foo_f90.f90', mode='a') as fp:
+        fp.write('! modified\n')
+    build()
+    assert wrapper.stat().st_mtime_ns == mtime
+
+    # changing the interface does
+    source = (component / 'foo_f90.f90').read_text()
+    (component / 'foo_f90.f90').write_text(source.replace('subroutine add(x,y,z,n)', 'subroutine add(x,y,z,n,k)')
+                                                 .replace('    integer*4 :: i\n', '    integer*4 :: i\n    integer*4, intent(in) :: k\n'))
+    build()
+    assert wrapper.stat().st_mtime_ns != mtime
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_build_all_keep_going
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug(4)
+    print('-*# finished #*-')
+# eof
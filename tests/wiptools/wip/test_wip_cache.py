@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `wip cache` and the artifact cache of `wip build`."""
+
+import os
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+from helpers import test_workspace
+import wiptools.hardware as hardware
+import wiptools.wip.wip_build as wip_build
+from wiptools.wip.wip_build import BinaryExtensionBuilder, EXT_SUFFIX, read_build_record
+from wiptools.utils import format_size, parse_size
+from wiptools.wip.wip_cache import ArtifactCache
+
+
+def test_parse_size():
+    assert parse_size('1234') == 1234
+    assert parse_size('2K') == 2048
+    assert parse_size('500M') == 500 * 1024**2
+    assert parse_size('1.5GiB') == 3 * 1024**3 // 2
+    assert format_size(512) == '512 B'
+    assert format_size(3 * 1024**2) == '3.0 MiB'
+
+
+def make_component(checkout: Path, name: str = 'foo_cpp', source: str = 'int f() { return 1; }'):
+    component = checkout / 'pkg' / name
+    component.mkdir(parents=True)
+    (component / f'{name}.cpp').write_text(source)
+    return component
+
+
+def test_store_restore_prune():
+    workspace = test_workspace(clear=True)
+    cache = ArtifactCache(workspace / 'cache', max_size=10**6)
+    foo = make_component(workspace / 'a')
+    (foo / f'foo_cpp{EXT_SUFFIX}').write_bytes(b'12345')
+    key = ArtifactCache.key('fingerprint', 'foo_cpp')
+    assert cache.restore(key, foo) is None
+    cache.store(key, foo, foo / f'foo_cpp{EXT_SUFFIX}', {'profile': 'portable'})
+
+    # restore in another checkout
+    other = make_component(workspace / 'b')
+    assert cache.restore(key, other) == {'profile': 'portable'}
+    assert (other / f'foo_cpp{EXT_SUFFIX}').read_bytes() == b'12345'
+    assert cache.stats()['components'] == {'foo_cpp': (1, cache.stats()['size'])}
+
+    # the least recently used entry is evicted when the cache becomes too large
+    key2 = ArtifactCache.key('fingerprint2', 'foo_cpp')
+    os.utime(cache.entry(key) / 'meta.json', (0, 0))
+    cache.max_size = cache.stats()['size'] + 5
+    cache.store(key2, foo, foo / f'foo_cpp{EXT_SUFFIX}')
+    assert not cache.entry(key).exists()
+    assert cache.entry(key2).is_dir()
+    assert cache.prune(0)[0] == 1
+    assert cache.stats()['entries'] == 0
+
+
+class CountingBuilder(BinaryExtensionBuilder):
+    """Builder that pretends to build, by writing a binary extension module, and counts the builds."""
+    def build_ext(self, path_to_component):
+        self.n_builds = getattr(self, 'n_builds', 0) + 1
+        (path_to_component / f'{path_to_component.name}{EXT_SUFFIX}').write_bytes(b'binary')
+
+
+def test_build_restores_from_cache():
+    workspace = test_workspace(clear=True)
+    cache = ArtifactCache(workspace / 'cache')
+    builds = []
+    for checkout in ('a', 'b'):
+        build = CountingBuilder({'project_path': str(workspace / checkout)})
+        build.cpp_flag = True
+        build.artifact_cache = cache
+        build(make_component(workspace / checkout))
+        builds.append(build)
+    assert builds[0].n_builds == 1
+    assert not hasattr(builds[1], 'n_builds')  # restored
+    component = workspace / 'b' / 'pkg' / 'foo_cpp'
+    assert (component / f'foo_cpp{EXT_SUFFIX}').read_bytes() == b'binary'
+    assert read_build_record(component)['profile'] == 'portable'
+
+    # a different build profile is not restored
+    builds[1].profile = 'release-native'
+    builds[1](component)
+    assert builds[1].n_builds == 1
+    assert cache.stats()['entries'] == 2
+
+
+def test_native_builds_not_shared_between_cpus(monkeypatch):
+    workspace = test_workspace(clear=True)
+    cache = ArtifactCache(workspace / 'cache')
+    component = make_component(workspace / 'a')
+    build = CountingBuilder({'project_path': str(workspace / 'a')})
+    build.cpp_flag = True
+    build.artifact_cache = cache
+    build.profile = 'release-native'
+    monkeypatch.setattr(wip_build, 'native_target', lambda compiler: 'znver3 AMD EPYC 7763')
+    build(component)
+    assert build.n_builds == 1 and cache.stats()['entries'] == 1
+
+    # another node with another CPU, sharing the artifact cache, does not restore the artifact
+    other = CountingBuilder({'project_path': str(workspace / 'b')})
+    other.cpp_flag = True
+    other.artifact_cache = cache
+    other.profile = 'release-native'
+    monkeypatch.setattr(wip_build, 'native_target', lambda compiler: 'skylake Intel Xeon Gold 6140')
+    component = make_component(workspace / 'b')
+    other(component)
+    assert other.n_builds == 1 and cache.stats()['entries'] == 2
+
+    # if it is unknown what -march=native stands for, the build is not cached
+    monkeypatch.setattr(wip_build, 'native_target', lambda compiler: '')
+    assert not other.is_cacheable(component)
+    other.profile = 'portable'
+    assert other.is_cacheable(component)
+
+
+def test_native_target(monkeypatch):
+    monkeypatch.setattr(hardware, 'native_architecture', lambda compiler: 'znver3')
+    monkeypatch.setattr(hardware, 'cpuinfo', lambda: {'model': 'AMD EPYC 7763', 'flags': ['sse2', 'avx2']})
+    native_target = wip_build.native_target.__wrapped__  # not cached
+    target = native_target(sys.executable)
+    assert target.startswith('znver3 AMD EPYC 7763 ')
+    # the same CPU model with other CPU flags (e.g. AVX-512 disabled) is another target
+    monkeypatch.setattr(hardware, 'cpuinfo', lambda: {'model': 'AMD EPYC 7763', 'flags': ['sse2', 'avx512f']})
+    assert native_target(sys.executable) != target
+    monkeypatch.setattr(hardware, 'native_architecture', lambda compiler: '')
+    monkeypatch.setattr(hardware, 'cpuinfo', lambda: {'model': '', 'flags': []})
+    assert native_target(sys.executable) == ''
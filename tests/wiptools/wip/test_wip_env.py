@@ -2,6 +2,8 @@
 
 """Tests for `wip env`."""
 
+import json
+import os
 from pathlib import Path
 import sys
 
@@ -11,11 +13,112 @@ sys.path.insert(0, str(path))
 import pytest
 
 from helpers import run_wip, test_workspace
+import wiptools.hardware as hardware
+import wiptools.toolchain as toolchain
 import wiptools.utils as utils
+import wiptools.wip.wip_build as wip_build
 
 
-def test_env():
+def test_env(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(test_workspace(clear=True) / 'cache'))
     result = run_wip(['env'], assert_exit_code=False)
+    result = run_wip(['env', '--json'])
+    assert list(json.loads(result.output)) == list(toolchain.TOOLS)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="uses a shell script as fake compiler")
+def test_probe(monkeypatch):
+    workspace = test_workspace(clear=True)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(workspace / 'cache'))
+    bin_dir = workspace / 'bin'
+    bin_dir.mkdir()
+    fake_compiler = bin_dir / 'fake-c++'
+    fake_compiler.write_text(f"#!/bin/sh\necho probed >> {workspace / 'probes.log'}\necho 'fake-c++ 1.0'\n")
+    fake_compiler.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('CXX', 'fake-c++')
+
+    def probes():
+        return len((workspace / 'probes.log').read_text().splitlines())
+
+    results = toolchain.probe(['c++', 'no-such-tool'])
+    assert results['c++'] == { 'executable': str(fake_compiler), 'found': True, 'version': 'fake-c++ 1.0'
+                             , 'stamp': {str(fake_compiler): fake_compiler.stat().st_mtime_ns}
+                             }
+    assert not results['no-such-tool']['found']
+    assert probes() == 1
+
+    # the cached results are reused, unless the tool changed, or a refresh is requested
+    assert toolchain.probe(['c++']) == {'c++': results['c++']}
+    assert toolchain.version(str(fake_compiler)) == 'fake-c++ 1.0'
+    assert probes() == 2  # the compiler path is a tool of its own
+    assert wip_build.compiler_version(str(fake_compiler)) == 'fake-c++ 1.0'
+    assert probes() == 2
+    os.utime(fake_compiler, ns=(0, 0))
+    toolchain.probe(['c++'])
+    assert probes() == 3
+    toolchain.probe(['c++'], refresh=True)
+    assert probes() == 4
+
+    # the compiler is passed to CMake
+    assert wip_build.toolchain_definitions('cpp')['CMAKE_CXX_COMPILER'] == str(fake_compiler)
+    assert 'CMAKE_CXX_COMPILER' not in wip_build.toolchain_definitions('f90')
+
+
+def test_hardware():
+    workspace = test_workspace(clear=True)
+    cpu = workspace / 'cpu'
+    (cpu / 'online').parent.mkdir()
+    (cpu / 'online').write_text('0-3\n')
+    for i, (package_id, core_id) in enumerate([(0, 0), (0, 1), (0, 0), (0, 1)]):  # 2 cores, 2 threads per core
+        (cpu / f'cpu{i}' / 'topology').mkdir(parents=True)
+        (cpu / f'cpu{i}' / 'topology' / 'physical_package_id').write_text(f"{package_id}\n")
+        (cpu / f'cpu{i}' / 'topology' / 'core_id').write_text(f"{core_id}\n")
+    index = cpu / 'cpu0' / 'cache' / 'index0'
+    index.mkdir(parents=True)
+    for name, value in {'level': '1', 'type': 'Data', 'size': '32K', 'shared_cpu_list': '0,2'}.items():
+        (index / name).write_text(value + '\n')
+
+    topology = hardware.topology(cpu)
+    assert (topology['physical_cores'], topology['sockets']) == (2, 1)
+    assert hardware.caches(cpu / 'cpu0' / 'cache') == [{'level': 1, 'type': 'Data', 'size': 32768, 'shared_by': 2}]
+    assert hardware.parse_cpu_list('0-3,8') == [0, 1, 2, 3, 8]
+    assert hardware.simd(['fpu', 'sse2', 'avx', 'avx2', 'fma']) == \
+        {'level': 'avx2', 'instruction_sets': ['avx', 'avx2', 'fma', 'sse2']}
+    assert hardware.default_threads({'physical_cores': 8, 'available_cpus': 4, 'threads_per_core': 2}) == 2
+
+
+def test_machine_profile(monkeypatch):
+    workspace = test_workspace(clear=True)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(workspace / 'cache'))
+    (workspace / 'foo').mkdir()
+    assert hardware.load(workspace) is None
+    assert wip_build.BinaryExtensionBuilder({'project_path': str(workspace)}).machine is None
+
+    cxx = toolchain.probe(['c++'])['c++']
+    hostname, cpu = hardware.identity()
+    profile = { 'hostname': hostname, 'cpu': cpu, 'physical_cores': 4, 'available_cpus': 8, 'threads_per_core': 2
+              , 'compilers': {'c++': {'executable': cxx['executable'], 'march': 'znver3', 'openmp': True}}
+              }
+    hardware.save(profile, workspace)
+    build = wip_build.BinaryExtensionBuilder({'project_path': str(workspace)})
+    assert build.machine == profile
+    build.profile = 'release-native'
+    foo = workspace / 'foo'
+    (foo / 'foo.cpp').write_text('')
+    if cxx['found']:
+        assert build.flags(foo) == (['-march=znver3'], [])
+    assert build.configure_stamp(foo)['machine'] == {'WIP_NUM_THREADS': '4', 'WIP_OPENMP': 'ON'}
+    assert wip_build.machine_definitions(profile, 'f90') == {'WIP_NUM_THREADS': '4', 'WIP_OPENMP': 'OFF'}
+
+    # the profile of another machine is not used, `-march=native` is kept
+    other = {**profile, 'hostname': f"not-{hostname}"}
+    assert wip_build.native_architecture(other, 'cpp') == ''
+    hardware.save(other, workspace)
+    assert hardware.load(workspace) is None
+    build = wip_build.BinaryExtensionBuilder({'project_path': str(workspace)})
+    build.profile = 'release-native'
+    assert build.flags(foo) == (['-march=native'], [])
 
 
 # ==============================================================================
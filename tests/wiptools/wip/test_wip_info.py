@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `wip info`."""
+
+import os
+from pathlib import Path
+import sys
+
+path = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(path))
+
+import click
+
+from helpers import test_workspace
+import wiptools.wip.wip_build as wip_build
+from wiptools.wip.wip_info import component_status, tree_json, tree_lines
+
+
+def make_package():
+    workspace = test_workspace(clear=True)
+    package = workspace / 'foo'
+    for filename in [ '__init__.py', 'README.txt', 'bar/__init__.py', 'bar/bar.md', 'bar/baz_cpp/baz_cpp.cpp'
+                    , 'bar/baz_cpp/_cmake_build/x.cpp', 'data/x.py', '__pycache__/x.py'
+                    ]:
+        (package / filename).parent.mkdir(parents=True, exist_ok=True)
+        (package / filename).touch()
+    return package
+
+
+def test_tree_lines():
+    package = make_package()
+    assert [click.unstyle(line) for line in tree_lines(package)] == \
+        [ 'foo [Python module]'
+        , '├── __init__.py'
+        , '├── bar [Python module]'
+        , '│   ├── __init__.py'
+        , '│   ├── bar.md'
+        , '│   └── baz_cpp [C++ binary extension module]'
+        , '│       └── baz_cpp.cpp'
+        , '└── data [???]'
+        , '    └── x.py'
+        ]
+    assert [click.unstyle(line) for line in tree_lines(package, max_depth=1, components_only=True)] == \
+        [ 'foo [Python module]'
+        , '└── bar [Python module]'
+        ]
+
+
+def test_tree_json():
+    package = make_package()
+    assert tree_json(package, max_depth=2, components_only=True) == \
+        { 'name': 'foo', 'type': 'py', 'path': 'foo', 'children':
+          [ { 'name': 'bar', 'type': 'py', 'path': 'foo/bar', 'children':
+              [ {'name': 'baz_cpp', 'type': 'cpp', 'path': 'foo/bar/baz_cpp'} ]
+            }
+          ]
+        }
+    assert tree_json(package)['children'][-1] == \
+        {'name': 'data', 'type': 'dir', 'path': 'foo/data', 'children': [{'name': 'x.py', 'type': 'file'}]}
+
+
+def test_component_status():
+    workspace = test_workspace(clear=True)
+    params = {'project_path': str(workspace), 'package_name': 'foo'}
+    component = workspace / 'foo' / 'bar_cpp'
+    component.mkdir(parents=True)
+    (component / 'bar_cpp.cpp').write_text('int f();\n')
+    assert component_status(params, component)['status'] == 'missing'
+    (component / 'bar_cpp.cpython-27-x86_64-linux-gnu.so').touch()
+    assert component_status(params, component)['status'] == 'other ABI'
+
+    path_to_extension = component / f'bar_cpp{wip_build.EXT_SUFFIX}'
+    path_to_extension.write_bytes(b'binary')
+    assert component_status(params, component)['status'] == 'unknown'
+    build = wip_build.BinaryExtensionBuilder(params)
+    build.profile = 'release-native'
+    wip_build.write_build_record(component, build.build_record(build.fingerprint(component), component))
+    status = component_status(params, component)
+    assert (status['status'], status['profile'], status['size']) == ('up to date', 'release-native', 6)
+
+    # modified sources: only stale if their contents changed
+    os.utime(component / 'bar_cpp.cpp', ns=(path_to_extension.stat().st_mtime_ns + 10**9,) * 2)
+    assert component_status(params, component)['status'] == 'up to date'
+    (component / 'bar_cpp.cpp').write_text('int g();\n')
+    os.utime(component / 'bar_cpp.cpp', ns=(path_to_extension.stat().st_mtime_ns + 10**9,) * 2)
+    assert component_status(params, component)['status'] == 'stale'
+
+    # another compiler or Python version: stale, without computing the fingerprint
+    (component / 'bar_cpp.cpp').write_text('int f();\n')
+    record = build.build_record(build.fingerprint(component), component)
+    wip_build.write_build_record(component, record)
+    assert component_status(params, component)['status'] == 'up to date'
+    wip_build.write_build_record(component, {**record, 'python': '2.7.18'})
+    assert component_status(params, component)['status'] == 'stale'
+    wip_build.write_build_record(component, {**record, 'compiler': 'c++ (GCC) 4.8.5'})
+    assert component_status(params, component)['status'] == 'stale'
+
+    path_to_extension.write_bytes(b'other binary')
+    assert component_status(params, component)['status'] == 'modified'
@@ -0,0 +1,495 @@
+"""PEP 517 build backend for wip projects.
+
+Projects created with `wip init` use this backend (see the `[build-system]` table of their `pyproject.toml`), so
+that `pip install .`, `pip wheel .` and `python -m build` build all binary extension modules (C++ and Modern
+Fortran components) of the project, concurrently and incrementally, reusing the artifact cache (see `wip cache`),
+and produce a platform wheel containing them. The binary extension modules are built in place, exactly like
+`wip build` does, using the `[tool.wip.build]` table of `pyproject.toml`. Editable installs (`pip install -e .`,
+PEP 660) are supported too, see `build_editable`.
+
+The project metadata are read from the `[tool.poetry]` table of `pyproject.toml`. Settings in the
+`[tool.wip.build]` table can be overridden with config settings, e.g.:
+
+    pip wheel . --config-settings profile=release-native --config-settings jobs=8
+
+Wheels and source distributions are reproducible: files are added in sorted order, with the timestamp given by
+`$SOURCE_DATE_EPOCH` (or else 1980-01-01).
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import sys
+import sysconfig
+import tarfile
+import time
+import zipfile
+
+import wiptools
+import wiptools.component_index as component_index
+import wiptools.utils as utils
+from wiptools.wip.wip_build import BUILD_PROFILE_SUFFIX, BUILD_RECORD, EXT_SUFFIX, BinaryExtensionBuilder \
+                                 , build_profile_flags, compiler_launcher, default_generator, dependency_graph \
+                                 , is_source_file, pyproject_build_config, report_failures, running_python
+from wiptools.wip.wip_cache import ArtifactCache
+
+
+# PEP 517 hooks ########################################################################################################
+def get_requires_for_build_wheel(config_settings: dict = None) -> list:
+    """Return the additional packages needed for building the binary extension modules of the project."""
+    types = component_types(package_path())
+    requires = []
+    if 'cpp' in types:
+        requires.append('nanobind')
+    if 'f90' in types:
+        requires.append('numpy')
+    if types & {'cpp', 'f90'}:
+        if not shutil.which('cmake'):
+            requires.append('cmake')
+        generator = build_settings(config_settings).get('generator', default_generator())
+        if generator == 'Ninja' and not shutil.which('ninja'):
+            requires.append('ninja')
+    return requires
+
+
+def get_requires_for_build_sdist(config_settings: dict = None) -> list:
+    """No additional packages are needed for building a source distribution."""
+    return []
+
+
+def prepare_metadata_for_build_wheel(metadata_directory: str, config_settings: dict = None) -> str:
+    """Write the `.dist-info` directory of the wheel, without building it."""
+    metadata = project_metadata()
+    path_to_dist_info = Path(metadata_directory) / dist_info(metadata)
+    path_to_dist_info.mkdir(parents=True, exist_ok=True)
+    for name, content in dist_info_files(metadata, wheel_tag(package_path())).items():
+        (path_to_dist_info / name).write_bytes(content)
+    return path_to_dist_info.name
+
+
+def build_wheel(wheel_directory: str, config_settings: dict = None, metadata_directory: str = None) -> str:
+    """Build all binary extension modules of the project, and a wheel containing them."""
+    build_components(config_settings)
+    nanobind_shared = as_bool(build_settings(config_settings).get('nanobind-shared', False))
+    project_path = Path.cwd()
+    files = [ (path.relative_to(project_path).as_posix(), path.read_bytes(), os.access(path, os.X_OK))
+              for path in wheel_files(package_path(), nanobind_shared)
+            ]
+    return write_wheel(wheel_directory, files)
+
+
+def get_requires_for_build_editable(config_settings: dict = None) -> list:
+    """Return the additional packages needed for an editable install (see `get_requires_for_build_wheel`)."""
+    return get_requires_for_build_wheel(config_settings)
+
+
+def prepare_metadata_for_build_editable(metadata_directory: str, config_settings: dict = None) -> str:
+    """Write the `.dist-info` directory of the editable wheel, without building it."""
+    return prepare_metadata_for_build_wheel(metadata_directory, config_settings)
+
+
+def build_editable(wheel_directory: str, config_settings: dict = None, metadata_directory: str = None) -> str:
+    """Build all binary extension modules of the project in place, and an editable wheel (PEP 660).
+
+    The editable wheel only contains a `.pth` file, which adds the project directory to `sys.path`, so that the
+    package is imported from the project directory, including the binary extension modules built in place. After
+    modifying a binary extension module, `wip build` rebuilds it in place, as usual.
+    """
+    build_components(config_settings)
+    metadata = project_metadata()
+    pth = f"{Path.cwd()}\n".encode()
+    return write_wheel(wheel_directory, [(f"{distribution_name(metadata['name'])}.pth", pth, False)])
+
+
+def write_wheel(wheel_directory: str, files: list) -> str:
+    """Write a wheel of the project in the current working directory.
+
+    Args:
+        wheel_directory: the directory in which the wheel is written.
+        files: the files of the wheel, except those of the `.dist-info` directory, as (arcname, content, executable)
+            tuples.
+
+    Returns:
+        the filename of the wheel.
+    """
+    metadata = project_metadata()
+    tag = wheel_tag(package_path())
+    filename = f"{distribution_name(metadata['name'])}-{metadata['version']}-{tag}.whl"
+    path_to_wheel = Path(wheel_directory) / filename
+    path_to_wheel.parent.mkdir(parents=True, exist_ok=True)
+
+    records = []
+    with zipfile.ZipFile(path_to_wheel, mode='w', compression=zipfile.ZIP_DEFLATED) as whl:
+        def add(arcname: str, content: bytes, executable: bool = False):
+            info = zipfile.ZipInfo(arcname, date_time=zip_timestamp())
+            info.external_attr = (0o755 if executable else 0o644) << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            whl.writestr(info, content)
+            digest = base64.urlsafe_b64encode(hashlib.sha256(content).digest()).rstrip(b'=').decode()
+            records.append(f"{arcname},sha256={digest},{len(content)}")
+
+        for arcname, content, executable in files:
+            add(arcname, content, executable)
+        dist_info_dir = dist_info(metadata)
+        for name, content in dist_info_files(metadata, tag).items():
+            add(f"{dist_info_dir}/{name}", content)
+        # RECORD is the last file in the wheel, and does not contain its own hash
+        records.append(f"{dist_info_dir}/RECORD,,")
+        info = zipfile.ZipInfo(f"{dist_info_dir}/RECORD", date_time=zip_timestamp())
+        info.external_attr = 0o644 << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        whl.writestr(info, '\n'.join(records) + '\n')
+    return filename
+
+
+def build_sdist(sdist_directory: str, config_settings: dict = None) -> str:
+    """Build a source distribution of the project (without binary extension modules)."""
+    metadata = project_metadata()
+    base_name = f"{distribution_name(metadata['name'])}-{metadata['version']}"
+    filename = f"{base_name}.tar.gz"
+    path_to_sdist = Path(sdist_directory) / filename
+    path_to_sdist.parent.mkdir(parents=True, exist_ok=True)
+
+    mtime = source_date_epoch()
+    with open(path_to_sdist, mode='wb') as fp, \
+         gzip.GzipFile(filename='', fileobj=fp, mode='wb', mtime=mtime) as gz, \
+         tarfile.open(fileobj=gz, mode='w', format=tarfile.PAX_FORMAT) as tar:
+        def add(arcname: str, content: bytes, executable: bool = False):
+            info = tarfile.TarInfo(f"{base_name}/{arcname}")
+            info.size = len(content)
+            info.mtime = mtime
+            info.mode = 0o755 if executable else 0o644
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            tar.addfile(info, io.BytesIO(content))
+
+        project_path = Path.cwd()
+        for path in sdist_files(project_path):
+            add(path.relative_to(project_path).as_posix(), path.read_bytes(), os.access(path, os.X_OK))
+        add('PKG-INFO', metadata_file(metadata))
+    return filename
+
+
+# Building #############################################################################################################
+def read_cookiecutter_params() -> dict:
+    """Read the `wip-cookiecutter.json` file of the project in the current working directory.
+
+    Unlike `utils.read_wip_cookiecutter_json`, the name of the current working directory is not checked, as frontends
+    may build in a directory with another name (e.g. an unpacked source distribution).
+    """
+    with open(Path.cwd() / 'wip-cookiecutter.json') as fp:
+        cookiecutter_params = json.load(fp)
+    cookiecutter_params['project_path'] = str(Path.cwd())
+    return cookiecutter_params
+
+
+def package_path() -> Path:
+    """Return the path to the package directory of the project in the current working directory."""
+    return Path.cwd() / read_cookiecutter_params()['package_name']
+
+
+def build_settings(config_settings: dict = None) -> dict:
+    """Return the `[tool.wip.build]` table of `pyproject.toml`, overridden by the frontend's config settings."""
+    settings = dict(pyproject_build_config())
+    settings.update(config_settings or {})
+    return settings
+
+
+def as_bool(value) -> bool:
+    """Convert a boolean setting, which may be a string if it is a config setting."""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def build_components(config_settings: dict = None):
+    """Build all binary extension modules of the project in the current working directory, like `wip build`.
+
+    Supported config settings are those of the `[tool.wip.build]` table (see `pyproject_build_config`), and
+    `build-type`.
+
+    The binary extension modules are built for the Python interpreter running the backend, rather than the one
+    found by `wip env`, so that they match the tag of the wheel (see `wheel_tag`).
+    """
+    cookiecutter_params = read_cookiecutter_params()
+    settings = build_settings(config_settings)
+    build = BinaryExtensionBuilder(cookiecutter_params, python=running_python())
+    build.cpp_flag = build.f90_flag = True
+    build.build_type = settings.get('build-type', 'Release')
+    build.generator = settings.get('generator', default_generator())
+    build.compiler_launcher = compiler_launcher(as_bool(settings['ccache']) if 'ccache' in settings else None)
+    build.profile = settings.get('profile', 'portable')
+    build.fast_math = as_bool(settings.get('fast-math', False))
+    build.stubs = as_bool(settings.get('stubs', True))
+    build_profile_flags(build.profile)  # validate
+    if as_bool(settings.get('artifact-cache', True)):
+        build.artifact_cache = ArtifactCache()
+    package_path_ = package_path()
+    build.dependencies = dependency_graph(package_path_, settings.get('dependencies', {}))
+    jobs = int(settings.get('jobs', 0))
+
+    components = component_index.components(package_path_)
+    failures = {}
+    if as_bool(settings.get('nanobind-shared', False)):
+        cpp_components = [c for c, type_ in components.items() if type_ == 'cpp']
+        failures = build.build_nanobind_shared(cpp_components, jobs=jobs)
+        build.cpp_flag = False
+    if not failures:
+        failures = build.build_all(list(components), jobs=jobs)
+    if failures:
+        report_failures(failures, cookiecutter_params)
+
+
+# Wheel contents #######################################################################################################
+NANOBIND_CORE_LIBRARY = 'libnanobind.'
+"""Filename prefix of the shared nanobind core library (see `wip build --nb-shared`)."""
+
+BINARY_SUFFIXES = ('.so', '.pyd', '.dylib')
+"""Suffixes of binary extension modules and shared libraries."""
+
+
+def walk_files(path: Path):
+    """Yield the files in a directory tree, in sorted order, except those in directories that are skipped."""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not component_index.skip_dir(d))
+        for name in sorted(files):
+            yield Path(root) / name
+
+
+def component_types(package_path_: Path) -> set:
+    """Return the set of component types in a package."""
+    return set(component_index.components(package_path_).values())
+
+
+def is_extension_module(path: Path, binary_components: list) -> bool:
+    """Test if a file is a binary extension module of a binary component, for any Python version or ABI.
+
+    C++ components install their binary extension module in the component directory, Modern Fortran components in
+    its parent directory.
+    """
+    return path.suffix in BINARY_SUFFIXES and any( path.name.startswith(f"{c.name}.") and path.parent in (c, c.parent)
+                                                   for c in binary_components
+                                                 )
+
+
+def wheel_files(package_path_: Path, nanobind_shared: bool = False) -> list:
+    """Return the files of a package that go into the wheel.
+
+    These are all files, except the sources of the binary extension modules, build records and byte-compiled files.
+    Of the binary extension modules, only those for the Python interpreter running the backend are included, not
+    those left over from builds for other Python versions. The shared nanobind core library is only included if the
+    C++ components are built against it.
+    """
+    binary_components = [c for c, type_ in component_index.components(package_path_).items() if type_ in ('cpp', 'f90')]
+    files = []
+    for path in walk_files(package_path_):
+        if path.name == BUILD_RECORD or path.suffix in ('.pyc', '.pyo'):
+            continue
+        if path.name.startswith(NANOBIND_CORE_LIBRARY) and not nanobind_shared:
+            continue
+        if is_extension_module(path, binary_components) and not path.name.endswith(EXT_SUFFIX):
+            continue
+        if is_source_file(path) and any(c in path.parents for c in binary_components):
+            continue
+        files.append(path)
+    return files
+
+
+def sdist_files(project_path: Path) -> list:
+    """Return the files of a project that go into the source distribution.
+
+    These are `pyproject.toml`, `wip-cookiecutter.json`, the readme and changelog files, and the package and tests
+    directories, without build artifacts, such as binary extension modules for any Python version.
+    """
+    cookiecutter_params = read_cookiecutter_params()
+    files = [project_path / name for name in ('pyproject.toml', 'wip-cookiecutter.json', 'README.md', 'CHANGELOG.md')
+             if (project_path / name).is_file()]
+    for directory in (cookiecutter_params['package_name'], 'tests'):
+        for path in walk_files(project_path / directory):
+            if path.name == BUILD_RECORD or path.suffix in ('.pyc', '.pyo', *BINARY_SUFFIXES) \
+                    or path.name.endswith(BUILD_PROFILE_SUFFIX):
+                continue
+            files.append(path)
+    return files
+
+
+def wheel_tag(package_path_: Path) -> str:
+    """Return the tag of the wheel: `py3-none-any` for pure Python packages, a platform tag otherwise."""
+    if not component_types(package_path_) & {'cpp', 'f90'}:
+        return 'py3-none-any'
+    version = f"{sys.version_info.major}{sys.version_info.minor}"
+    if sys.implementation.name == 'cpython':
+        interpreter = f"cp{version}"
+        abi = f"cp{version}{sys.abiflags}"
+    else:  # e.g. PyPy: SOABI = 'pypy39-pp73-x86_64-linux-gnu'
+        interpreter = f"{sys.implementation.name[0]}{sys.implementation.name[-1]}{version}"
+        abi = '_'.join((sysconfig.get_config_var('SOABI') or 'none').split('-')[:2])
+    platform = re.sub(r'[-.]', '_', sysconfig.get_platform())
+    return f"{interpreter}-{abi}-{platform}"
+
+
+def zip_timestamp() -> tuple:
+    """Return the timestamp of the files in the wheel, as a zipfile date_time tuple."""
+    return time.gmtime(max(source_date_epoch(), 315532800))[:6]  # zip files cannot go back further than 1980
+
+
+def source_date_epoch() -> int:
+    """Return the timestamp for reproducible builds, `$SOURCE_DATE_EPOCH`, or 1980-01-01."""
+    return int(os.environ.get('SOURCE_DATE_EPOCH', 315532800))
+
+
+# Metadata #############################################################################################################
+class MetadataError(ValueError):
+    """Raised for project metadata that cannot be converted to core metadata (e.g. an unsupported version
+    constraint)."""
+
+
+VERSION = re.compile( r'v?(\d+(?:\.\d+)*)'                                          # release
+                      r'(?:[-_.]?(?:alpha|beta|preview|pre|rc|a|b|c)[-_.]?\d*)?'    # pre-release
+                      r'(?:-\d+|[-_.]?(?:post|rev|r)[-_.]?\d*)?'                    # post-release
+                      r'(?:[-_.]?dev[-_.]?\d*)?'                                    # development release
+                      r'(?:\+[a-z0-9]+(?:[-_.][a-z0-9]+)*)?$'                       # local version
+                    , re.IGNORECASE
+                    )
+"""A PEP 440 version, in any of the forms PEP 440 normalizes (e.g. `1.2.3-beta`, `2.0rc1`)."""
+
+SPECIFIER = re.compile(r'(~=|===|==|!=|<=|>=|<|>)(.+)$')
+"""A PEP 440 version specifier: operator and version."""
+
+
+def release(version: str, constraint: str) -> list:
+    """Return the release numbers of a version (e.g. [1, 2, 3] for `1.2.3-beta`).
+
+    Raises:
+        MetadataError: if the version is not a valid PEP 440 version.
+    """
+    match = VERSION.match(version)
+    if not match:
+        raise MetadataError(f"Invalid version `{version}` in version constraint `{constraint}`.")
+    return [int(n) for n in match[1].split('.')]
+
+
+def distribution_name(name: str) -> str:
+    """Normalize a project name for use in wheel and sdist filenames."""
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def dist_info(metadata: dict) -> str:
+    """Return the name of the `.dist-info` directory of the wheel."""
+    return f"{distribution_name(metadata['name'])}-{metadata['version']}.dist-info"
+
+
+def project_metadata() -> dict:
+    """Return the `[tool.poetry]` table of `pyproject.toml` of the project in the current working directory."""
+    return utils.read_pyproject_toml().unwrap().get('tool', {}).get('poetry', {})
+
+
+def pep440_constraint(constraint: str) -> str:
+    """Convert a Poetry version constraint (e.g. `^1.2`, `~1.2.3`, `*`, `1.2`, `>=1,<2`, `^1.2.3-beta`) to PEP 440.
+
+    Raises:
+        MetadataError: for constraints that cannot be converted, i.e. invalid versions, and alternatives
+            (`^1 || ^2`), which PEP 440 cannot express.
+    """
+    if '|' in constraint:
+        raise MetadataError(f"Version constraint `{constraint}`: alternatives (`||`) cannot be converted to PEP 440.")
+    specifiers = []
+    for part in re.split(r'\s*,\s*|\s+', re.sub(r'([\^~<>=!]+)\s+', r'\1', constraint.strip())):
+        if part in ('', '*'):
+            continue
+        if part[0] in '^~' and not part.startswith('~='):
+            release_ = release(part[1:], constraint)
+            if part[0] == '^':
+                # the first non-zero component may not change
+                i = next((i for i, n in enumerate(release_) if n != 0), len(release_) - 1)
+            else:
+                i = 0 if len(release_) == 1 else 1
+            upper = release_[:i] + [release_[i] + 1]
+            specifiers += [f">={part[1:]}", f"<{'.'.join(str(n) for n in upper)}"]
+        elif part[0].isdigit():
+            release(part.removesuffix('.*'), constraint)
+            specifiers.append(f"=={part}")
+        else:
+            match = SPECIFIER.match(part)
+            if not match:
+                raise MetadataError(f"Invalid version constraint `{constraint}`.")
+            if match[1] != '===':  # arbitrary equality compares strings
+                release(match[2].removesuffix('.*') if match[1] in ('==', '!=') else match[2], constraint)
+            specifiers.append(part)
+    return ','.join(specifiers)
+
+
+def requirement(name: str, spec) -> str:
+    """Convert a dependency in the `[tool.poetry.dependencies]` table to a PEP 508 requirement."""
+    if isinstance(spec, str):
+        spec = {'version': spec}
+    extras = f"[{','.join(spec['extras'])}]" if spec.get('extras') else ''
+    if 'git' in spec:
+        ref = spec.get('rev') or spec.get('tag') or spec.get('branch')
+        requirement_ = f"{name}{extras} @ git+{spec['git']}" + (f"@{ref}" if ref else '')
+    else:
+        requirement_ = f"{name}{extras}{pep440_constraint(spec.get('version', '*'))}"
+    markers = []
+    if 'python' in spec:
+        for specifier in pep440_constraint(spec['python']).split(','):
+            operator, version = re.match(r'([<>=!~]+)(.*)', specifier).groups()
+            markers.append(f'python_version {operator} "{version}"')
+    if 'markers' in spec:
+        markers.append(spec['markers'])
+    return f"{requirement_}; {' and '.join(markers)}" if markers else requirement_
+
+
+def metadata_file(metadata: dict) -> bytes:
+    """Return the contents of the METADATA (or PKG-INFO) file."""
+    lines = [ "Metadata-Version: 2.1"
+            , f"Name: {metadata['name']}"
+            , f"Version: {metadata['version']}"
+            ]
+    if metadata.get('description'):
+        lines.append(f"Summary: {metadata['description']}")
+    if metadata.get('license'):
+        lines.append(f"License: {metadata['license']}")
+    for author in metadata.get('authors', []):
+        lines.append(f"Author-email: {author}" if '<' in author else f"Author: {author}")
+    if metadata.get('homepage'):
+        lines.append(f"Home-page: {metadata['homepage']}")
+    if metadata.get('repository'):
+        lines.append(f"Project-URL: Repository, {metadata['repository']}")
+    if metadata.get('keywords'):
+        lines.append(f"Keywords: {','.join(metadata['keywords'])}")
+    for name, spec in metadata.get('dependencies', {}).items():
+        if name == 'python':
+            lines.append(f"Requires-Python: {pep440_constraint(spec)}")
+        elif not (isinstance(spec, dict) and spec.get('optional')):
+            lines.append(f"Requires-Dist: {requirement(name, spec)}")
+    text = '\n'.join(lines) + '\n'
+    readme = metadata.get('readme')
+    if readme and (Path.cwd() / readme).is_file():
+        content_type = 'text/markdown' if readme.endswith('.md') else 'text/x-rst' if readme.endswith('.rst') \
+                       else 'text/plain'
+        text += f"Description-Content-Type: {content_type}\n\n{(Path.cwd() / readme).read_text()}"
+    return text.encode()
+
+
+def dist_info_files(metadata: dict, tag: str) -> dict:
+    """Return the files in the `.dist-info` directory, except RECORD, as a {name: contents} dict."""
+    files = { 'METADATA': metadata_file(metadata)
+            , 'WHEEL'   : ( f"Wheel-Version: 1.0\n"
+                            f"Generator: wiptools ({wiptools.__version__})\n"
+                            f"Root-Is-Purelib: {'true' if tag == 'py3-none-any' else 'false'}\n"
+                            f"Tag: {tag}\n"
+                          ).encode()
+            }
+    scripts = metadata.get('scripts', {})
+    if scripts:
+        entry_points = '[console_scripts]\n' + ''.join(
+            f"{name} = {spec['callable'] if isinstance(spec, dict) else spec}\n" for name, spec in scripts.items()
+        )
+        files['entry_points.txt'] = entry_points.encode()
+    return files
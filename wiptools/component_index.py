@@ -0,0 +1,170 @@
+"""A fast, persistent index of the components of a Python package.
+
+Components are found with a single `os.scandir` pass over the package directory, in which build directories
+(`_cmake_build`, ...), `__pycache__` and hidden directories are pruned. For every scanned directory the index records
+its modification time, its component type and its subdirectories. Adding, removing or renaming an entry in a
+directory changes its modification time, hence, when the index is used again, only directories with a changed
+modification time are rescanned; the others cost a single `stat` call.
+
+The index of a project's package is stored in `.wip/component-index.json` in the project directory, so that it is
+shared by all `wip` subcommands.
+"""
+
+import json
+import os
+from pathlib import Path
+import uuid
+
+
+INDEX = Path('.wip') / 'component-index.json'
+"""Location of the component index, relative to the project directory."""
+
+INDEX_VERSION = 1
+"""Version of the format of the component index. Indexes with another version are discarded."""
+
+
+def skip_dir(name: str) -> bool:
+    """Directories that are never scanned: hidden directories, `__pycache__`, CMake build directories and
+    `.egg-info` directories.
+
+    This is shared by everything that walks a package: the component index, the fingerprints of the components
+    (`wip build`), `wip build --watch` and the build backend. Other directories starting with `_` (e.g. `_detail`)
+    may contain sources.
+    """
+    return name.startswith('.') or name == '__pycache__' or name.startswith('_cmake_build') \
+        or name.endswith('.egg-info')
+
+
+def directory_type(names: list) -> str:
+    """Return the component type of a directory, given the names of its entries (see `utils.component_type`)."""
+    names = [name for name in names if not name.startswith('.')]
+    if any(name.endswith('.cpp') for name in names):
+        return 'cpp'
+    if any(name.endswith('.f90') for name in names):
+        return 'f90'
+    if '__init__.py' in names:
+        return 'py'
+    if '__main__.py' in names:
+        return 'cli'
+    return ''
+
+
+def scan(path: Path) -> dict:
+    """Scan a directory.
+
+    Returns:
+        a dict with the modification time (`mtime_ns`), the component type (`type`) and the sorted names of the
+        subdirectories which are not skipped (`subdirs`) of the directory.
+    """
+    # The modification time is read before the directory, so that changes during the scan are detected next time.
+    mtime_ns = os.stat(path).st_mtime_ns
+    with os.scandir(path) as it:
+        entries = list(it)
+    return { 'mtime_ns': mtime_ns
+           , 'type'    : directory_type([entry.name for entry in entries])
+           , 'subdirs' : sorted(entry.name for entry in entries if not skip_dir(entry.name) and entry.is_dir())
+           }
+
+
+_types = {}
+"""Component types of the directories scanned by this process, as {path: (mtime_ns, type)}."""
+
+
+def component_type(path: Path) -> str:
+    """Return the component type of a directory: `cpp`, `f90`, `py`, `cli`, or an empty string.
+
+    Directories that were scanned before, and were not modified since, are not scanned again.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return ''
+    cached = _types.get(Path(path))
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    entry = scan(path)
+    _types[Path(path)] = (entry['mtime_ns'], entry['type'])
+    return entry['type']
+
+
+class ComponentIndex:
+    """Index of the components of a Python package.
+
+    Components are directories with C++ (`cpp`) or Modern Fortran (`f90`) source files, an `__init__.py` file (`py`)
+    or a `__main__.py` file (`cli`). Subdirectories are only searched for components inside components.
+
+    Args:
+        package_path: path to the package directory.
+        path_to_index: where the index is stored. By default `.wip/component-index.json` in the parent directory of
+            the package if that is a wip project directory, otherwise the index is not stored.
+    """
+    def __init__(self, package_path: Path, path_to_index: Path = None):
+        self.package_path = Path(package_path)
+        if path_to_index is None and (self.package_path.parent / 'wip-cookiecutter.json').is_file():
+            path_to_index = self.package_path.parent / INDEX
+        self.path_to_index = path_to_index
+        self.dirs = {}       # scanned directories, relative to the package directory (posix paths), see scan()
+        self.components = {} # the components, in depth-first order, as {path: type}
+        self.rescanned = 0   # the number of directories that were (re)scanned
+        previous = self.load()
+        self.update(previous)
+        if self.path_to_index and (self.rescanned or self.dirs.keys() != previous.keys()):
+            self.save()
+
+    def load(self) -> dict:
+        """Read the stored index. Returns an empty dict if there is none, or if it is invalid."""
+        if not self.path_to_index:
+            return {}
+        try:
+            with open(self.path_to_index) as fp:
+                index = json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if index.get('version') != INDEX_VERSION or index.get('package') != self.package_path.name:
+            return {}
+        return index.get('dirs', {})
+
+    def save(self):
+        """Store the index, atomically, so that concurrent `wip` processes never read a partial index."""
+        try:
+            self.path_to_index.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path_to_index.with_name(f".{self.path_to_index.name}.{uuid.uuid4().hex}")
+            with open(tmp, mode='w') as fp:
+                json.dump({'version': INDEX_VERSION, 'package': self.package_path.name, 'dirs': self.dirs}, fp)
+            os.replace(tmp, self.path_to_index)
+        except OSError:
+            pass  # e.g. a read-only project directory: the index is just not stored
+
+    def entry(self, relpath: str, previous: dict):
+        """Return the scan of a directory, from the previous index if the directory was not modified since."""
+        path = self.package_path / relpath if relpath else self.package_path
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        entry = previous.get(relpath)
+        if not entry or entry['mtime_ns'] != mtime_ns:
+            entry = scan(path)
+            self.rescanned += 1
+        self.dirs[relpath] = entry
+        _types[path] = (entry['mtime_ns'], entry['type'])
+        return entry
+
+    def update(self, previous: dict):
+        """Find all components, reusing the scans of the previous index for unmodified directories."""
+        def visit(relpath: str, entry: dict):
+            for name in entry['subdirs']:
+                child_relpath = f"{relpath}/{name}" if relpath else name
+                child = self.entry(child_relpath, previous)
+                if child and child['type']:
+                    self.components[self.package_path / child_relpath] = child['type']
+                    visit(child_relpath, child)
+
+        root = self.entry('', previous)
+        if root:
+            visit('', root)
+
+
+def components(package_path: Path) -> dict:
+    """Return the components of a package, in depth-first order, as a {path: type} dict (see `ComponentIndex`)."""
+    return ComponentIndex(package_path).components
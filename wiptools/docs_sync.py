@@ -0,0 +1,189 @@
+"""Synchronizing the API reference of the project documentation (mkdocs) with the components of the project.
+
+Every component has its own page in `docs/api/`, named after the component's module (e.g. `docs/api/foo.bar.md`),
+with a mkdocstrings entry for the module. `docs/api-reference.md` links to these pages in a section delimited by
+`SECTION_BEGIN` and `SECTION_END`. The rest of `docs/api-reference.md` is left as is, except for mkdocstrings
+entries of components, which are moved to their page.
+
+The pages and the section are regenerated from the component index (see `component_index`), in depth-first order,
+so that the result does not depend on the order in which components were added. A page is only written if its
+contents, or the source files of its component, changed since the previous synchronization. Hence, after
+`wip docs --sync`, `mkdocs build --dirty` (or `mkdocs serve --dirty`) only renders the pages of the components
+that changed. The digests of the pages are kept in `.wip/docs-sync.json`.
+
+The pages, `docs/api-reference.md` and `.wip/docs-sync.json` are all written (and obsolete pages removed) when the
+project state is committed (see `project_state`), so that a failing command leaves the documentation as it was.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import time
+
+import wiptools.component_index as component_index
+from wiptools.project_state import ProjectState
+
+
+CACHE = Path('.wip') / 'docs-sync.json'
+"""Location of the synchronization cache, relative to the project directory."""
+
+CACHE_VERSION = 1
+"""Version of the format of the synchronization cache. Caches with another version are discarded."""
+
+PAGES = Path('docs') / 'api'
+"""Directory of the component pages, relative to the project directory."""
+
+SECTION_BEGIN = '<!-- begin components (generated by `wip docs --sync`, edits are overwritten) -->'
+SECTION_END = '<!-- end components -->'
+
+DESCRIPTIONS = { 'py' : 'Python module'
+               , 'cli': 'Command line interface'
+               , 'cpp': 'C++ binary extension module'
+               , 'f90': 'Modern Fortran binary extension module'
+               }
+"""Description of each component type."""
+
+
+def module_name(project_path: Path, path_to_component: Path) -> str:
+    """Return the module name of a component, e.g. `foo.bar` for `<project_path>/foo/bar`."""
+    return '.'.join(path_to_component.relative_to(project_path).parts)
+
+
+def page(module: str, component_type: str, relpath: str) -> str:
+    """Return the contents of the page of a component.
+
+    The page of a CLI documents its `__main__` module, the page of a C++ component its binary extension module,
+    which is installed in the component directory (e.g. `foo.bar.bar`).
+    """
+    documented = f"{module}.__main__"                  if component_type == 'cli' else \
+                 f"{module}.{module.rsplit('.', 1)[-1]}" if component_type == 'cpp' else \
+                 module
+    return f"<!-- generated by `wip docs --sync`, edits are overwritten -->\n" \
+           f"# `{module}`\n\n" \
+           f"{DESCRIPTIONS[component_type]} `{relpath}`.\n\n" \
+           f"::: {documented}\n"
+
+
+def source_stamp(path_to_component: Path, component_type: str = '') -> list:
+    """Return the (name, size, modification time) of the files of a component (not of its subcomponents).
+
+    Modern Fortran components install their binary extension module, and its stub file, in the parent directory,
+    these files are included too.
+    """
+    stamp = []
+    with os.scandir(path_to_component) as it:
+        for entry in it:
+            if not entry.name.startswith('.') and entry.is_file():
+                stat = entry.stat()
+                stamp.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    if component_type == 'f90':
+        with os.scandir(path_to_component.parent) as it:
+            for entry in it:
+                if entry.name.startswith(f"{path_to_component.name}.") and entry.is_file():
+                    stat = entry.stat()
+                    stamp.append((f"../{entry.name}", stat.st_size, stat.st_mtime_ns))
+    return sorted(stamp)
+
+
+def digest(text: str, stamp: list) -> str:
+    """Return the digest of a page and of the source files of its component."""
+    return hashlib.sha256(json.dumps([text, stamp]).encode()).hexdigest()
+
+
+def section(modules: dict) -> str:
+    """Return the section of `docs/api-reference.md` which links to the pages of the components.
+
+    Args:
+        modules: the component types of the modules, as {module: component type}.
+    """
+    lines = [SECTION_BEGIN, '## Components', '']
+    for module, component_type in modules.items():
+        lines.append(f"* [`{module}`]({PAGES.name}/{module}.md): {DESCRIPTIONS[component_type]}")
+    lines.append(SECTION_END)
+    return '\n'.join(lines)
+
+
+def update_api_reference(text: str, modules: dict) -> str:
+    """Replace the components section of `docs/api-reference.md` (or append it), and remove the mkdocstrings
+    entries of the components elsewhere.
+    """
+    entries = {f"::: {module}" for module in modules}
+    begin, end = text.find(SECTION_BEGIN), text.find(SECTION_END)
+    if 0 <= begin < end:
+        before, after = text[:begin], text[end + len(SECTION_END):]
+    else:
+        before, after = text, ''
+    before = '\n'.join(line for line in before.splitlines() if line.strip() not in entries).rstrip('\n')
+    after = '\n'.join(line for line in after.splitlines() if line.strip() not in entries).strip('\n')
+    result = f"{before}\n\n{section(modules)}\n" if before else f"{section(modules)}\n"
+    return f"{result}\n{after}\n" if after else result
+
+
+def read_cache(project_path: Path) -> dict:
+    """Read the synchronization cache, as {module: {'digest': ..., 'mtime_ns': ...}}."""
+    try:
+        with open(project_path / CACHE) as fp:
+            cache = json.load(fp)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return cache.get('pages', {}) if cache.get('version') == CACHE_VERSION else {}
+
+
+def write_cache(project: ProjectState, pages: dict):
+    """Store the synchronization cache when the project state is committed."""
+    project.write(CACHE, json.dumps({'version': CACHE_VERSION, 'pages': pages}, indent=2))
+
+
+def mtime_ns(path: Path):
+    """Return the modification time of a file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def sync(project: ProjectState) -> dict:
+    """Synchronize the API reference of the project documentation with the components of the project.
+
+    The component pages, `docs/api-reference.md` and the synchronization cache are modified in the project state,
+    and written when the project state is committed.
+
+    Returns:
+        the modules whose page was written (`written`) or removed (`removed`), and the number of `unchanged` pages.
+    """
+    project_path = project.project_path
+    package_path = project_path / project.cookiecutter_params['package_name']
+    components = component_index.components(package_path)
+    modules = {module_name(project_path, path): component_type for path, component_type in components.items()}
+
+    cache = read_cache(project_path)
+    pages = {}
+    result = {'written': [], 'removed': [], 'unchanged': 0}
+    # The modification time of the pages written, recorded in the cache before they are written. Whole seconds,
+    # because not all file systems store the modification time with nanosecond precision.
+    now = time.time_ns() // 10**9 * 10**9
+    for (path_to_component, component_type), module in zip(components.items(), modules):
+        page_name = PAGES / f"{module}.md"
+        text = page(module, component_type, path_to_component.relative_to(project_path).as_posix())
+        digest_ = digest(text, source_stamp(path_to_component, component_type))
+        cached = cache.get(module, {})
+        # The page is up to date if neither the page, nor the component changed since it was written.
+        if cached.get('digest') == digest_ and cached.get('mtime_ns') == mtime_ns(project_path / page_name):
+            result['unchanged'] += 1
+            pages[module] = cached
+        else:
+            project.write(page_name, text, mtime_ns=now)
+            result['written'].append(module)
+            pages[module] = {'digest': digest_, 'mtime_ns': now}
+
+    # remove the pages of components that were removed (only pages written by a previous synchronization)
+    for module in cache:
+        if module not in pages:
+            project.remove(PAGES / f"{module}.md")
+            result['removed'].append(module)
+
+    project.api_reference = update_api_reference(project.api_reference, modules)
+    if pages != cache:
+        write_cache(project, pages)
+    return result
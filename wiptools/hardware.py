@@ -0,0 +1,248 @@
+"""Detecting the hardware capabilities of the machine: cores and SMT layout, SIMD instruction sets, caches, NUMA nodes,
+and the native architecture and OpenMP support of the compilers.
+
+The information is read from `/proc/cpuinfo` and `/sys/devices/system` (Linux), and obtained from the compilers
+found by `wip env` (see `toolchain`). On other platforms, only the information available from Python is reported.
+
+`wip env --hw` stores the machine profile in `.wip/machine.json` in the project directory. `wip build` then uses it
+for its defaults:
+
+* the `-march=native` flag of the `release-native` and `release-lto` build profiles is replaced by the native
+  architecture detected for the compiler (e.g. `-march=znver3`), so that builds on machines with different
+  architectures do not share artifacts in the artifact cache. (Without machine profile, `wip build` determines
+  what `-march=native` stands for itself, see `wip_build.native_target`.)
+* the number of physical cores, and whether the compiler supports OpenMP, are passed to CMake as `WIP_NUM_THREADS`
+  and `WIP_OPENMP`, for use by the CMakeLists.txt files of the cpp and f90 components.
+
+The machine profile is only used on the machine it was detected on (same hostname and CPU model), e.g. not on the
+other nodes of a cluster sharing the project directory. Elsewhere, `-march=native` is kept.
+"""
+
+import concurrent.futures
+import datetime
+import functools
+import json
+import os
+from pathlib import Path
+import platform
+import re
+import subprocess
+import tempfile
+
+from wiptools.project_state import write_atomic
+import wiptools.toolchain as toolchain
+import wiptools.utils as utils
+
+
+PROFILE = Path('.wip') / 'machine.json'
+"""Location of the machine profile, relative to the project directory."""
+
+SIMD_FLAGS = re.compile(r'(sse\w*|ssse3|pni|avx\w*|fma|f16c|amx\w*|asimd\w*|sve\w*|neon)$')
+"""The SIMD instruction sets among the CPU flags in `/proc/cpuinfo` (x86 and Arm). (`pni` is SSE3.)"""
+
+SIMD_LEVELS = ( ('avx512', 'avx512f'), ('avx2', 'avx2'), ('avx', 'avx'), ('sse4.2', 'sse4_2'), ('sse2', 'sse2')
+              , ('sve', 'sve'), ('neon', 'asimd'), ('neon', 'neon')
+              )
+"""(level, CPU flag) pairs, from best to worst, for summarizing the SIMD support of the CPU."""
+
+OPENMP_TESTS = { 'c++'     : ('test.cpp', '#include <omp.h>\nint main() { return omp_get_max_threads() > 0 ? 0 : 1; }\n')
+               , 'gfortran': ('test.f90', 'program test\n  use omp_lib\n  print *, omp_get_max_threads()\nend program\n')
+               }
+"""(file name, source code) of the test programs for OpenMP support, for each compiler in `toolchain.TOOLS`."""
+
+COMPILER_TIMEOUT = 60
+"""Maximum duration (in seconds) of a compiler invocation."""
+
+
+def read_text(path) -> str:
+    """Return the contents of a text file, or an empty string if it cannot be read."""
+    try:
+        with open(path) as fp:
+            return fp.read().strip()
+    except OSError:
+        return ''
+
+
+def parse_cpu_list(cpu_list: str) -> list:
+    """Parse a list of cpus as in `/sys` (e.g. `0-3,8-11`)."""
+    cpus = []
+    for item in cpu_list.split(','):
+        if '-' in item:
+            first, last = item.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        elif item.strip():
+            cpus.append(int(item))
+    return cpus
+
+
+def parse_size(size: str) -> int:
+    """Parse a cache size as in `/sys` (e.g. `32K`) into bytes."""
+    match = re.fullmatch(r'(\d+)\s*([KMG]?)', size.strip())
+    if not match:
+        return 0
+    return int(match[1]) * {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30}[match[2]]
+
+
+def cpuinfo(path='/proc/cpuinfo') -> dict:
+    """Return the CPU model and flags from `/proc/cpuinfo` (first processor)."""
+    info = {}
+    for line in read_text(path).split('\n\n')[0].splitlines():
+        key, _, value = line.partition(':')
+        info.setdefault(key.strip(), value.strip())
+    return { 'model': info.get('model name') or info.get('Model') or info.get('cpu model') or platform.processor()
+           , 'flags': (info.get('flags') or info.get('Features') or '').split()
+           }
+
+
+def simd(flags: list) -> dict:
+    """Return the SIMD instruction sets among the CPU flags, and the best SIMD level (see `SIMD_LEVELS`)."""
+    instruction_sets = sorted(flag for flag in flags if SIMD_FLAGS.match(flag))
+    level = next((level for level, flag in SIMD_LEVELS if flag in flags), '')
+    return {'level': level, 'instruction_sets': instruction_sets}
+
+
+def topology(path='/sys/devices/system/cpu') -> dict:
+    """Return the number of logical cpus, physical cores and sockets, and the number of threads per core (SMT)."""
+    path = Path(path)
+    cores = set()
+    online = read_text(path / 'online')
+    for cpu in parse_cpu_list(online) if online else []:
+        core_id = read_text(path / f'cpu{cpu}' / 'topology' / 'core_id')
+        package_id = read_text(path / f'cpu{cpu}' / 'topology' / 'physical_package_id')
+        if core_id:
+            cores.add((package_id, core_id))
+    logical_cpus = os.cpu_count() or 1
+    physical_cores = len(cores) or logical_cpus
+    return { 'logical_cpus'    : logical_cpus
+           , 'available_cpus'  : utils.available_cores()
+           , 'physical_cores'  : physical_cores
+           , 'sockets'         : len({package_id for package_id, _ in cores}) or 1
+           , 'threads_per_core': max(1, logical_cpus // physical_cores)
+           }
+
+
+def caches(path='/sys/devices/system/cpu/cpu0/cache') -> list:
+    """Return the caches of the first cpu: level, type, size (bytes), and the number of cpus sharing it."""
+    result = []
+    for index in sorted(Path(path).glob('index*')):
+        shared_cpu_list = read_text(index / 'shared_cpu_list')
+        result.append( { 'level'    : int(read_text(index / 'level') or 0)
+                       , 'type'     : read_text(index / 'type')
+                       , 'size'     : parse_size(read_text(index / 'size'))
+                       , 'shared_by': len(parse_cpu_list(shared_cpu_list)) if shared_cpu_list else 1
+                       }
+                     )
+    return result
+
+
+def numa_nodes(path='/sys/devices/system/node') -> list:
+    """Return the NUMA nodes and their cpus."""
+    nodes = []
+    for node in Path(path).glob('node[0-9]*'):
+        nodes.append({'node': int(node.name[4:]), 'cpus': read_text(node / 'cpulist')})
+    return sorted(nodes, key=lambda node: node['node'])
+
+
+def native_architecture(compiler: str) -> str:
+    """Return the architecture selected by `-march=native` for a compiler (e.g. `znver3`), or an empty string.
+
+    GCC reports it with `-Q --help=target`, Clang with the `-target-cpu` of its compiler invocation (`-###`).
+    """
+    for arguments, pattern in ( (['-march=native', '-Q', '--help=target'], r'^\s*-march=\s+(\S+)')
+                              , (['-march=native', '-###', '-x', 'c', '-c', os.devnull], r'"-target-cpu" "([^"]+)"')
+                              ):
+        try:
+            completed_process = subprocess.run( [compiler, *arguments], capture_output=True, text=True
+                                              , timeout=COMPILER_TIMEOUT
+                                              )
+        except (OSError, subprocess.TimeoutExpired):
+            return ''
+        match = re.search(pattern, completed_process.stdout + completed_process.stderr, re.MULTILINE)
+        if not completed_process.returncode and match and match[1] != 'native':
+            return match[1]
+    return ''
+
+
+def openmp_support(name: str, compiler: str) -> bool:
+    """Test if a compiler can compile and link an OpenMP program (with `-fopenmp`)."""
+    filename, source = OPENMP_TESTS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / filename).write_text(source)
+        try:
+            completed_process = subprocess.run( [compiler, '-fopenmp', filename, '-o', 'test']
+                                              , cwd=tmp, capture_output=True, timeout=COMPILER_TIMEOUT
+                                              )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return completed_process.returncode == 0
+
+
+def compilers() -> dict:
+    """Return the native architecture and OpenMP support of the compilers found by `wip env`, as
+    {name: {'executable': ..., 'version': ..., 'march': ..., 'openmp': ...}}.
+
+    The compilers are queried concurrently.
+    """
+    tools = toolchain.probe(OPENMP_TESTS)
+    found = {name: tool for name, tool in tools.items() if tool['found']}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, 2 * len(found))) as executor:
+        futures = { name: ( executor.submit(native_architecture, tool['executable'])
+                          , executor.submit(openmp_support, name, tool['executable'])
+                          )
+                    for name, tool in found.items()
+                  }
+    return { name: { 'executable': found[name]['executable'], 'version': found[name]['version']
+                   , 'march': march.result(), 'openmp': openmp.result()
+                   }
+             for name, (march, openmp) in futures.items()
+           }
+
+
+@functools.lru_cache(maxsize=None)
+def identity() -> tuple:
+    """Return the (hostname, CPU model) of this machine, which identify the machine a profile was detected on."""
+    return platform.node(), cpuinfo()['model']
+
+
+def is_this_machine(profile: dict) -> bool:
+    """Test if a machine profile was detected on this machine (see `identity`)."""
+    return (profile.get('hostname'), profile.get('cpu')) == identity()
+
+
+def detect() -> dict:
+    """Detect the hardware capabilities of this machine (the machine profile)."""
+    info = cpuinfo()
+    return { 'hostname'  : platform.node()
+           , 'machine'   : platform.machine()
+           , 'cpu'       : info['model']
+           , 'detected'  : datetime.datetime.now().isoformat(timespec='seconds')
+           , **topology()
+           , 'simd'      : simd(info['flags'])
+           , 'caches'    : caches()
+           , 'numa_nodes': numa_nodes()
+           , 'compilers' : compilers()
+           }
+
+
+def save(profile: dict, project_path: Path):
+    """Store a machine profile in the project directory (atomically)."""
+    path = Path(project_path) / PROFILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(profile, indent=2))
+
+
+def load(project_path: Path) -> dict:
+    """Return the machine profile stored in the project directory, or None if there is none, or if it was detected
+    on another machine (see `is_this_machine`).
+    """
+    try:
+        with open(Path(project_path) / PROFILE) as fp:
+            profile = json.load(fp)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return profile if is_this_machine(profile) else None
+
+
+def default_threads(profile: dict) -> int:
+    """The default number of threads: one per physical core available to this process."""
+    return max(1, min(profile['physical_cores'], profile['available_cpus'] // profile['threads_per_core']))
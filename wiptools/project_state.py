@@ -0,0 +1,236 @@
+"""The state of a wip project: `pyproject.toml`, `wip-cookiecutter.json` and the docs index `docs/api-reference.md`.
+
+A `wip` command that modifies the project state opens a `ProjectState`. Each file is read and parsed at most
+once, when it is first needed, and all edits are made in memory. Other files that a command generates (e.g. the
+pages of `wip docs --sync`) are registered with `ProjectState.write` and `ProjectState.remove`. When the command
+succeeds, every modified file is written once, atomically (write to a temporary file and rename), so that other
+processes never see partially written files. The files are only renamed when all of them were written, so that a
+failure while writing (e.g. a full disk) leaves the project as it was. If the command fails, nothing is written.
+
+While a `ProjectState` is open, it holds an exclusive lock on `.wip/project.lock` in the project directory, so that
+concurrent `wip` commands in the same project (e.g. from a script) are serialized instead of overwriting each
+other's edits. (The lock is advisory and only available on POSIX systems.)
+"""
+
+import json
+import os
+from pathlib import Path
+import shutil
+import uuid
+
+import tomlkit
+
+import wiptools.messages as messages
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+LOCK = Path('.wip') / 'project.lock'
+"""Location of the project lock file, relative to the project directory."""
+
+PYPROJECT_TOML = 'pyproject.toml'
+WIP_COOKIECUTTER_JSON = 'wip-cookiecutter.json'
+API_REFERENCE_MD = Path('docs') / 'api-reference.md'
+
+
+def stage(path: Path, text: str, mtime_ns: int = None) -> Path:
+    """Write the new contents of a text file to a temporary file next to it, and return the temporary file.
+
+    The temporary file gets the permissions of the file, if it exists, and the modification time `mtime_ns`, if
+    given. It is removed if it cannot be written.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        with open(tmp, mode='w') as fp:
+            fp.write(text)
+        if path.exists():
+            shutil.copymode(path, tmp)
+        if mtime_ns is not None:
+            os.utime(tmp, ns=(mtime_ns, mtime_ns))
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return tmp
+
+
+def write_atomic(path: Path, text: str):
+    """Write a text file atomically: write a temporary file next to it, and rename it.
+
+    The file keeps its permissions if it exists.
+    """
+    tmp = stage(path, text)
+    try:
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class ProjectState:
+    """Context manager for reading and modifying the state of a wip project.
+
+    Args:
+        project_path: path to the project directory, by default the current working directory.
+
+    Example:
+        ```python
+        with ProjectState() as project:
+            project.pyproject['tool']['poetry']['scripts']['foo'] = 'foo.foo.__main__:main'
+            project.add_api_reference('foo.bar')
+        # pyproject.toml and docs/api-reference.md are written here, once.
+        ```
+    """
+    def __init__(self, project_path=None):
+        self.project_path = Path(project_path).resolve() if project_path else Path.cwd()
+        self._loaded = {}       # {file name: contents as read}
+        self._pyproject = None
+        self._cookiecutter_params = None
+        self._api_reference = None
+        self._pending = {}      # {file name: (new contents, modification time), or None to remove the file}
+        self._lock = None
+
+    def __enter__(self):
+        if fcntl:
+            path_to_lock = self.project_path / LOCK
+            path_to_lock.parent.mkdir(parents=True, exist_ok=True)
+            self._lock = open(path_to_lock, mode='w')
+            fcntl.flock(self._lock, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            if self._lock:
+                self._lock.close()  # releases the lock
+                self._lock = None
+
+    def _read(self, name) -> str:
+        """Read a file of the project, and remember its contents, to detect modifications on commit."""
+        text = (self.project_path / name).read_text()
+        self._loaded[str(name)] = text
+        return text
+
+    @property
+    def pyproject(self) -> tomlkit.TOMLDocument:
+        """The parsed `pyproject.toml` file (modify it in place)."""
+        if self._pyproject is None:
+            self._pyproject = tomlkit.parse(self._read(PYPROJECT_TOML))
+        return self._pyproject
+
+    @property
+    def cookiecutter_params(self) -> dict:
+        """The contents of `wip-cookiecutter.json` (modify it in place, or assign it in a new project).
+
+        As in `utils.read_wip_cookiecutter_json`, `project_path` is added, but it is not stored. Exits if the file
+        is missing.
+        """
+        if self._cookiecutter_params is None:
+            try:
+                self._cookiecutter_params = json.loads(self._read(WIP_COOKIECUTTER_JSON))
+            except FileNotFoundError:
+                messages.error_message(f"`{self.project_path}` does not contain a `wip-cookiecutter.json` file.\n"
+                                       f"Not a wip project?"
+                                      )
+            if self.project_path.name != self._cookiecutter_params['project_name']:
+                messages.error_message(f"The name of the project directory `{self.project_path.name}` "
+                                       f"differs from the project name: This is unexpected.")
+            self._cookiecutter_params['project_path'] = str(self.project_path)
+        return self._cookiecutter_params
+
+    @cookiecutter_params.setter
+    def cookiecutter_params(self, params: dict):
+        self._cookiecutter_params = dict(params)
+        self._cookiecutter_params['project_path'] = str(self.project_path)
+
+    @property
+    def api_reference(self) -> str:
+        """The contents of `docs/api-reference.md` (empty if the project has no documentation yet)."""
+        if self._api_reference is None:
+            try:
+                self._api_reference = self._read(API_REFERENCE_MD)
+            except FileNotFoundError:
+                self._api_reference = self._loaded[str(API_REFERENCE_MD)] = ''
+        return self._api_reference
+
+    @api_reference.setter
+    def api_reference(self, text: str):
+        self._api_reference = text
+
+    def add_api_reference(self, module: str) -> bool:
+        """Add a mkdocstrings entry (`::: <module>`) for a Python module to `docs/api-reference.md`, unless it is
+        already there.
+
+        Returns:
+            True if the entry was added.
+        """
+        entry = f"::: {module}"
+        if entry in self.api_reference.splitlines():
+            return False
+        self.api_reference += f"\n{entry}"
+        return True
+
+    def write(self, name, text: str, mtime_ns: int = None):
+        """Write another file of the project (e.g. a generated documentation page) when the project state is
+        committed, together with the project files.
+
+        Args:
+            name: path of the file, relative to the project directory. Missing parent directories are created.
+            text: the new contents of the file.
+            mtime_ns: the modification time of the file, by default the time it is written. This allows for
+                recording the modification time before the file is written.
+        """
+        self._pending[str(name)] = (text, mtime_ns)
+
+    def remove(self, name):
+        """Remove a file of the project (if it exists) when the project state is committed.
+
+        Args:
+            name: path of the file, relative to the project directory.
+        """
+        self._pending[str(name)] = None
+
+    def modified(self) -> dict:
+        """Return the modified files, as {file name: new contents}."""
+        modified = {}
+        if self._pyproject is not None:
+            modified[PYPROJECT_TOML] = tomlkit.dumps(self._pyproject)
+        if self._cookiecutter_params is not None:
+            params = {k: v for k, v in self._cookiecutter_params.items() if k != 'project_path'}
+            loaded = self._loaded.get(WIP_COOKIECUTTER_JSON)
+            if loaded is None or json.loads(loaded) != params:  # ignore formatting
+                modified[WIP_COOKIECUTTER_JSON] = json.dumps(params, indent=2)
+        if self._api_reference is not None:
+            modified[str(API_REFERENCE_MD)] = self._api_reference
+        return {name: text for name, text in modified.items() if self._loaded.get(name) != text}
+
+    def commit(self):
+        """Write the modified files and the files registered with `write`, each with a single atomic write, and
+        remove the files registered with `remove`.
+
+        All files are written to temporary files first, and only renamed when all of them were written. If writing
+        fails, the temporary files are removed and the project is left as it was.
+        """
+        modified = self.modified()
+        files = {name: (text, None) for name, text in modified.items()}
+        files.update({name: pending for name, pending in self._pending.items() if pending is not None})
+        staged = []
+        try:
+            for name, (text, mtime_ns) in files.items():
+                path = self.project_path / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                staged.append((stage(path, text, mtime_ns), path))
+            for tmp, path in staged:
+                os.replace(tmp, path)
+        finally:
+            for tmp, _ in staged:
+                tmp.unlink(missing_ok=True)
+        for name, pending in self._pending.items():
+            if pending is None:
+                (self.project_path / name).unlink(missing_ok=True)
+        self._loaded.update(modified)
+        self._pending = {}
@@ -0,0 +1,282 @@
+"""Generating `.pyi` stub files for the binary extension modules of C++ and Modern Fortran components.
+
+With a stub file next to a binary extension module, mkdocstrings, IDEs and type checkers learn the signatures of
+the module without importing it, hence without building it first.
+
+* For C++ components, the stub is generated by nanobind's stubgen, which imports the binary extension module.
+* For Modern Fortran components, the stub is generated from the f2py signature file (`.pyf`), which describes the
+  interface of the binary extension module. The signature file of the build (`_cmake_build/f2py/<name>.pyf`) is
+  reused, if there is none (e.g. when the module was restored from the artifact cache), it is extracted from the
+  Fortran source code with `f2py -h`. The binary extension module is not imported.
+
+A stub file is only written if its contents changed, i.e. if the interface of the module changed, so that tools
+which watch it (e.g. `wip docs --sync`) do not process it needlessly.
+"""
+
+from pathlib import Path
+import re
+import subprocess
+import tempfile
+
+from wiptools.project_state import write_atomic
+import wiptools.toolchain as toolchain
+
+
+class StubError(Exception):
+    """Raised when a stub file cannot be generated."""
+
+
+STUB_TIMEOUT = 120
+"""Maximum duration (in seconds) of a stub generator (nanobind's stubgen, `f2py -h`)."""
+
+PYTHON_TYPES = { 'integer'         : 'int'
+               , 'real'            : 'float'
+               , 'double precision': 'float'
+               , 'complex'         : 'complex'
+               , 'double complex'  : 'complex'
+               , 'logical'         : 'bool'
+               , 'character'       : 'str'
+               }
+"""Python types of the Fortran scalar types, as converted by f2py."""
+
+DECLARATION = re.compile(r'(integer|real|double\s+precision|double\s+complex|complex|logical|character|type)'
+                         r'\s*(\([^)]*\)|\*\s*\(\*\)|\*\s*\d+)?\s*,?\s*(.*)$', re.IGNORECASE)
+"""A variable declaration in a signature file: the type, its kind or length, and the attributes."""
+
+PROCEDURE = re.compile(r'(?:\S+\s+)?(subroutine|function)\s+(\w+)\s*\(([^)]*)\)(?:\s*result\s*\((\w+)\))?'
+                       , re.IGNORECASE)
+"""A subroutine or function statement in a signature file (functions may have a type prefix)."""
+
+
+def path_to_stub(path_to_extension: Path) -> Path:
+    """Return the path to the stub file of a binary extension module (next to it, with the module name)."""
+    return path_to_extension.parent / (path_to_extension.name.split('.')[0] + '.pyi')
+
+
+def extension_module(project_path: Path, path_to_extension: Path) -> str:
+    """Return the module name of a binary extension module, e.g. `foo.bar.bar` for `foo/bar/bar.<suffix>`."""
+    parts = path_to_extension.parent.relative_to(project_path).parts
+    return '.'.join((*parts, path_to_extension.name.split('.')[0]))
+
+
+def python() -> str:
+    """Return the Python interpreter used for building (see `wip env`)."""
+    tool = toolchain.probe(['python'])['python']
+    return tool['executable'] if tool['found'] else 'python'
+
+
+def run(command: list, cwd=None) -> subprocess.CompletedProcess:
+    """Run a stub generator, raising StubError if it fails."""
+    try:
+        completed_process = subprocess.run( command, cwd=cwd, capture_output=True, text=True
+                                          , timeout=STUB_TIMEOUT
+                                          )
+    except (OSError, subprocess.TimeoutExpired) as error:
+        raise StubError(f"`{' '.join(command)}` failed: {error}")
+    if completed_process.returncode:
+        raise StubError(f"`{' '.join(command)}` failed:\n{completed_process.stderr}")
+    return completed_process
+
+
+def nanobind_stub(project_path: Path, path_to_extension: Path, python_: str = '') -> str:
+    """Generate the stub of a nanobind binary extension module with nanobind's stubgen, run by the Python interpreter
+    `python_` (by default, see `python`).
+    """
+    module = extension_module(project_path, path_to_extension)
+    with tempfile.TemporaryDirectory() as tmp:
+        path_to_output = Path(tmp) / 'stub.pyi'
+        run( [ python_ or python(), '-m', 'nanobind.stubgen', '-q', '-m', module, '-i', str(project_path)
+             , '-o', str(path_to_output)
+             ]
+           )
+        return path_to_output.read_text()
+
+
+def f2py_signature(path_to_component: Path, python_: str = '') -> str:
+    """Return the f2py signature file of a Modern Fortran component: the one of the build if there is one,
+    otherwise it is extracted from the first Fortran source file (`<name>.f90`, as in the component's
+    CMakeLists.txt) with `f2py -h`, run by the Python interpreter `python_` (by default, see `python`).
+    """
+    name = path_to_component.name
+    path_to_signature = path_to_component / '_cmake_build' / 'f2py' / f"{name}.pyf"
+    if path_to_signature.is_file():
+        return path_to_signature.read_text()
+    with tempfile.TemporaryDirectory() as tmp:
+        run( [ python_ or python(), '-m', 'numpy.f2py', '-h', f"{name}.pyf", '-m', name
+             , str(path_to_component / f"{name}.f90"), '--overwrite-signature', '--quiet'
+             ]
+           , cwd=tmp
+           )
+        return (Path(tmp) / f"{name}.pyf").read_text()
+
+
+def split_attributes(attributes: str) -> list:
+    """Split a comma separated list of attributes, ignoring the commas inside parentheses."""
+    result, depth, current = [], 0, ''
+    for c in attributes:
+        depth += (c == '(') - (c == ')')
+        if c == ',' and depth == 0:
+            result.append(current.strip())
+            current = ''
+        else:
+            current += c
+    if current.strip():
+        result.append(current.strip())
+    return result
+
+
+def parse_declaration(line: str):
+    """Parse a variable declaration of a signature file.
+
+    Returns:
+        (name, Fortran type, attributes) or None if the line is not a declaration. The attributes are
+        {attribute name: arguments}, e.g. {'intent': 'in,out', 'dimension': 'n', 'optional': ''}.
+    """
+    left, separator, right = line.partition('::')
+    match = DECLARATION.match(left.strip()) if separator else None
+    if not match:
+        return None
+    attributes = {}
+    for attribute in split_attributes(match[3]):
+        attribute_name, _, arguments = attribute.partition('(')
+        attributes[attribute_name.strip().lower()] = arguments.rstrip(')').replace(' ', '').lower()
+    name = right.split('=')[0].strip()
+    return name, ' '.join(match[1].lower().split()), attributes
+
+
+def python_type(fortran_type: str, attributes: dict, intent: set) -> str:
+    """Return the Python type of a variable of a signature file."""
+    if 'dimension' in attributes:
+        return 'numpy.typing.ArrayLike' if intent <= {'in'} else 'numpy.ndarray'
+    if fortran_type == 'character' and 'out' in intent:
+        return 'bytes'
+    return PYTHON_TYPES.get(fortran_type, 'typing.Any')
+
+
+def procedure_stub(kind: str, name: str, arguments: list, result: str, declarations: dict, indent: str = '') -> list:
+    """Return the stub of a subroutine or function of a signature file, as f2py wraps it.
+
+    Arguments with `intent(out)` are returned rather than passed, as are the results of functions, arguments with
+    `intent(hide)` are omitted, and optional arguments are passed last.
+    """
+    required, optional, returned = [], [], []
+    if kind == 'function':
+        fortran_type, attributes = declarations.get(result or name, ('', {}))
+        returned.append(python_type(fortran_type, attributes, {'out'}))
+    for argument in arguments:
+        fortran_type, attributes = declarations.get(argument, ('', {}))
+        if 'external' in attributes:
+            required.append(f"{argument}: typing.Callable[..., typing.Any]")
+            continue
+        intent = set(attributes.get('intent', 'in').split(',')) - {'c', 'cache', 'copy', 'overwrite', 'aux'}
+        if 'inout' in intent or 'inplace' in intent:
+            intent = {'inout'}
+        if 'out' in intent:
+            returned.append(python_type(fortran_type, attributes, {'out'}))
+        if 'hide' in intent or intent == {'out'}:
+            continue
+        argument_stub = f"{argument}: {python_type(fortran_type, attributes, intent)}"
+        if 'optional' in attributes:
+            optional.append(f"{argument_stub} = ...")
+        else:
+            required.append(argument_stub)
+    returns = 'None'             if not returned      else \
+              returned[0]        if len(returned) == 1 else \
+              f"tuple[{', '.join(returned)}]"
+    return [ f"{indent}def {name}({', '.join(required + optional)}) -> {returns}:"
+           , f'{indent}    """Wrapper for Fortran {kind} ``{name}``."""'
+           ]
+
+
+def f2py_stub(signature: str, module: str) -> str:
+    """Generate the stub of an f2py binary extension module from its signature file.
+
+    Fortran modules become classes with static methods and attributes, e.g. a Fortran module `tools` in binary
+    extension module `foo` is stubbed as class `_tools`, and `foo.tools` as an instance of it.
+    """
+    header = '\n'.join([ '# Generated by `wip build` from the f2py signature file. Edits are overwritten.'
+                       , f'"""Binary extension module `{module}` (Modern Fortran), generated by f2py."""'
+                       , ''
+                       , 'import typing'
+                       , ''
+                       , 'import numpy'
+                       , 'import numpy.typing'
+                       ])
+    blocks = [header]           # the top level blocks of the stub, separated by two empty lines
+    fortran_module = None       # the Fortran module being parsed, if any
+    members = []                # the members of the class of the Fortran module being parsed
+    procedure = None            # (kind, name, arguments, result) of the procedure being parsed, if any
+    declarations = {}           # {name: (Fortran type, attributes)} of the procedure or Fortran module being parsed
+    module_declarations = {}
+    for line in signature.splitlines():
+        line = line.split('!')[0].strip()
+        words = line.lower().split()
+        if not words:
+            continue
+        if words[0] == 'end':
+            if procedure and len(words) > 1 and words[1] in ('subroutine', 'function'):
+                if fortran_module:
+                    members.append('\n'.join(['    @staticmethod', *procedure_stub(*procedure, declarations, '    ')]))
+                    declarations = module_declarations
+                else:
+                    blocks.append('\n'.join(procedure_stub(*procedure, declarations)))
+                procedure = None
+            elif fortran_module and len(words) > 1 and words[1] == 'module':
+                attributes = [ f"    {name}: {python_type(fortran_type, attributes, {'out'})}"
+                               for name, (fortran_type, attributes) in module_declarations.items()
+                             ]
+                if attributes:
+                    members.insert(0, '\n'.join(attributes))
+                blocks.append(f"class _{fortran_module}:\n" + ('\n\n'.join(members) if members else '    pass'))
+                blocks.append(f"{fortran_module}: _{fortran_module}")
+                fortran_module, members, declarations, module_declarations = None, [], {}, {}
+            continue
+        if words[0] == 'module' and not procedure:
+            fortran_module = words[1]
+            declarations = module_declarations = {}
+            continue
+        match = PROCEDURE.match(line)
+        if match and not procedure:
+            kind, name, arguments, result = match[1].lower(), match[2], match[3], match[4]
+            procedure = (kind, name, [a.strip() for a in arguments.split(',') if a.strip()], result)
+            declarations = {}
+            continue
+        if words[0] == 'external' and procedure:
+            for name in ''.join(words[1:]).split(','):
+                declarations[name] = ('', {'external': ''})
+            continue
+        declaration = parse_declaration(line)
+        if declaration:
+            name, fortran_type, attributes = declaration
+            declarations[name] = (fortran_type, attributes)
+    return '\n\n\n'.join(blocks) + '\n'
+
+
+def update_stub( project_path: Path, path_to_component: Path, component_type: str, path_to_extension: Path
+               , python_: str = ''
+               ) -> bool:
+    """Generate the stub file of the binary extension module of a component, and write it if it changed.
+
+    Args:
+        project_path: path to the project directory.
+        path_to_component: path to the component.
+        component_type: `cpp` or `f90`.
+        path_to_extension: path to the installed binary extension module of the component.
+        python_: the Python interpreter for which the binary extension module was built, by default the one found
+            by `wip env`.
+
+    Returns:
+        True if the stub file was written.
+
+    Raises:
+        StubError: if the stub cannot be generated.
+    """
+    if component_type == 'cpp':
+        text = nanobind_stub(project_path, path_to_extension, python_)
+    else:
+        text = f2py_stub(f2py_signature(path_to_component, python_), extension_module(project_path, path_to_extension))
+    path = path_to_stub(path_to_extension)
+    if path.is_file() and path.read_text() == text:
+        return False
+    write_atomic(path, text)
+    return True
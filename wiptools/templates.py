@@ -0,0 +1,191 @@
+"""Expanding the cookiecutter templates bundled with wiptools, without cookiecutter.
+
+The bundled templates only use cookiecutter variables (`{{cookiecutter.<name>}}`), in file contents and in file and
+directory names. Hence, they can be expanded by plain substitution, which produces exactly the same output as
+cookiecutter, but is much faster: there is no Jinja environment to set up, no `cookiecutter.json` to re-read and
+re-render, and no replay files are written.
+
+Templates are precompiled once per wiptools version into a list of files, whose names and contents are split into
+literal text and variable names. The precompiled templates are cached in `$XDG_CACHE_HOME/wip/templates` (or
+`~/.cache/wip/templates`). The cache key also covers the names, sizes and modification times of the template files,
+so that modified templates (e.g. in a development install) are recompiled.
+
+Templates that use other Jinja syntax (`{% ... %}`, `{# ... #}`, filters, ...) are rejected when they are compiled.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import stat
+
+import wiptools
+import wiptools.messages as messages
+from wiptools.project_state import write_atomic
+
+
+VARIABLE = re.compile(r'\{\{\s*cookiecutter\.(\w+)\s*\}\}')
+"""A cookiecutter variable."""
+
+JINJA = re.compile(r'\{\{|\{%|\{#')
+"""Jinja syntax. Outside cookiecutter variables, this is not supported."""
+
+
+class TemplateError(Exception):
+    """A template cannot be compiled or expanded."""
+
+
+def cache_path() -> Path:
+    """Return the location of the cache of precompiled templates."""
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'wip' / 'templates'
+
+
+def tokenize(text: str, where: str) -> list:
+    """Split a text in literal text and variable names: `[literal, name, literal, name, ..., literal]`.
+
+    Raises:
+        TemplateError: if the text contains unsupported Jinja syntax.
+    """
+    tokens = VARIABLE.split(text)
+    for literal in tokens[::2]:
+        if JINJA.search(literal):
+            raise TemplateError(f"{where}: unsupported template syntax (only `{{{{cookiecutter.<name>}}}}` is "
+                                f"supported).")
+    return tokens
+
+
+def render(tokens: list, context: dict, where: str) -> str:
+    """Substitute the variables in a tokenized text."""
+    parts = []
+    for i, token in enumerate(tokens):
+        if i % 2 == 0:
+            parts.append(token)
+        elif token in context:
+            parts.append(str(context[token]))
+        else:
+            raise TemplateError(f"{where}: undefined variable `cookiecutter.{token}`.")
+    return ''.join(parts)
+
+
+def template_files(path_to_template: Path) -> list:
+    """Return the directories and files of a template, relative to the template directory, in sorted order.
+
+    `cookiecutter.json` and `__pycache__` directories are not part of the expanded template.
+    """
+    paths = []
+    for root, dirs, files in os.walk(path_to_template):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        root = Path(root)
+        for name in dirs + sorted(files):
+            if root == path_to_template and name == 'cookiecutter.json':
+                continue
+            paths.append((root / name).relative_to(path_to_template))
+    return paths
+
+
+def template_stamp(path_to_template: Path) -> str:
+    """Return the cache key of a template: a hash of the wiptools version, and of the names, sizes and modification
+    times of the template files."""
+    h = hashlib.sha256(wiptools.__version__.encode())
+    for path in [Path('cookiecutter.json')] + template_files(path_to_template):
+        st = (path_to_template / path).stat()
+        h.update(f"\0{path.as_posix()}\0{st.st_size}\0{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def compile_template(path_to_template: Path) -> dict:
+    """Compile a template.
+
+    Returns:
+        a dict with the default values of the variables (from `cookiecutter.json`), and the list of directories and
+        files of the template. Their (posix) paths and the contents of text files are tokenized (see `tokenize`),
+        binary files are base64-encoded.
+    """
+    with open(path_to_template / 'cookiecutter.json') as fp:
+        variables = json.load(fp)
+    entries = []
+    for path in template_files(path_to_template):
+        path_to_file = path_to_template / path
+        entry = { 'path': tokenize(path.as_posix(), str(path_to_file))
+                , 'mode': stat.S_IMODE(path_to_file.stat().st_mode)
+                }
+        if path_to_file.is_file():
+            content = path_to_file.read_bytes()
+            try:
+                entry['text'] = tokenize(content.decode('utf-8'), str(path_to_file))
+            except UnicodeDecodeError:
+                entry['binary'] = base64.b64encode(content).decode()
+        entries.append(entry)
+    if len({''.join(entry['path']).split('/')[0] for entry in entries}) != 1:
+        raise TemplateError(f"{path_to_template}: a template must contain exactly one top-level directory.")
+    return {'variables': variables, 'entries': entries}
+
+
+_compiled = {}
+"""Templates compiled, or loaded from the cache, by this process, as {(path to template, stamp): compiled template}."""
+
+
+def load_template(path_to_template: Path) -> dict:
+    """Return a compiled template, from the cache if possible (see `compile_template`)."""
+    path_to_template = Path(path_to_template)
+    stamp = template_stamp(path_to_template)
+    compiled = _compiled.get((path_to_template, stamp))
+    if compiled:
+        return compiled
+    path_to_cached = cache_path() / f"{path_to_template.name}-{stamp}.json"
+    try:
+        with open(path_to_cached) as fp:
+            compiled = json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        compiled = compile_template(path_to_template)
+        try:
+            path_to_cached.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path_to_cached, json.dumps(compiled))
+            # remove outdated versions of this template
+            outdated = re.compile(rf"{re.escape(path_to_template.name)}-[0-9a-f]{{16}}")
+            for path in path_to_cached.parent.glob(f"{path_to_template.name}-*.json"):
+                if path != path_to_cached and outdated.fullmatch(path.stem):
+                    path.unlink(missing_ok=True)
+        except OSError:
+            pass  # the cache is not writable, the template is only compiled for this process
+    _compiled[(path_to_template, stamp)] = compiled
+    return compiled
+
+
+def expand(template, extra_context: dict, output_dir, overwrite_if_exists: bool = False) -> Path:
+    """Expand a template, like `cookiecutter(template, extra_context=..., output_dir=..., no_input=True, ...)`.
+
+    Args:
+        template: path to the template directory.
+        extra_context: values of the template variables. Variables which are not in the `cookiecutter.json` file of
+            the template are ignored, as in cookiecutter.
+        output_dir: directory in which the top-level directory of the template is expanded.
+        overwrite_if_exists: overwrite the files of the expanded template if its top-level directory already exists.
+
+    Returns:
+        the path to the expanded top-level directory.
+    """
+    compiled = load_template(Path(template))
+    context = dict(compiled['variables'])
+    context.update((name, value) for name, value in extra_context.items() if name in context)
+
+    output_dir = Path(output_dir)
+    where = f"template {Path(template).name}"
+    top_level = output_dir / render(compiled['entries'][0]['path'], context, where).split('/')[0]
+    if top_level.exists() and not overwrite_if_exists:
+        messages.error_message(f"Error: \"{top_level}\" directory already exists")
+    for entry in compiled['entries']:
+        path = output_dir / render(entry['path'], context, where)
+        if 'text' in entry:
+            content = render(entry['text'], context, f"{where}: {path.name}").encode('utf-8')
+        elif 'binary' in entry:
+            content = base64.b64decode(entry['binary'])
+        else:
+            path.mkdir(parents=True, exist_ok=True)
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        os.chmod(path, entry['mode'])
+    return top_level
@@ -0,0 +1,191 @@
+"""Probing the tools needed by wip projects: Python, git, gh, bumpversion, and the build toolchain (CMake, the C++
+and Fortran compilers, nanobind, f2py, ninja and compiler caches).
+
+Every tool is probed by running it (e.g. `cmake --version`) in a subprocess. The probes run concurrently, and their
+results are cached in `$XDG_CACHE_HOME/wip/toolchain.json` (or `~/.cache/wip/toolchain.json`). A cached result
+remains valid as long as the tool resolves to the same executable on the `PATH`, and that executable (and, for
+Python packages, the site-packages directory) is not modified. Hence, changing the `PATH` (e.g. by loading another
+compiler module), `$CXX` or `$FC`, or installing another version of a tool, only reprobes the affected tools.
+
+`wip env` reports the results, and `wip build` reuses them, e.g. to pass the compilers and the location of nanobind
+to CMake, rather than letting every CMake configure step rediscover them.
+"""
+
+import concurrent.futures
+import json
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import uuid
+
+
+PYTHON_PROBE = "import sys, sysconfig; print('Python', sys.version.split()[0]); " \
+               "print(sysconfig.get_config_var('EXT_SUFFIX'))"
+"""Print the Python version (like `python --version`), and the filename suffix of its binary extension modules."""
+
+PYTHON_PACKAGES = ('nanobind', 'f2py')
+"""Tools which are Python packages. They are probed with the Python interpreter on the `PATH`."""
+
+NANOBIND_PROBE = "import sysconfig; print(sysconfig.get_paths()['purelib']); " \
+                 "import nanobind; print(nanobind.__version__); print(nanobind.cmake_dir())"
+"""Print the site-packages directory, and the nanobind version and CMake directory."""
+
+F2PY_PROBE = "import sysconfig; print(sysconfig.get_paths()['purelib']); " \
+             "import numpy, numpy.f2py; print(numpy.__version__); print(numpy.get_include()); " \
+             "print(numpy.f2py.get_include())"
+"""Print the site-packages directory, the numpy (and f2py) version, and the numpy and f2py include directories."""
+
+TOOLS = { 'python'     : ('python'     , ['-c', PYTHON_PROBE])
+        , 'git'        : ('git'        , ['--version'])
+        , 'gh'         : ('gh'         , ['--version'])
+        , 'bumpversion': ('bumpversion', ['--version'])
+        , 'cmake'      : ('cmake'      , ['--version'])
+        , 'c++'        : ('c++'        , ['--version'])
+        , 'gfortran'   : ('gfortran'   , ['--version'])
+        , 'nanobind'   : ('python'     , ['-c', NANOBIND_PROBE])
+        , 'f2py'       : ('python'     , ['-c', F2PY_PROBE])
+        , 'ninja'      : ('ninja'      , ['--version'])
+        , 'ccache'     : ('ccache'     , ['--version'])
+        , 'sccache'    : ('sccache'    , ['--version'])
+        }
+"""The probed tools, as {name: (command, arguments)}. The compilers can be overridden with `$CXX` and `$FC`."""
+
+BUILD_TOOLS = ('python', 'cmake', 'c++', 'gfortran', 'nanobind', 'f2py', 'ninja')
+"""The tools used by `wip build`."""
+
+PROBE_TIMEOUT = 60
+"""Maximum duration (in seconds) of a probe. Tools which do not respond in time are reported as missing."""
+
+CACHE_VERSION = 2
+"""Version of the format of the cache file. Caches with another version are discarded."""
+
+
+def cache_path() -> Path:
+    """Return the location of the cache file of the probe results."""
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'wip' / 'toolchain.json'
+
+
+def command(name: str) -> str:
+    """Return the command for a tool (see `TOOLS`), or the name itself for other tools (e.g. a compiler path)."""
+    if name == 'c++':
+        return os.environ.get('CXX') or 'c++'
+    if name == 'gfortran':
+        return os.environ.get('FC') or 'gfortran'
+    return TOOLS[name][0] if name in TOOLS else name
+
+
+def mtime_ns(path: str):
+    """Return the modification time of a file or directory, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def probe_tool(name: str, executable: str) -> dict:
+    """Probe a tool.
+
+    Args:
+        name: the name of the tool (see `TOOLS`), or the path to an executable, which is probed with `--version`.
+        executable: the path to the executable of the tool, as found on the `PATH`, or None.
+
+    Returns:
+        a dict with the executable (empty if not on the `PATH`), whether the tool was `found`, its version (the
+        first line of the tool's output), and `stamp`, the modification times of the files which determine the
+        result: the executable, and for Python packages, the site-packages directory, which is modified when
+        packages are installed or removed. Python also has the `ext_suffix` of its binary extension modules, nanobind
+        its `cmake_dir`, and f2py the `numpy_include_dir` and `f2py_include_dir`.
+    """
+    result = {'executable': executable or '', 'found': False, 'version': '', 'stamp': {}}
+    if not executable:
+        return result
+    arguments = TOOLS[name][1] if name in TOOLS else ['--version']
+    try:
+        completed_process = subprocess.run( [executable, *arguments], capture_output=True, text=True
+                                          , timeout=PROBE_TIMEOUT
+                                          )
+    except (OSError, subprocess.TimeoutExpired):
+        return result  # without a stamp, the tool is probed again next time
+    result['stamp'][executable] = mtime_ns(executable)
+    if name in PYTHON_PACKAGES:
+        lines = completed_process.stdout.splitlines()
+        if lines:
+            result['stamp'][lines[0]] = mtime_ns(lines[0])
+        lines = lines[1:]
+    else:
+        # Some tools print their version on stderr.
+        lines = (completed_process.stdout or completed_process.stderr).splitlines()
+    if completed_process.returncode or not lines:
+        return result
+    result['found'] = True
+    result['version'] = lines[0].strip()
+    if name == 'python' and len(lines) >= 2:
+        result['ext_suffix'] = lines[1]
+    elif name == 'nanobind' and len(lines) >= 2:
+        result['cmake_dir'] = lines[1]
+    elif name == 'f2py' and len(lines) >= 3:
+        result['numpy_include_dir'], result['f2py_include_dir'] = lines[1], lines[2]
+    return result
+
+
+def is_valid(result: dict, executable: str) -> bool:
+    """Test if a cached probe result is still valid for the executable currently found on the `PATH`."""
+    if result.get('executable', '') != (executable or ''):
+        return False
+    if not executable:
+        return True  # still not found
+    return bool(result.get('stamp')) and all(mtime_ns(path) == mtime for path, mtime in result['stamp'].items())
+
+
+def read_cache() -> dict:
+    """Read the cached probe results, as {name: result}."""
+    try:
+        with open(cache_path()) as fp:
+            cache = json.load(fp)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return cache.get('tools', {}) if cache.get('version') == CACHE_VERSION else {}
+
+
+def write_cache(results: dict):
+    """Store probe results (atomically, so that concurrent `wip` processes never read a partial file)."""
+    path = cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        with open(tmp, mode='w') as fp:
+            json.dump({'version': CACHE_VERSION, 'PATH': os.environ.get('PATH', ''), 'tools': results}, fp, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # the cache is not writable: the tools are probed again next time
+
+
+def probe(names=None, refresh: bool = False) -> dict:
+    """Probe tools, concurrently, reusing the valid cached results.
+
+    Args:
+        names: the names of the tools to probe (see `TOOLS`), or paths to executables. By default, all tools in
+            `TOOLS`.
+        refresh: ignore the cached results.
+
+    Returns:
+        the probe results (see `probe_tool`), as {name: result}, in the order of `names`.
+    """
+    names = list(TOOLS) if names is None else list(names)
+    cache = {} if refresh else read_cache()
+    executables = {name: shutil.which(command(name)) for name in names}
+    results = {name: cache[name] for name in names if name in cache and is_valid(cache[name], executables[name])}
+    stale = [name for name in names if name not in results]
+    if stale:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            futures = {name: executor.submit(probe_tool, name, executables[name]) for name in stale}
+        results.update({name: future.result() for name, future in futures.items()})
+        write_cache({**read_cache(), **results})
+    return {name: results[name] for name in names}
+
+
+def version(executable: str) -> str:
+    """Return the version (the first line of the output of `<executable> --version`) of an executable, from the
+    cache if possible, or an empty string if it is not found."""
+    return probe([executable])[executable]['version']
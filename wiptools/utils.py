@@ -4,6 +4,8 @@ import os
 from pathlib import Path
 import re
 import subprocess
+import tempfile
+import time
 
 # try:
 #     import tomllib
@@ -15,7 +17,9 @@ from typing import List, Union, Tuple, Callable
 
 import click
 
+import wiptools.component_index as component_index
 import wiptools.messages as messages
+import wiptools.project_state as project_state
 
 @contextmanager
 def in_directory(path):
@@ -144,27 +148,126 @@ def subprocess_run_cmds(
                    , Tuple[str,dict]        # a (command string, kwargs) pair
                    , List[Union[str,Tuple[str,dict]]]  # a list of the above
                    ],
+        cwd: Path = None,
+        exit_on_failure: bool = True,
+        timings: list = None,
+        **kwargs
     ):
-    """Run a series of commands using subprocess.run, optionally with kwargs, and exit on failure."""
+    """Run a series of commands using subprocess.run, optionally with kwargs, and exit on failure.
+
+    Args:
+        cmds: the commands to run.
+        cwd: directory in which the commands are run. Defaults to the current working directory. Unlike
+            [`in_directory`][wiptools.utils.in_directory] this does not change the current working directory
+            of the process, and is therefore safe to use from multiple threads.
+        exit_on_failure: if True, exit when a command fails, otherwise raise `subprocess.CalledProcessError`.
+        timings: if not None, a (command, wall time, cpu time) tuple is appended for every command that was run
+            (see [`subprocess_run_timed`][wiptools.utils.subprocess_run_timed]).
+        kwargs: keyword arguments passed to subprocess.run for every command. The kwargs of a
+            (command string, kwargs) pair take precedence.
+    """
 
     if isinstance(cmds, (str, tuple)):
         cmds = [cmds]
 
+    def run(command, **kwargs):
+        if timings is None:
+            return subprocess.run(command, **kwargs)
+        return subprocess_run_timed(command, timings, **kwargs)
+
+    directory = Path(cwd) if cwd else Path.cwd()
     for cmd in cmds:
         if isinstance(cmd, str):
             # a command without kwargs
             command = cmd
-            with messages.TaskInfo(f"Running `{command}` in directory {Path.cwd()}"):
-                completed_process = subprocess.run(command, shell=True)
+            with messages.TaskInfo(f"Running `{command}` in directory {directory}"):
+                completed_process = run(command, shell=True, cwd=cwd, **kwargs)
         else:
             # a command with kwargs
             command = cmd[0]
-            kwargs  = cmd[1]
-            with messages.TaskInfo(f"Running `{command} {kwargs=}` in directory {Path.cwd()}"):
-                completed_process = subprocess.run(command, shell=True, **kwargs, )
+            kwargs_ = {**kwargs, **cmd[1]}
+            with messages.TaskInfo(f"Running `{command} kwargs={cmd[1]}` in directory {directory}"):
+                completed_process = run(command, shell=True, cwd=cwd, **kwargs_, )
 
         if completed_process.returncode:
-            messages.error_message(f'Command `{command}` failed')
+            if exit_on_failure:
+                messages.error_message(f'Command `{command}` failed')
+            raise subprocess.CalledProcessError(
+                completed_process.returncode, command,
+                output=completed_process.stdout, stderr=completed_process.stderr
+            )
+
+
+def subprocess_run_timed(command, timings: list, capture_output: bool = False, **kwargs):
+    """Like subprocess.run, but also measure the wall time and cpu time of the command.
+
+    The cpu time is the user + system time of the command and all its descendants, which is obtained from
+    `os.wait4`, and therefore only accounts for this command, even when other commands are running concurrently.
+    Where `os.wait4` is not available, the cpu time is None.
+
+    Args:
+        command: the command to run.
+        timings: a (command, wall time, cpu time) tuple is appended to this list.
+        capture_output: capture stdout and stderr, as in subprocess.run.
+        kwargs: keyword arguments passed to subprocess.Popen.
+
+    Returns:
+        a subprocess.CompletedProcess object.
+    """
+    text = kwargs.get('text') or kwargs.get('universal_newlines')
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        if capture_output:
+            # Temporary files, rather than pipes, can be read after waiting for the process, without the risk of
+            # deadlock.
+            kwargs.update(stdout=out, stderr=err)
+        start = time.perf_counter()
+        process = subprocess.Popen(command, **kwargs)
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu = rusage.ru_utime + rusage.ru_stime
+        else:
+            process.wait()
+            cpu = None
+        timings.append((command, time.perf_counter() - start, cpu))
+
+        stdout = stderr = None
+        if capture_output:
+            out.seek(0)
+            err.seek(0)
+            stdout, stderr = out.read(), err.read()
+            if text:
+                stdout, stderr = stdout.decode(errors='replace'), stderr.decode(errors='replace')
+    return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+
+
+def available_cores() -> int:
+    """Return the number of cores this process is allowed to use."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # os.sched_getaffinity is not available on all platforms (e.g. macOS)
+        return os.cpu_count() or 1
+
+
+def parse_size(size: str) -> int:
+    """Convert a size like `500M` or `2G` (or a plain number of bytes) to a number of bytes."""
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    size = size.strip().upper().rstrip('B').rstrip('I')
+    try:
+        if size and size[-1] in units:
+            return int(float(size[:-1]) * units[size[-1]])
+        return int(size)
+    except ValueError:
+        messages.error_message(f"Invalid size `{size}`, expecting e.g. `500M` or `2G`.")
+
+
+def format_size(size: int) -> str:
+    """Format a number of bytes in human readable form."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
 
 
 def read_pyproject_toml():
@@ -173,12 +276,14 @@ def read_pyproject_toml():
         toml = tomlkit.load(fp=fp)
         return toml
 def write_pyproject_toml(toml: dict):
-    """"""
-    with open('pyproject.toml', mode='w') as fp:
-        tomlkit.dump(toml, fp=fp)
+    """Write `pyproject.toml` atomically (see `project_state.write_atomic`)."""
+    project_state.write_atomic(Path('pyproject.toml'), tomlkit.dumps(toml))
 
 class PyProjectTOML:
-    """Context manager class for  """
+    """Context manager class for reading and writing `pyproject.toml`.
+
+    `wip` commands which also modify other project files use a `project_state.ProjectState`.
+    """
     def __init__(self, mode="r"):
         self.mode = mode
     def __enter__(self):
@@ -203,17 +308,8 @@ def docs_format() -> str:
         return ''
 
 def component_type(path_to_component):
-    """return the type of a component directory."""
-    if list(path_to_component.glob('*.cpp')):
-        return 'cpp'
-    elif list(path_to_component.glob('*.f90')):
-        return 'f90'
-    elif list(path_to_component.glob('__init__.py')):
-        return 'py'
-    elif list(path_to_component.glob('__main__.py')):
-        return 'cli'
-    else:
-        return ''
+    """return the type of a component directory (see `component_index.component_type`)."""
+    return component_index.component_type(path_to_component)
 
 def component_string(component: Path, type: str = ''):
     type_ = type if type else component_type(component)
@@ -228,10 +324,10 @@ def component_string(component: Path, type: str = ''):
     return s
 
 def iter_components(path: Path, apply: Callable):
-    for entry in path.iterdir():
-        if entry.is_dir():
-            comp_type = component_type(entry)
-            if comp_type:
-                apply(entry)
-                iter_components(entry, apply=apply)
+    """Apply `apply` to all components in package directory `path`, in depth-first order.
+
+    The components are looked up in the project's component index (see `component_index.ComponentIndex`).
+    """
+    for component in component_index.components(path):
+        apply(component)
 
@@ -0,0 +1,179 @@
+"""Watching directory trees for file changes.
+
+On Linux, changes are detected with inotify (through ctypes, no extra dependencies are needed). Elsewhere, or if
+inotify is not available, the directory trees are polled.
+"""
+
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+
+from wiptools.component_index import skip_dir
+
+
+def walk_dirs(path: Path):
+    """Yield `path` and all its subdirectories which are not skipped (see `component_index.skip_dir`)."""
+    for root, dirs, _ in os.walk(path):
+        dirs[:] = [d for d in dirs if not skip_dir(d)]
+        yield Path(root)
+
+
+class Watcher:
+    """Base class for watching directory trees. Watchers are context managers."""
+    def wait(self, timeout: float = None) -> set:
+        """Wait for changes.
+
+        Args:
+            timeout: maximum time to wait, in seconds. None waits until a change is detected.
+
+        Returns:
+            the set of paths of the files that were created, modified or deleted (empty after a timeout).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    """Watch directory trees for changes by comparing the modification times and sizes of their files."""
+    def __init__(self, paths: list, interval: float = 0.5):
+        self.paths = [Path(p) for p in paths]
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> dict:
+        """Return a dict with a (mtime_ns, size) tuple for every file in the watched directory trees."""
+        snapshot = {}
+        for path in self.paths:
+            for directory in walk_dirs(path):
+                try:
+                    entries = list(os.scandir(directory))
+                except FileNotFoundError:
+                    continue
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+                    except FileNotFoundError:
+                        pass
+        return snapshot
+
+    def wait(self, timeout: float = None) -> set:
+        """Wait for changes (see Watcher.wait)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.scan()
+            changes = {p for p in snapshot.keys() | self.snapshot.keys() if snapshot.get(p) != self.snapshot.get(p)}
+            self.snapshot = snapshot
+            if changes:
+                return changes
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+
+class InotifyWatcher(Watcher):
+    """Watch directory trees for changes with inotify (Linux only).
+
+    Raises:
+        OSError: if inotify is not available.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_IGNORED     = 0x00008000
+    IN_ISDIR       = 0x40000000
+    IN_CLOEXEC     = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+    def __init__(self, paths: list):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux.")
+        self.paths = [Path(p) for p in paths]
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # watch descriptor -> directory
+        try:
+            for path in self.paths:
+                self.add_tree(path)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, path: Path):
+        """Watch a directory and all its subdirectories which are not skipped."""
+        for directory in walk_dirs(path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.watches[wd] = directory
+
+    def wait(self, timeout: float = None) -> set:
+        """Wait for changes (see Watcher.wait)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changes = set()
+        while not changes:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return changes
+            data = os.read(self.fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & self.IN_IGNORED:
+                    self.watches.pop(wd, None)  # the watched directory was removed
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = directory / name
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not skip_dir(name):
+                        # watch the new directory, and report the files that it already contains
+                        self.add_tree(path)
+                        changes.update(p for d in walk_dirs(path) for p in d.iterdir() if p.is_file())
+                else:
+                    changes.add(path)
+        return changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watcher(paths: list, polling: bool = False):
+    """Return an InotifyWatcher for a list of directory trees, or a PollingWatcher if inotify is not available.
+
+    Args:
+        paths: directories to watch, including their subdirectories (except build and hidden directories).
+        polling: use a PollingWatcher, even if inotify is available.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):  # AttributeError: libc has no inotify functions
+            pass
+    return PollingWatcher(paths)
@@ -11,12 +11,10 @@ import sys
 import click
 
 import wiptools
-from wiptools.wip.wip_add   import wip_add
-from wiptools.wip.wip_build import wip_build
-from wiptools.wip.wip_docs  import wip_docs
-from wiptools.wip.wip_env   import wip_env
-from wiptools.wip.wip_info  import wip_info
-from wiptools.wip.wip_init  import wip_init
+
+# The implementations of the subcommands (wiptools.wip.wip_<subcommand>) are imported by the subcommands themselves,
+# when they are invoked, because some of them are expensive to import (e.g. cookiecutter). `wip --version`, `wip info`,
+# ... do not pay for what they do not use.
 
 def wip_version():
     return f"wip CLI v{wiptools.__version__}"
@@ -92,13 +90,30 @@ def init( ctx
     assert ctx.params['md'] == md
     assert ctx.params['rst'] == rst
 
+    from wiptools.wip.wip_init import wip_init
     wip_init(ctx)
 
 
 @main.command()
+@click.option('--json', is_flag=True, default=False
+             , help='Print the probe results as JSON (as cached for reuse by `wip build`).'
+             )
+@click.option('--refresh', is_flag=True, default=False
+             , help='Probe all tools again, rather than reusing the cached results of tools which did not change.'
+             )
+@click.option('--hw', is_flag=True, default=False
+             , help='Detect the hardware capabilities of this machine (cores, SIMD instruction sets, caches, NUMA '
+                    'nodes, native architecture and OpenMP support of the compilers). In a project directory, the '
+                    'machine profile is stored in `.wip/machine.json`, for use by `wip build`.'
+             )
 @click.pass_context
-def env(ctx):
-    """Check the environment for needed components."""
+def env(ctx, json, refresh, hw):
+    """Check the environment for needed components.
+
+    Python, git, gh, bumpversion and the build toolchain (CMake, the C++ and Fortran compilers, nanobind, f2py,
+    ninja, ccache and sccache) are probed concurrently.
+    """
+    from wiptools.wip.wip_env import wip_env
     wip_env(ctx)
 
 @main.command()
@@ -108,14 +123,24 @@ def env(ctx):
 @click.option('--rst', is_flag=True
              , help='Add documentation templates (restructuredText format) to this project.'
              )
+@click.option('--sync', is_flag=True, default=False
+             , help='Synchronize the API reference (`docs/api-reference.md` and `docs/api/`) with the components of '
+                    'the project. Only the pages of components that changed are rewritten, so that '
+                    '`mkdocs build --dirty` only renders those.'
+             )
 @click.pass_context
-def docs(ctx, md, rst):
-    """Add documentation to the project."""
+def docs(ctx, md, rst, sync):
+    """Add documentation to the project, or synchronize its API reference with the components."""
+    from wiptools.wip.wip_docs import wip_docs
     wip_docs(ctx)
 
 
 @main.command()
-@click.argument('component')
+@click.argument('components', nargs=-1)
+@click.option('--manifest', default=None, type=click.Path(exists=True, dir_okay=False)
+             , help='File with components to add, one per line, optionally followed by a component flag, '
+                    'e.g. `foo/bar_cpp --cpp`. Components without a flag get the component flag on the command line.'
+             )
 @click.option('--py', is_flag=True
              , help='Add a Python submodule to the project.'
              )
@@ -132,21 +157,39 @@ def docs(ctx, md, rst):
              , help='Add a Modern Fortran binary extension module to the project (using numpy.f2py).'
              )
 @click.pass_context
-def add(ctx, component, py, cpp, f90, cli, clisub):
+def add(ctx, components, manifest, py, cpp, f90, cli, clisub):
     """Add components, such as submodules and CLIs, to the project.
 
+    All components are added in one pass, and `pyproject.toml` and the documentation are updated only once.
+
     Args:
-        component: If the component is a submodule, a submodule name preceeded with a path relative to the package, must
-            be supplied. For CLIs only the name must be supplied, as the path is fixed and autmatically supplied.
+        components: If a component is a submodule, a submodule name preceeded with a path relative to the package,
+            must be supplied. For CLIs only the name must be supplied, as the path is fixed and autmatically supplied.
     """
+    from wiptools.wip.wip_add import wip_add
     wip_add(ctx)
 
 
 @main.command()
+@click.option('--depth', default=None, type=click.IntRange(min=0)
+             , help='Only show the structure of the package up to this depth (0 shows only the package itself).'
+             )
+@click.option('--components-only', is_flag=True, default=False
+             , help='Only show the components of the package, not the files and other directories.'
+             )
+@click.option('--json', is_flag=True, default=False
+             , help='Print the project info and the structure of the package as JSON.'
+             )
+@click.option('--status', is_flag=True, default=False
+             , help='Also report the build status of the binary extension modules: up to date, stale (sources, '
+                    'compiler or Python changed since the last build), missing, built for another Python ABI, ... '
+                    'and their size, build profile, build type and build time.'
+             )
 @click.pass_context
-def info(ctx):
+def info(ctx, depth, components_only, json, status):
     """Provide info about the project's structure."""
 
+    from wiptools.wip.wip_info import wip_info
     wip_info(ctx)
 
 @main.command()
@@ -157,16 +200,137 @@ def info(ctx):
 @click.option('--f90', is_flag=True, default=False
              , help='Build all Modern Fortran binary extension modules.'
              )
+@click.option('-j', '--jobs', default=None, type=int
+             , help='Global job budget, shared between building components concurrently and the compiler. '
+                    'Use 0 for all available cores (default, unless `jobs` is set in the [tool.wip.build] '
+                    'table of pyproject.toml).'
+             )
+@click.option('-G', '--generator', default=None
+             , help='CMake generator, e.g. "Ninja" or "Unix Makefiles". Default is `generator` in the '
+                    '[tool.wip.build] table of pyproject.toml, or else Ninja if it is available, or else '
+                    "CMake's default generator."
+             )
+@click.option('--ccache/--no-ccache', default=None
+             , help='Use a compiler cache (ccache or sccache). Default is `ccache` in the [tool.wip.build] table '
+                    'of pyproject.toml, or else a compiler cache is used if one is available.'
+             )
+@click.option('--nb-shared/--no-nb-shared', default=None
+             , help='Build all C++ components in a single CMake project, against a shared nanobind core library '
+                    'and with a shared precompiled header. Default is `nanobind-shared` in the [tool.wip.build] '
+                    'table of pyproject.toml, or else false.'
+             )
+@click.option('--timings', is_flag=True, default=False
+             , help='Report the wall and cpu time of the configure, compile, link and install steps of every '
+                    'component, and store the report in `.wip/build-timings.json`.'
+             )
+@click.option('-k', '--keep-going', is_flag=True, default=False
+             , help='Keep building the other components if a component fails to build (default is to stop).'
+             )
+@click.option('--build-type', default='Release'
+             , type=click.Choice(['Release', 'Debug', 'RelWithDebInfo', 'MinSizeRel'])
+             , help='CMake build type (default is Release).'
+             )
+@click.option('--force', is_flag=True, default=False
+             , help='Build the selected components even if they are up to date.'
+             )
+@click.option('--profile', default=None, type=click.Choice(['portable', 'release-native', 'release-lto'])
+             , help='Build profile: `portable` (no architecture-specific tuning), `release-native` (tuned for the '
+                    'build machine, -march=native) or `release-lto` (as release-native, with link-time '
+                    'optimization). Default is `profile` in the [tool.wip.build] table of pyproject.toml, or '
+                    'else `portable`. The profile is recorded next to the binary extension module.'
+             )
+@click.option('--fast-math/--no-fast-math', default=None
+             , help='Compile with -ffast-math. Default is `fast-math` in the [tool.wip.build] table of '
+                    'pyproject.toml, or else false.'
+             )
+@click.option('--pgo', is_flag=True, default=False
+             , help='Build COMPONENT with profile-guided optimization: build it instrumented, run its tests (or '
+                    'the training command in the [tool.wip.build.pgo] table of pyproject.toml) to collect '
+                    'profile data, and rebuild it optimized. The profile data are stored in `.wip/pgo` and '
+                    'reused by later builds with the same build profile.'
+             )
+@click.option('--watch', is_flag=True, default=False
+             , help='After building, keep watching the source files of the components, and rebuild a component '
+                    '(and the components depending on it) when its source files change. Press Ctrl-C to stop.'
+             )
+@click.option('--run-tests', is_flag=True, default=False
+             , help='With --watch, run the tests of a component after rebuilding it.'
+             )
+@click.option('--artifact-cache/--no-artifact-cache', default=None
+             , help='Restore binary extension modules that were built before, with the same sources, compiler, '
+                    'build settings and Python version, from the user\'s artifact cache, rather than compiling '
+                    'them, and store newly built ones. The cache is shared by all checkouts and worktrees (see '
+                    '`wip cache`). Default is `artifact-cache` in the [tool.wip.build] table of pyproject.toml, '
+                    'or else true.'
+             )
+@click.option('--stubs/--no-stubs', default=None
+             , help='Generate `.pyi` stub files for the binary extension modules (with nanobind\'s stubgen for C++ '
+                    'components, from the f2py signature file for Modern Fortran components), so that documentation '
+                    'tools, IDEs and type checkers need not import them. A stub file is only rewritten if the '
+                    'interface of its module changed. Default is `stubs` in the [tool.wip.build] table of '
+                    'pyproject.toml, or else true.'
+             )
 @click.pass_context
-def build(ctx, component: str, f90: bool, cpp: bool):
+def build( ctx
+         , component: str
+         , f90: bool
+         , cpp: bool
+         , jobs: int
+         , generator: str
+         , ccache: bool
+         , nb_shared: bool
+         , timings: bool
+         , keep_going: bool
+         , build_type: str
+         , force: bool
+         , profile: str
+         , fast_math: bool
+         , pgo: bool
+         , watch: bool
+         , run_tests: bool
+         , artifact_cache: bool
+         , stubs: bool
+         ):
     """Build binary extension modules.
 
     Args:
         component: Component to build, path to component, relattive to package directory.
     """
 
+    from wiptools.wip.wip_build import wip_build
     wip_build(ctx)
 
+@main.group()
+def cache():
+    """Manage the artifact cache of binary extension modules.
+
+    The cache is located in `$WIP_ARTIFACT_CACHE`, or else in `~/.cache/wip/artifacts`. Its maximum size is
+    `$WIP_ARTIFACT_CACHE_SIZE` (e.g. `500M`), or else 2G.
+    """
+
+@cache.command()
+@click.pass_context
+def stats(ctx):
+    """Show the location, size and contents of the artifact cache."""
+
+    from wiptools.wip.wip_cache import wip_cache
+    wip_cache(ctx)
+
+@cache.command()
+@click.option('--max-size', default=None
+             , help='Remove the least recently used artifacts until the cache is not larger than this (e.g. `500M`). '
+                    'Default is the maximum size of the cache.'
+             )
+@click.option('--all', is_flag=True, default=False
+             , help='Remove all artifacts.'
+             )
+@click.pass_context
+def prune(ctx, max_size, all):
+    """Remove the least recently used artifacts from the artifact cache."""
+
+    from wiptools.wip.wip_cache import wip_cache
+    wip_cache(ctx)
+
 
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
@@ -1,125 +1,155 @@
 # -*- coding: utf-8 -*-
 import os
 from pathlib import Path
-import shutil
-import subprocess
 
 import click
-from cookiecutter.main import cookiecutter
 
 import wiptools.messages as messages
+from wiptools.project_state import ProjectState
+import wiptools.templates as templates
 import wiptools.utils as utils
+from wiptools.wip.wip_docs import sync_docs
+
+
+COMPONENT_FLAGS = ('py', 'cpp', 'f90', 'cli', 'clisub')
+"""The component types, as in the component flags of `wip add` (`--py`, `--cpp`, ...)."""
+
+TEMPLATES = { 'py'    : ('module-py' , 'module-py-tests' )
+            , 'cpp'   : ('module-cpp', 'module-cpp-tests')
+            , 'f90'   : ('module-f90', 'module-f90-tests')
+            , 'cli'   : ('CLI'       , 'CLI-tests'       )
+            , 'clisub': ('CLIsub'    , 'CLIsub-tests'    )
+            }
+"""The templates of a component, and of its tests, for each component type."""
 
 
 def wip_add(ctx: click.Context):
     """Add submodules and CLIs."""
 
-
-    flag_py     = ctx.params['py']
-    flag_cpp    = ctx.params['cpp']
-    flag_f90    = ctx.params['f90']
-    flag_cli    = ctx.params['cli']
-    flag_clisub = ctx.params['clisub']
-    nflags_set = flag_py + flag_cpp + flag_f90 + flag_cli + flag_clisub
-    if nflags_set > 1:
+    flags = [flag for flag in COMPONENT_FLAGS if ctx.params[flag]]
+    if len(flags) > 1:
         messages.error_message(
             "It is illegal to specify more than one component flags\n"
             "(--py|--cpp|--f90|--cli|--clisub"
         )
+    flag = flags[0] if flags else ''
+
+    components = [(component, flag) for component in ctx.params['components']]
+    if ctx.params['manifest']:
+        components.extend(read_manifest(Path(ctx.params['manifest']), flag))
+    if not components:
+        messages.error_message("No components specified (specify components or a manifest file).")
+
+    with ProjectState() as project:
+        cookiecutter_params = project.cookiecutter_params
+        project_path = project.project_path
+        package_name = cookiecutter_params['package_name']
+        check_components(components, project_path / package_name)
+
+        # expand the templates of all components
+        for component, flag in components:
+            expand_component(cookiecutter_params, project_path, component, flag)
+            if flag in ('cli', 'clisub'):
+                project.pyproject['tool']['poetry']['scripts'][component] = f"{package_name}.{component}.__main__:main"
+
+        # check for mkdocs documentation first
+        docs_format = utils.docs_format()
+        if docs_format == 'md':
+            sync_docs(project)
+
+        elif docs_format == 'rst':
+            messages.warning_message("RestructuredText documentation generation is not (yet) implemented.")
+
+        # pyproject.toml and the documentation are written once, for all components
+        updated = "pyproject.toml and `docs/api-reference.md`" if docs_format == 'md' else "pyproject.toml"
+        with messages.TaskInfo(f"Updating {updated}"):
+            project.commit()
+
+
+def read_manifest(path_to_manifest: Path, default_flag: str = '') -> list:
+    """Read the components to add from a manifest file.
+
+    Every line of the manifest contains a component, as on the command line of `wip add`, optionally followed by
+    a component flag, e.g. `foo/bar_cpp --cpp`. Components without a flag get `default_flag`, the component flag
+    on the command line. Empty lines and comments (starting with `#`) are ignored.
+
+    Returns:
+        a list of (component, flag) tuples, with flag in `COMPONENT_FLAGS` or empty.
+    """
+    if not path_to_manifest.is_file():
+        messages.error_message(f"Manifest file `{path_to_manifest}` does not exist.")
+    components = []
+    for line_number, line in enumerate(path_to_manifest.read_text().splitlines(), start=1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        flag = words[1][2:] if len(words) == 2 and words[1][:2] == '--' else None
+        if len(words) > 2 or flag not in (None, *COMPONENT_FLAGS):
+            messages.error_message(
+                f"{path_to_manifest}:{line_number}: expecting a component and an optional component flag "
+                f"(--py|--cpp|--f90|--cli|--clisub), got `{line.strip()}`."
+            )
+        components.append((words[0], default_flag if flag is None else flag))
+    return components
+
+
+def check_components(components: list, package_path: Path):
+    """Check the components to add before any of them is added.
+
+    Every component must have a component flag, CLIs must be added to the package directory, and the parent
+    directory of a submodule must exist, or be added as a submodule before it.
+    """
+    added = set()
+    for component, flag in components:
+        if not flag:
+            messages.error_message(
+                f"No component flag (--py|--cpp|--f90|--cli|--clisub) specified for component `{component}`."
+            )
+        module_path = package_path / component
+        if flag in ('cli', 'clisub'):
+            if module_path.parent != package_path:
+                messages.error_message(f"CLI `{component}` must be a name, not a path.")
+        elif not module_path.parent.is_dir() and module_path.parent not in added:
+            messages.error_message(f"The parent directory `{module_path.parent}` does not exist.")
+        added.add(module_path)
 
-    cookiecutter_params = utils.read_wip_cookiecutter_json()
-    project_path = Path.cwd()
-    package_name = cookiecutter_params['package_name']
-    component = ctx.params['component'] # path to module relative to package directory
 
-    if flag_py or flag_cpp or flag_f90:
+def expand_component(cookiecutter_params: dict, project_path: Path, component: str, flag: str):
+    """Expand the templates of a component and of its tests.
 
+    Args:
+        cookiecutter_params: the project's cookiecutter parameters (not modified).
+        project_path: path to the project directory.
+        component: path to the component relative to the package directory (submodules), or name (CLIs).
+        flag: component type, one of `COMPONENT_FLAGS`.
+    """
+    package_name = cookiecutter_params['package_name']
+    component_template, tests_template = (utils.cookiecutters() / template for template in TEMPLATES[flag])
+    params = dict(cookiecutter_params)
+
+    if flag in ('py', 'cpp', 'f90'):
         module_path = project_path / package_name / component
-        module_name = module_path.name
         parent_module_path = module_path.parent
         parent_module_path_relative = parent_module_path.relative_to(project_path)
-        parent_pypath = str(parent_module_path.relative_to(project_path)).replace(os.sep,'.') + '.'
-
-        if not module_path.parent.is_dir():
-            messages.error_message(f"The parent directory `{module_path.parent}` does not exist.")
-
-        cookiecutter_params.update(
-          { 'module_name' : module_name
+        parent_pypath = str(parent_module_path_relative).replace(os.sep,'.') + '.'
+        params.update(
+          { 'module_name' : module_path.name
           , 'parent_pypath'  : parent_pypath
           }
         )
-
-        template = str(utils.cookiecutters() / 'module-py' ) if flag_py  else \
-                   str(utils.cookiecutters() / 'module-cpp') if flag_cpp else \
-                   str(utils.cookiecutters() / 'module-f90')
-
-        with messages.TaskInfo(f"Expanding cookiecutter template `{template}`"):
-            cookiecutter( template=template
-                        , extra_context=cookiecutter_params
-                        , output_dir=parent_module_path
-                        , no_input=True
-                        , overwrite_if_exists=True
-                        )
-
-        template = (utils.cookiecutters() / 'module-py-tests' ) if flag_py  else \
-                   (utils.cookiecutters() / 'module-cpp-tests') if flag_cpp else \
-                   (utils.cookiecutters() / 'module-f90-tests')
-
-        with messages.TaskInfo(f"Expanding cookiecutter template `{template.relative_to(utils.wiptools())}`"):
-            output_dir = project_path / 'tests' / parent_module_path_relative
-            cookiecutter( template=str(template)
-                        , extra_context=cookiecutter_params
-                        , output_dir=output_dir
-                        , no_input=True
-                        , overwrite_if_exists=True
-                        )
-
-    elif flag_cli or flag_clisub:
-
-        cli_name = component
-
-        cookiecutter_params.update(
-            {'cli_name': cli_name}
+        output_dir = parent_module_path
+        tests_output_dir = project_path / 'tests' / parent_module_path_relative
+    else:
+        params.update(
+            {'cli_name': component}
         )
+        output_dir = project_path / package_name
+        tests_output_dir = project_path / 'tests' / package_name
 
-        template = (utils.cookiecutters() / 'CLI'   ) if flag_cli else \
-                   (utils.cookiecutters() / 'CLIsub')
-
-        with messages.TaskInfo(f"Expanding cookiecutter template `{template.relative_to(utils.wiptools())}`"):
-            cookiecutter(template=str(template)
-                         , extra_context=cookiecutter_params
-                         , output_dir=project_path / package_name
-                         , no_input=True
-                         , overwrite_if_exists=True
-                         )
-
-        template = (utils.cookiecutters() / 'CLI-tests') if flag_cli else \
-                   (utils.cookiecutters() / 'CLIsub-tests')
-
+    for template, output_dir in ((component_template, output_dir), (tests_template, tests_output_dir)):
         with messages.TaskInfo(f"Expanding cookiecutter template `{template.relative_to(utils.wiptools())}`"):
-            cookiecutter(template=str(template)
-                         , extra_context=cookiecutter_params
-                         , output_dir=project_path / 'tests' / package_name
-                         , no_input=True
-                         , overwrite_if_exists=True
-                         )
-
-        with messages.TaskInfo("Updating pyproject.toml"):
-            with utils.PyProjectTOML("rw") as pyproject:
-                script = f"{package_name}.{cli_name}.__main__:main"
-                pyproject.toml['tool']['poetry']['scripts'][cli_name] = script
-
-    # check for mkdocs documentation first
-    docs_format = utils.docs_format()
-    if docs_format == 'md':
-        with messages.TaskInfo("updating `docs/api-reference.md`"):
-            path_to_api_reference_md = project_path / 'docs' / 'api-reference.md'
-            path_to_component = project_path / package_name / component
-            if utils.component_type(path_to_component) == 'py':
-                with path_to_api_reference_md.open(mode="a") as fp:
-                    p = str(path_to_component.relative_to(project_path)).replace(os.sep, '.')
-                    fp.write(f'::: {p}')
-            # not sure what to do in the other cases
-
-    elif docs_format == 'rst':
-        messages.warning_message("RestructuredText documentation generation is not (yet) implemented.")
+            templates.expand( template=str(template)
+                            , extra_context=params
+                            , output_dir=output_dir
+                            , overwrite_if_exists=True
+                            )
@@ -1,12 +1,27 @@
 # -*- coding: utf-8 -*-
+import concurrent.futures
+import datetime
+import functools
+import hashlib
 import json
+import os
 from pathlib import Path
+import shlex
+import shutil
 import subprocess
+import sys
+import sysconfig
 
 import click
 
+import wiptools.component_index as component_index
+import wiptools.hardware as hardware
 import wiptools.messages as messages
+import wiptools.stubs as stubs
+import wiptools.toolchain as toolchain
 import wiptools.utils as utils
+import wiptools.watcher as watcher
+from wiptools.wip.wip_cache import ArtifactCache
 
 
 def wip_build(ctx: click.Context):
@@ -16,18 +31,57 @@ def wip_build(ctx: click.Context):
     component = ctx.params['component']
     cpp_flag =  ctx.params['cpp']
     f90_flag =  ctx.params['f90']
+    keep_going = ctx.params['keep_going']
+
+    # command line options take precedence over the [tool.wip.build] table in pyproject.toml
+    config = pyproject_build_config()
+    jobs = ctx.params['jobs'] if ctx.params['jobs'] is not None else int(config.get('jobs', 0))
+    generator = ctx.params['generator'] if ctx.params['generator'] is not None else config.get('generator', None)
 
     build = BinaryExtensionBuilder(cookiecutter_params)
+    build.build_type = ctx.params['build_type']
+    build.force = ctx.params['force']
+    build.generator = default_generator() if generator is None else generator
+    ccache = ctx.params['ccache'] if ctx.params['ccache'] is not None else config.get('ccache', None)
+    build.compiler_launcher = compiler_launcher(ccache)
+    nb_shared = ctx.params['nb_shared'] if ctx.params['nb_shared'] is not None else config.get('nanobind-shared', False)
+    build.profile = ctx.params['profile'] if ctx.params['profile'] is not None else config.get('profile', 'portable')
+    build.fast_math = ctx.params['fast_math'] if ctx.params['fast_math'] is not None else config.get('fast-math', False)
+    build_profile_flags(build.profile)  # validate
+    artifact_cache = ctx.params['artifact_cache'] if ctx.params['artifact_cache'] is not None \
+                     else config.get('artifact-cache', True)
+    if artifact_cache:
+        build.artifact_cache = ArtifactCache()
+    build.stubs = ctx.params['stubs'] if ctx.params['stubs'] is not None else config.get('stubs', True)
+    if ctx.params['timings']:
+        build.timings = {}
+    package_path = Path(cookiecutter_params['project_path']) / cookiecutter_params['package_name']
+    build.dependencies = dependency_graph(package_path, config.get('dependencies', {}))
+
+    if ctx.params['pgo']:
+        if not component:
+            messages.error_message("`wip build --pgo` requires a component.")
+        path_to_component = package_path / component
+        if utils.component_type(path_to_component) not in ('cpp', 'f90'):
+            messages.error_message(f"`{component}` is not a binary extension module.")
+        training_command = pgo_training_command(cookiecutter_params, path_to_component, config.get('pgo', {}))
+        try:
+            build.build_pgo(path_to_component, training_command)
+        except BuildError as error:
+            report_failures({path_to_component: error}, cookiecutter_params)
+        return
 
     if component:
         # ignore language flags if set.
         if f90_flag:
             messages.warning_message("ignoring '--f90' flag")
-        if f90_flag:
+        if cpp_flag:
             messages.warning_message("ignoring '--cpp' flag")
 
-        build(component)
-        
+        build.cpp_flag = build.f90_flag = True
+        # also build the components it depends on
+        components = with_dependencies([package_path / component], build.dependencies)
+
     else:
         if not cpp_flag and not f90_flag:
             # No language flags set, and no component selected, hence build all binary components
@@ -36,38 +90,1411 @@ def wip_build(ctx: click.Context):
             build.cpp_flag = cpp_flag
             build.f90_flag = f90_flag
 
-        # iterate over all components and build if requested
-        utils.iter_components(
-            Path(cookiecutter_params['project_path']) / cookiecutter_params['package_name'],
-            apply=build
-        )
+        # collect all components
+        components = []
+        utils.iter_components(package_path, apply=components.append)
+
+    # build the selected components
+    sccache_stats = sccache_statistics() if Path(build.compiler_launcher).stem == 'sccache' else None
+    failures = {}
+    cpp_components = None
+    if nb_shared and build.cpp_flag:
+        # All C++ components are built together in a single CMake project.
+        cpp_components = [c for c, type_ in component_index.components(package_path).items() if type_ == 'cpp']
+        failures = build.build_nanobind_shared(cpp_components, jobs=jobs)
+        build.cpp_flag = False
+    if not failures or keep_going:
+        failures.update(build.build_all(components, jobs=jobs, keep_going=keep_going))
+    if sccache_stats is not None:
+        # sccache statistics are global, hence they are reported for all components together.
+        after = sccache_statistics()
+        report_cache_statistics( 'sccache (all components)'
+                               , after[0] - sccache_stats[0], after[1] - sccache_stats[1]
+                               )
+    if build.timings:
+        report_timings(build.timings, Path(cookiecutter_params['project_path']) / BUILD_TIMINGS)
+    if failures:
+        report_failures(failures, cookiecutter_params, return_code=0 if ctx.params['watch'] else 1)
+    if ctx.params['watch']:
+        watch_components(build, components, jobs, nb_shared_components=cpp_components, run_tests=ctx.params['run_tests'])
+
+
+def report_failures(failures: dict, cookiecutter_params: dict, return_code: int = 1):
+    """Print the output of the failed builds, followed by a summary, and exit if `return_code` is non-zero."""
+    project_path = Path(cookiecutter_params['project_path'])
+    for path_to_component, error in failures.items():
+        output = ''.join(s for s in (error.output, error.stderr) if s)
+        if output:
+            click.secho(f"\n# Output of failed build `{path_to_component.relative_to(project_path)}`:", fg='red')
+            click.echo(output)
+
+    summary = '\n'.join(
+        f"  {path_to_component.relative_to(project_path)}: {error}"
+        for path_to_component, error in failures.items()
+    )
+    messages.error_message(f"Failed to build {len(failures)} binary extension module(s):\n{summary}", return_code)
+
+
+def pyproject_build_config() -> dict:
+    """Return the `[tool.wip.build]` table of the project's `pyproject.toml` file (empty if missing).
+
+    Supported keys:
+
+    * `jobs`: global job budget (0 = all available cores), like `wip build --jobs`.
+    * `generator`: CMake generator, like `wip build --generator`.
+    * `ccache`: use a compiler cache (true or false), like `wip build --ccache|--no-ccache`.
+    * `nanobind-shared`: build all C++ components against a shared nanobind core library (true or false),
+      like `wip build --nb-shared|--no-nb-shared`.
+    * `profile`: build profile, like `wip build --profile`.
+    * `fast-math`: compile with fast-math options (true or false), like `wip build --fast-math|--no-fast-math`.
+    * `dependencies`: a table with the components each component depends on (see `dependency_graph`).
+    * `pgo`: a table with the training commands for `wip build --pgo`, per component (see `pgo_training_command`).
+    * `artifact-cache`: reuse binary extension modules from the user's artifact cache (true or false, default true),
+      like `wip build --artifact-cache|--no-artifact-cache` (see `wip cache`).
+    * `stubs`: generate `.pyi` stub files for the binary extension modules (true or false, default true), like
+      `wip build --stubs|--no-stubs` (see `stubs`).
+    """
+    toml = utils.read_pyproject_toml().unwrap()
+    return toml.get('tool', {}).get('wip', {}).get('build', {})
+
+
+def default_generator() -> str:
+    """Return `Ninja` if ninja is available, otherwise an empty string (i.e. CMake's default generator)."""
+    return 'Ninja' if shutil.which('ninja') else ''
+
+
+def compiler_launcher(ccache) -> str:
+    """Return the path to the compiler cache to use as a compiler launcher, or an empty string for none.
+
+    Args:
+        ccache: if False, no compiler cache is used. If None, ccache or sccache is used if it is available.
+            If True, the same, but a warning is issued if neither is available.
+    """
+    if ccache is False:
+        return ''
+    launcher = shutil.which('ccache') or shutil.which('sccache') or ''
+    if ccache and not launcher:
+        messages.warning_message("No compiler cache found (ccache or sccache): building without compiler cache.")
+    return launcher
+
+
+def ccache_statistics(path_to_stats_log: Path) -> tuple:
+    """Return the number of (hits, misses) in a ccache statistics log (see `CCACHE_STATSLOG`)."""
+    hits = misses = 0
+    try:
+        with open(path_to_stats_log) as fp:
+            for line in fp:
+                line = line.strip()
+                if line.endswith('cache_hit'):      # direct_cache_hit, preprocessed_cache_hit, remote_cache_hit
+                    hits += 1
+                elif line.endswith('cache_miss'):   # cache_miss, remote_cache_miss
+                    misses += 1
+    except FileNotFoundError:
+        pass
+    return hits, misses
+
+
+def sccache_statistics() -> tuple:
+    """Return the total number of (hits, misses) of the sccache server."""
+    completed_process = subprocess.run(['sccache', '--show-stats', '--stats-format=json'], capture_output=True, text=True)
+    try:
+        stats = json.loads(completed_process.stdout)['stats']
+    except (json.JSONDecodeError, KeyError):
+        return 0, 0
+    return sum(stats['cache_hits']['counts'].values()), sum(stats['cache_misses']['counts'].values())
+
+
+def report_cache_statistics(what: str, hits: int, misses: int):
+    """Print compiler cache hits and misses."""
+    total = hits + misses
+    if total:
+        click.secho(f"{what}: {hits} hits, {misses} misses (hit rate {100 * hits / total:.0f}%)", fg='bright_blue')
+
+
+def job_budget(jobs: int, n_components: int) -> tuple:
+    """Divide a global job budget over concurrent component builds and the compiler.
+
+    Args:
+        jobs: total number of jobs. If 0, the number of available cores is used.
+        n_components: number of components to build.
+
+    Returns:
+        a (workers, parallel) tuple: `workers` components are built concurrently, and each component
+        build uses `parallel` compiler jobs, so that `workers * parallel <= jobs`.
+    """
+    if jobs <= 0:
+        jobs = utils.available_cores()
+    workers = max(1, min(jobs, n_components))
+    parallel = jobs // workers
+    return workers, parallel
+
+
+# Build profiles #####################################################################################################
+BUILD_PROFILES = { 'portable'      : ([], [])
+                 , 'release-native': (['-march=native'], [])
+                 , 'release-lto'   : (['-march=native', '-flto'], ['-flto'])
+                 }
+"""Extra (compile_flags, link_flags) of the build profiles (see `wip build --profile`).
+
+* `portable`: no architecture-specific tuning, the binary extension modules run on any machine with the same
+  architecture. This is the default.
+* `release-native`: tuned for the architecture of the build machine (`-march=native`). If the machine profile
+  (`wip env --hw`) is available, the detected architecture is used instead (e.g. `-march=znver3`).
+* `release-lto`: as `release-native`, and with link-time optimization.
+"""
+
+FAST_MATH_FLAGS = ['-ffast-math']
+"""Extra compile flags for `wip build --fast-math`."""
+
+BUILD_PROFILE_SUFFIX = '.build-profile.json'
+"""Suffix of the file, next to the installed binary extension module, recording the build profile."""
+
+
+def build_profile_flags(profile: str, fast_math: bool = False) -> tuple:
+    """Return the extra (compile_flags, link_flags) of a build profile, as new lists."""
+    try:
+        compile_flags, link_flags = BUILD_PROFILES[profile]
+    except KeyError:
+        messages.error_message(f"Unknown build profile `{profile}`, expecting one of: {', '.join(BUILD_PROFILES)}.")
+    compile_flags = compile_flags + FAST_MATH_FLAGS if fast_math else list(compile_flags)
+    return compile_flags, list(link_flags)
+
+
+def path_to_build_profile(path_to_extension: Path) -> Path:
+    """Return the path to the build profile record of an installed binary extension module."""
+    return path_to_extension.parent / (path_to_extension.name.split('.')[0] + BUILD_PROFILE_SUFFIX)
+
+
+# Component dependencies #############################################################################################
+def dependency_graph(package_path: Path, declared: dict) -> dict:
+    """Build the dependency graph of the components from the `[tool.wip.build.dependencies]` table.
+
+    The table maps components to the components they depend on, e.g.
+
+        [tool.wip.build.dependencies]
+        "foo/bar_cpp" = ["core_cpp", "foo/util_cpp"]
+
+    (component paths are relative to the package directory). A component is built after the components it
+    depends on, and rebuilt when one of them changes. The directories (and build directories) of the components
+    it depends on are added to its include directories (CMake variable `WIP_DEPENDENCY_DIRS`).
+
+    Args:
+        package_path: path to the package directory.
+        declared: the `[tool.wip.build.dependencies]` table.
+
+    Returns:
+        a dict mapping the paths of components to the list of paths of the components they depend on.
+    """
+    graph = {}
+    for component, dependencies in declared.items():
+        if isinstance(dependencies, str):
+            dependencies = [dependencies]
+        paths = [package_path / component] + [package_path / dependency for dependency in dependencies]
+        for path in paths:
+            if not path.is_dir() or not utils.component_type(path):
+                messages.error_message( f"[tool.wip.build.dependencies]: `{path.relative_to(package_path)}` "
+                                        f"is not a component."
+                                      )
+        graph[paths[0]] = paths[1:]
+    topological_order(list(graph), graph)  # verify that there are no cycles
+    return graph
+
+
+def with_dependencies(components: list, graph: dict) -> list:
+    """Return a list of components, extended with all the components they depend on, directly or indirectly."""
+    result = []
+    stack = list(reversed(components))
+    while stack:
+        path_to_component = stack.pop()
+        if path_to_component not in result:
+            result.append(path_to_component)
+            stack.extend(reversed(graph.get(path_to_component, [])))
+    return result
+
+
+def topological_order(components: list, graph: dict) -> list:
+    """Order a list of components such that every component comes after the components it depends on.
+
+    Dependencies which are not in `components` are ignored. Otherwise, the original order is preserved as much
+    as possible.
+    """
+    selected = set(components)
+    order = []
+    state = {}  # path_to_component -> 'visiting' | 'done'
+
+    def visit(path_to_component, path):
+        if state.get(path_to_component) == 'done':
+            return
+        if state.get(path_to_component) == 'visiting':
+            cycle = path[path.index(path_to_component):] + [path_to_component]
+            messages.error_message(f"Circular component dependencies: {' -> '.join(p.name for p in cycle)}.")
+        state[path_to_component] = 'visiting'
+        for dependency in graph.get(path_to_component, []):
+            if dependency in selected:
+                visit(dependency, path + [path_to_component])
+        state[path_to_component] = 'done'
+        order.append(path_to_component)
+
+    for path_to_component in components:
+        visit(path_to_component, [])
+    return order
+
+
+def dependency_dirs(path_to_component: Path, graph: dict) -> list:
+    """Return the directories and build directories of the components a component depends on, directly or indirectly."""
+    dirs = []
+    for dependency in with_dependencies([path_to_component], graph)[1:]:
+        dirs.extend([dependency.as_posix(), (dependency / '_cmake_build').as_posix()])
+    return dirs
+
+
+# Build records ########################################################################################################
+BUILD_RECORD = '.wip-build.json'
+"""Name of the file, in the component directory, recording the last successful build of the component."""
+
+SOURCE_SUFFIXES = {'.cpp', '.cc', '.cxx', '.c', '.h', '.hpp', '.hh', '.hxx', '.inl'
+                  , '.f90', '.F90', '.f', '.F', '.f95', '.F95', '.f03', '.F03', '.inc', '.pyf', '.cmake'}
+"""Suffixes of files that are considered source files of a binary extension module."""
+
+DEFAULT_COMPILERS = {'cpp': ('CXX', 'CMAKE_CXX_COMPILER', 'c++'), 'f90': ('FC', 'CMAKE_Fortran_COMPILER', 'gfortran')}
+"""(environment variable, CMake cache variable, default) for locating the compiler of a component type."""
+
+EXT_SUFFIX = sysconfig.get_config_var('EXT_SUFFIX')
+"""Filename suffix of binary extension modules for the Python version running wip.
+
+(Retrieved once, because `sysconfig` is not thread-safe.)"""
+
+
+def running_python() -> dict:
+    """Return the Python interpreter running wip, in the format of `python_interpreter`."""
+    return {'executable': sys.executable, 'version': sys.version.split()[0], 'ext_suffix': EXT_SUFFIX}
+
+
+@functools.lru_cache(maxsize=None)
+def python_interpreter() -> dict:
+    """Return the Python interpreter that binary extension modules are built for, as {'executable': ..., 'version':
+    ..., 'ext_suffix': ...}.
+
+    This is the Python interpreter found by `wip env` (see `toolchain.probe`), which is passed to CMake, and which is
+    not necessarily the one running wip (e.g. if wip is installed with pipx). Without Python on the `PATH`, it is the
+    one running wip. It is only determined once.
+    """
+    tool = toolchain.probe(['python'])['python']
+    if not tool['found'] or not tool.get('ext_suffix'):
+        return running_python()
+    return {'executable': tool['executable'], 'version': tool['version'].split()[-1], 'ext_suffix': tool['ext_suffix']}
+
+
+def is_source_file(path: Path) -> bool:
+    """Test if a file is a source file of a binary extension module (see SOURCE_SUFFIXES), or `CMakeLists.txt`."""
+    return path.name == 'CMakeLists.txt' or path.suffix in SOURCE_SUFFIXES
+
+
+def source_files(path_to_component: Path) -> list:
+    """Return a sorted list of the source files of a component, including `CMakeLists.txt`.
+
+    Build directories (`_cmake_build`), `__pycache__` and hidden directories are skipped (see
+    `component_index.skip_dir`).
+    """
+    files = []
+    for root, dirs, filenames in os.walk(path_to_component):
+        dirs[:] = [d for d in dirs if not component_index.skip_dir(d)]
+        for filename in filenames:
+            if is_source_file(Path(filename)):
+                files.append(Path(root) / filename)
+    return sorted(files)
+
+
+def read_cmake_cache(path_to_build_dir: Path) -> dict:
+    """Read the variables from `CMakeCache.txt` in a CMake build directory. Returns an empty dict if there is none."""
+    cache = {}
+    try:
+        with open(path_to_build_dir / 'CMakeCache.txt') as fp:
+            for line in fp:
+                if line.startswith(('#', '//')) or '=' not in line:
+                    continue
+                key, value = line.rstrip('\n').split('=', 1)
+                cache[key.split(':', 1)[0]] = value
+    except FileNotFoundError:
+        pass
+    return cache
+
+
+def compiler(path_to_component: Path) -> str:
+    """Return the compiler used for building a component.
+
+    This is the compiler in the component's CMake cache, if it exists, or else the one specified by the
+    environment variable `CXX` (C++) or `FC` (Fortran), or else the default compiler (`c++` or `gfortran`).
+    """
+    env_var, cache_var, default = DEFAULT_COMPILERS[utils.component_type(path_to_component)]
+    return read_cmake_cache(path_to_component / '_cmake_build').get(cache_var) or os.environ.get(env_var, default)
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_version(compiler: str) -> str:
+    """Return the (first line of the) version string of a compiler, or an empty string if it is not found.
+
+    The version is only determined once per compiler executable, and cached (see `toolchain.version`).
+    """
+    executable = shutil.which(compiler)
+    if not executable:
+        return ''
+    return toolchain.version(executable)
+
+
+def fingerprint(path_to_component: Path, *build_settings: str) -> str:
+    """Compute the fingerprint of a component build.
+
+    The fingerprint is a hash of the contents of the component's source files, the compiler version and the build
+    settings (build type, Python version, ...). If any of these changes, the component must be rebuilt.
+    """
+    h = hashlib.sha256()
+    for item in (compiler_version(compiler(path_to_component)), *build_settings):
+        h.update(item.encode())
+        h.update(b'\0')
+    for path in source_files(path_to_component):
+        h.update(str(path.relative_to(path_to_component)).encode())
+        h.update(b'\0')
+        h.update(path.read_bytes())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def installed_extension(path_to_component: Path, ext_suffix: str = None):
+    """Return the path to the installed binary extension module of a component, or None if it is not installed.
+
+    C++ components install the binary extension module in the component directory, Modern Fortran components
+    in its parent directory.
+
+    Args:
+        path_to_component: path to the component.
+        ext_suffix: filename suffix of the binary extension module, by default the one of the Python interpreter
+            found by `wip env` (see `python_interpreter`).
+    """
+    filename = path_to_component.name + (ext_suffix or python_interpreter()['ext_suffix'])
+    for path in (path_to_component / filename, path_to_component.parent / filename):
+        if path.is_file():
+            return path
+    return None
+
+
+def read_build_record(path_to_component: Path) -> dict:
+    """Read the build record of a component. Returns an empty dict if there is none."""
+    try:
+        with open(path_to_component / BUILD_RECORD) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_build_record(path_to_component: Path, record: dict, build_profile: dict = None, ext_suffix: str = None):
+    """Record the installed binary extension module of a successful build in the component directory.
+
+    Args:
+        path_to_component: path to the component.
+        record: the build record, which is completed with the properties of the installed binary extension module.
+        build_profile: if not None, the build profile is also recorded next to the installed binary extension module,
+            so that it is clear how it was built, wherever it is deployed.
+        ext_suffix: filename suffix of the binary extension module (see `installed_extension`).
+    """
+    path_to_extension = installed_extension(path_to_component, ext_suffix)
+    if not path_to_extension:
+        return
+    if build_profile is not None:
+        with open(path_to_build_profile(path_to_extension), mode='w') as fp:
+            json.dump({'module': path_to_extension.name, **build_profile}, fp, indent=2)
+    stat = path_to_extension.stat()
+    record.update(
+      { 'extension': str(path_to_extension.relative_to(path_to_component.parent))
+      , 'size'     : stat.st_size
+      , 'mtime_ns' : stat.st_mtime_ns
+      , 'built'    : datetime.datetime.now().isoformat(timespec='seconds')
+      }
+    )
+    with open(path_to_component / BUILD_RECORD, mode='w') as fp:
+        json.dump(record, fp, indent=2)
+
+
+def is_up_to_date(path_to_component: Path, fingerprint_: str, ext_suffix: str = None) -> bool:
+    """Test if the installed binary extension module of a component was built from this fingerprint.
+
+    The installed binary extension module (see `installed_extension`) must still be the one that was recorded after
+    the build.
+    """
+    record = read_build_record(path_to_component)
+    if not record or record.get('fingerprint') != fingerprint_:
+        return False
+    path_to_extension = installed_extension(path_to_component, ext_suffix)
+    if not path_to_extension:
+        return False
+    stat = path_to_extension.stat()
+    return record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns
+
+
+# CMake configuration ##################################################################################################
+CONFIGURE_STAMP = 'wip-configure.json'
+"""Name of the file, in the CMake build directory, recording the settings of the last successful configure step."""
+
+TOOLCHAIN_CACHE_VARIABLES = ( 'CMAKE_C_COMPILER', 'CMAKE_CXX_COMPILER', 'CMAKE_Fortran_COMPILER', 'CMAKE_MAKE_PROGRAM'
+                            , 'Python_EXECUTABLE', 'PYTHON_EXECUTABLE', 'F2PY_EXECUTABLE')
+"""CMake cache variables pointing to the tools used for building."""
+
+
+def configure_is_valid(path_to_component: Path, stamp: dict) -> bool:
+    """Test if the CMake build directory of a component is valid, so that the configure step can be skipped.
+
+    The build directory is valid if
+
+    * it has a `CMakeCache.txt` file for this component,
+    * the settings used for the last configure step are those in `stamp` (generator, build type, compilers, ...),
+    * no `CMakeLists.txt` file was modified after the last configure step,
+    * all tools in the CMake cache (compilers, Python, f2py, ...) still exist and were not modified after the
+      last configure step.
+    """
+    path_to_build_dir = path_to_component / '_cmake_build'
+    path_to_cache = path_to_build_dir / 'CMakeCache.txt'
+    try:
+        with open(path_to_build_dir / CONFIGURE_STAMP) as fp:
+            if json.load(fp) != stamp:
+                return False
+        configured = path_to_cache.stat().st_mtime_ns
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+    cache = read_cmake_cache(path_to_build_dir)
+    if Path(cache.get('CMAKE_HOME_DIRECTORY', '')) != path_to_component.resolve():
+        return False  # the component was moved
+    for path in source_files(path_to_component):
+        if path.name == 'CMakeLists.txt' and path.stat().st_mtime_ns > configured:
+            return False
+    for variable in TOOLCHAIN_CACHE_VARIABLES:
+        if variable in cache:
+            tool = shutil.which(cache[variable])
+            if not tool or Path(tool).stat().st_mtime_ns > configured:
+                return False
+    return True
+
+
+def toolchain_definitions(component_type: str, generator: str = '', python: str = '') -> dict:
+    """Return the CMake cache variables which locate the toolchain of a component, as found by `wip env`.
+
+    The compiler, the Python interpreter, the nanobind CMake directory (C++) and the numpy and f2py include
+    directories (Modern Fortran) are taken from the cached probe results (see `toolchain.probe`), so that the CMake
+    configure step of every component does not have to discover them again.
+
+    Args:
+        component_type: `cpp` or `f90`.
+        generator: the CMake generator. For `Ninja`, the ninja executable is also passed.
+        python: path to the Python interpreter to build for, if it is not the one found by `wip env` (e.g. the one
+            running the build backend). Python is then not probed, and CMake discovers nanobind, numpy and f2py
+            with this interpreter.
+    """
+    names = [name for name in toolchain.BUILD_TOOLS if not (python and name in ('python', 'nanobind', 'f2py'))]
+    tools = toolchain.probe(names)
+    definitions = {}
+    if python:
+        definitions['Python_EXECUTABLE'] = python
+    elif tools['python']['found']:
+        definitions['Python_EXECUTABLE'] = tools['python']['executable']
+    if component_type == 'cpp':
+        if tools['c++']['found']:
+            definitions['CMAKE_CXX_COMPILER'] = tools['c++']['executable']
+        if 'nanobind' in tools and tools['nanobind']['found']:
+            definitions['nanobind_DIR'] = tools['nanobind']['cmake_dir']
+    elif component_type == 'f90':
+        if tools['gfortran']['found']:
+            definitions['CMAKE_Fortran_COMPILER'] = tools['gfortran']['executable']
+        if 'f2py' in tools and tools['f2py']['found']:
+            definitions['NumPy_INCLUDE_DIR'] = tools['f2py']['numpy_include_dir']
+            definitions['F2PY_INCLUDE_DIR'] = tools['f2py']['f2py_include_dir']
+    if generator == 'Ninja' and tools['ninja']['found']:
+        definitions['CMAKE_MAKE_PROGRAM'] = tools['ninja']['executable']
+    return definitions
+
+
+COMPILERS = {'cpp': 'c++', 'f90': 'gfortran'}
+"""The compiler (see `toolchain.TOOLS`) of each component type."""
+
+
+def native_architecture(machine: dict, component_type: str) -> str:
+    """Return the architecture detected for `-march=native` in the machine profile (see `hardware.detect`), for the
+    compiler of a component type, or an empty string.
+
+    The detected architecture is only used on the machine it was detected on (see `hardware.is_this_machine`), and if
+    the compiler is still the one in the machine profile. Otherwise, `-march=native` is kept.
+    """
+    name = COMPILERS.get(component_type)
+    compiler = (machine or {}).get('compilers', {}).get(name)
+    if not compiler or not compiler['march'] or not hardware.is_this_machine(machine):
+        return ''
+    tool = toolchain.probe([name])[name]
+    return compiler['march'] if tool['executable'] == compiler['executable'] else ''
+
+
+@functools.lru_cache(maxsize=None)
+def native_target(compiler: str) -> str:
+    """Return what `-march=native` stands for with a compiler on this machine, or an empty string if that cannot be
+    determined.
+
+    This is the architecture selected by the compiler (see `hardware.native_architecture`), and the CPU model and
+    a digest of the CPU flags (see `hardware.cpuinfo`), as `-march=native` enables every instruction set of the CPU.
+    It is part of the fingerprint of builds with `-march=native`, so that their artifacts are not restored on
+    machines with another CPU (e.g. other nodes of a cluster sharing the artifact cache in the home directory).
+    It is only determined once per compiler.
+    """
+    executable = shutil.which(compiler)
+    march = hardware.native_architecture(executable) if executable else ''
+    info = hardware.cpuinfo()
+    if not march and not info['flags']:
+        return ''
+    return f"{march} {info['model']} {hashlib.sha256(' '.join(sorted(info['flags'])).encode()).hexdigest()}"
+
+
+def machine_definitions(machine: dict, component_type: str) -> dict:
+    """Return the CMake cache variables derived from the machine profile (see `hardware.detect`), for the
+    CMakeLists.txt of a component:
+
+    * `WIP_NUM_THREADS`: the default number of threads, one per available physical core,
+    * `WIP_OPENMP`: `ON` if the compiler of the component supports OpenMP, `OFF` otherwise.
+
+    Without machine profile, there are no definitions.
+    """
+    if not machine:
+        return {}
+    compiler = machine.get('compilers', {}).get(COMPILERS.get(component_type), {})
+    return { 'WIP_NUM_THREADS': str(hardware.default_threads(machine))
+           , 'WIP_OPENMP'     : 'ON' if compiler.get('openmp') else 'OFF'
+           }
+
+
+def clear_generator(path_to_build_dir: Path, generator: str):
+    """Remove the CMake cache from a build directory if it was configured with another generator.
+
+    (CMake refuses to configure an existing build directory with a different generator, and keeps the generator of
+    the build directory if none is specified.)
+
+    Args:
+        path_to_build_dir: the CMake build directory.
+        generator: the CMake generator, empty for CMake's default. This is `$CMAKE_GENERATOR`, if set, otherwise
+            the build directory is cleared if it was configured with an explicit generator (see `CONFIGURE_STAMP`).
+    """
+    cached_generator = read_cmake_cache(path_to_build_dir).get('CMAKE_GENERATOR')
+    if not cached_generator:
+        return
+    generator = generator or os.environ.get('CMAKE_GENERATOR', '')
+    if generator:
+        cleared = cached_generator != generator
+    else:
+        try:
+            with open(path_to_build_dir / CONFIGURE_STAMP) as fp:
+                cleared = bool(json.load(fp).get('generator'))
+        except (FileNotFoundError, json.JSONDecodeError):
+            cleared = False
+    if cleared:
+        (path_to_build_dir / 'CMakeCache.txt').unlink()
+        shutil.rmtree(path_to_build_dir / 'CMakeFiles', ignore_errors=True)
+
+
+# Shared nanobind core library ########################################################################################
+NANOBIND_SHARED = Path('.wip') / 'nanobind-shared'
+"""Directory, relative to the project directory, of the CMake project building all C++ components together."""
+
+NANOBIND_PCH_HEADERS = ('<nanobind/nanobind.h>', '<nanobind/ndarray.h>')
+"""Headers in the precompiled header shared by all C++ components."""
+
+
+def nanobind_shared_cmakelists(components: list, package_path: Path, dependencies: dict = None) -> str:
+    """Return the contents of the `CMakeLists.txt` file that builds all C++ components together.
+
+    The nanobind core library is built once, as a shared library that is installed in the package directory,
+    and all components are linked against it. The components also reuse a single precompiled header for the
+    nanobind headers. The components' own `CMakeLists.txt` files are included with `add_subdirectory`, and
+    they see that they are built this way through the variable `WIP_NANOBIND_SHARED`.
+
+    If a `dependencies` graph is given (see `dependency_graph`), every component gets the include directories of
+    the components it depends on, and is built after those which are part of this CMake project.
+    """
+    dependencies = dependencies or {}
+    lines = [
+        "# Generated by `wip build --nb-shared`. Do not edit, changes will be overwritten.",
+        "cmake_minimum_required(VERSION 3.18...3.22)",
+        f"project({package_path.name}_cpp_components CXX)",
+        "find_package(Python 3.8 COMPONENTS Interpreter Development.Module REQUIRED)",
+        "",
+        "if (NOT CMAKE_BUILD_TYPE AND NOT CMAKE_CONFIGURATION_TYPES)",
+        "  set(CMAKE_BUILD_TYPE Release CACHE STRING \"Choose the type of build.\" FORCE)",
+        "endif()",
+        "",
+        "if (NOT nanobind_DIR)",
+        "  execute_process(",
+        "    COMMAND \"${Python_EXECUTABLE}\" -m nanobind --cmake_dir",
+        "    OUTPUT_STRIP_TRAILING_WHITESPACE OUTPUT_VARIABLE NB_DIR)",
+        "  list(APPEND CMAKE_PREFIX_PATH \"${NB_DIR}\")",
+        "endif()",
+        "find_package(nanobind CONFIG REQUIRED)",
+        "",
+        "if (WIP_COMPILER_LAUNCHER)",
+        "  set(CMAKE_CXX_COMPILER_LAUNCHER \"${WIP_COMPILER_LAUNCHER}\")",
+        "endif()",
+        "",
+        "# The nanobind core library, shared by all components, and installed in the package directory",
+        "set(WIP_NANOBIND_SHARED ON)",
+        f"set(WIP_NANOBIND_CORE_DIR \"{package_path.as_posix()}\")",
+        "nanobind_build_library(nanobind)",
+        "install(TARGETS nanobind LIBRARY DESTINATION \"${WIP_NANOBIND_CORE_DIR}\")",
+        "",
+        "# The precompiled header shared by all components. It belongs to an (empty) nanobind module,",
+        "# so that it is compiled with exactly the same flags as the components. (The compiler refuses",
+        "# a precompiled header that was compiled with macros which are not defined for the component,",
+        "# such as the <target>_EXPORTS macro that CMake defines for modules.)",
+        "file(WRITE \"${CMAKE_CURRENT_BINARY_DIR}/wip_nanobind_pch.cpp\" \"\")",
+        "nanobind_add_module(wip_nanobind_pch NB_SHARED \"${CMAKE_CURRENT_BINARY_DIR}/wip_nanobind_pch.cpp\")",
+        "set_target_properties(wip_nanobind_pch PROPERTIES DEFINE_SYMBOL \"\")",
+        "if (WIP_COMPILE_FLAGS)",
+        "  separate_arguments(_wip_compile_flags UNIX_COMMAND \"${WIP_COMPILE_FLAGS}\")",
+        "  target_compile_options(wip_nanobind_pch PRIVATE ${_wip_compile_flags})",
+        "endif()",
+        f"target_precompile_headers(wip_nanobind_pch PRIVATE {' '.join(NANOBIND_PCH_HEADERS)})",
+        "",
+        "# The C++ components",
+    ]
+    components = topological_order(sorted(components), dependencies)
+    for path_to_component in components:
+        binary_dir = path_to_component.relative_to(package_path).as_posix()
+        dirs = dependency_dirs(path_to_component, dependencies)
+        if dirs:
+            lines.append(f"set(WIP_DEPENDENCY_DIRS \"{';'.join(dirs)}\")")
+        lines.append(f"add_subdirectory(\"{path_to_component.as_posix()}\" \"{binary_dir}\")")
+        if dirs:
+            lines.append("unset(WIP_DEPENDENCY_DIRS)")
+    for path_to_component in components:
+        targets = [d.name for d in dependencies.get(path_to_component, []) if d in components]
+        if targets:
+            lines.append(f"add_dependencies({path_to_component.name} {' '.join(targets)})")
+    return '\n'.join(lines) + '\n'
+
+
+# Build timings ########################################################################################################
+BUILD_TIMINGS = Path('.wip') / 'build-timings.json'
+"""File, relative to the project directory, in which `wip build --timings` stores its report."""
+
+COMPILE_OUTPUTS = ('.o', '.obj', '.gch', '.pch')
+"""Suffixes of the output files of compile steps."""
+
+LINK_OUTPUTS = ('.so', '.a', '.dylib', '.dll', '.lib', '.pyd')
+"""Suffixes of the output files of link steps."""
+
+
+def ninja_log(path_to_build_dir: Path) -> dict:
+    """Read the `.ninja_log` file of a CMake build directory (Ninja generator only).
+
+    Returns:
+        a dict with an (output, (start, end, mtime)) pair for every build edge in the log, or an empty dict if
+        the build directory was not generated for Ninja. Start and end times are in ms.
+    """
+    if read_cmake_cache(path_to_build_dir).get('CMAKE_GENERATOR') != 'Ninja':
+        return {}
+    entries = {}
+    try:
+        with open(path_to_build_dir / '.ninja_log') as fp:
+            for line in fp:
+                fields = line.rstrip('\n').split('\t')
+                if line.startswith('#') or len(fields) < 4:
+                    continue
+                entries[fields[3]] = (int(fields[0]), int(fields[1]), fields[2])
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def ninja_log_timings(before: dict, after: dict) -> dict:
+    """Return the time spent in compile and link steps by a Ninja build.
+
+    The time of a step is the total time of all its build edges, i.e. not the wall time when edges run in parallel.
+
+    Args:
+        before: the [`ninja_log`][wiptools.wip.wip_build.ninja_log] before the build.
+        after: the [`ninja_log`][wiptools.wip.wip_build.ninja_log] after the build. The build edges that differ
+            from those before the build, were run by the build. (Ninja may recompact its log, so the log entries
+            of earlier builds cannot be recognized by their position in the file.)
+
+    Returns:
+        a dict with the keys `compile` and `link`, or an empty dict if the build did not use Ninja.
+    """
+    if not after:
+        return {}
+    timings = {'compile': 0.0, 'link': 0.0}
+    for output, entry in after.items():
+        if before.get(output) == entry:
+            continue
+        seconds = (entry[1] - entry[0]) / 1000
+        if output.endswith(COMPILE_OUTPUTS):
+            timings['compile'] += seconds
+        elif output.endswith(LINK_OUTPUTS):
+            timings['link'] += seconds
+    return timings
+
+
+def phase_timings(timings: list, build_step_timings: dict) -> dict:
+    """Convert the (command, wall time, cpu time) tuples of a component build into build phase timings.
+
+    Args:
+        timings: the (command, wall time, cpu time) tuples of the CMake configure, build and install commands.
+        build_step_timings: the times of the compile and link steps of the build command, if known
+            (see [`ninja_log_timings`][wiptools.wip.wip_build.ninja_log_timings]).
+
+    Returns:
+        a dict with the wall and cpu time of every phase (`configure`, `build`, `install`), the time of the compile
+        and link steps of the build phase, if known, and the total wall and cpu time.
+    """
+    phases = {}
+    for command, wall, cpu in timings:
+        phase = 'configure' if command.startswith('cmake -S') else \
+                'build'     if command.startswith('cmake --build') else \
+                'install'   if command.startswith('cmake --install') else command
+        phases[phase] = {'wall': wall, 'cpu': cpu}
+    for step, seconds in build_step_timings.items():
+        phases[step] = {'wall': seconds, 'cpu': None}
+    cpu = [t[2] for t in timings]
+    return { 'phases': phases
+           , 'wall'  : sum(t[1] for t in timings)
+           , 'cpu'   : None if None in cpu else sum(cpu)
+           }
+
+
+def report_timings(timings: dict, path_to_report: Path):
+    """Print a table of the build timings of the components, slowest first, and store them as json.
+
+    Args:
+        timings: (component, timings) pairs as returned by [`phase_timings`][wiptools.wip.wip_build.phase_timings].
+        path_to_report: path to the json report.
+    """
+    def seconds(t):
+        return '-' if t is None else f"{t:.2f}s"
+
+    columns = ('configure', 'compile', 'link', 'install')
+    width = max([len('component')] + [len(component) for component in timings])
+    click.secho(f"\nBuild timings (wall time, cpu time for the total):", fg='bright_blue')
+    click.echo(f"  {'component':<{width}}" + ''.join(f"{c:>11}" for c in columns) + f"{'wall':>11}{'cpu':>11}")
+    for component, t in sorted(timings.items(), key=lambda item: item[1]['wall'], reverse=True):
+        phases = t['phases']
+        if 'compile' not in phases:
+            # The build phase could not be split in compile and link steps (not a Ninja build).
+            phases = {**phases, 'compile': phases.get('build')}
+        click.echo( f"  {component:<{width}}"
+                  + ''.join(f"{seconds(phases[c]['wall'] if phases.get(c) else None):>11}" for c in columns)
+                  + f"{seconds(t['wall']):>11}{seconds(t['cpu']):>11}"
+                  )
+
+    path_to_report.parent.mkdir(parents=True, exist_ok=True)
+    with open(path_to_report, mode='w') as fp:
+        json.dump( { 'created'   : datetime.datetime.now().isoformat(timespec='seconds')
+                   , 'components': timings
+                   }
+                 , fp, indent=2
+                 )
+    click.secho(f"Build timings written to `{path_to_report}`.", fg='bright_blue')
+
+
+# Profile-guided optimization ##########################################################################################
+PGO_PROFILES = Path('.wip') / 'pgo'
+"""Directory, relative to the project directory, where the profile data of the components are stored."""
+
+CLANG_PROFDATA = 'default.profdata'
+"""Name of the merged profile data file of a component built with clang."""
+
+
+def pgo_profile_dir(project_path: Path, path_to_component: Path, build_profile: str = 'portable') -> Path:
+    """Return the directory where the profile data of a component are stored.
+
+    Profile data are specific to the compile flags, hence they are stored per build profile.
+    """
+    return Path(project_path) / PGO_PROFILES / build_profile / path_to_component.relative_to(project_path)
+
+
+def is_clang(path_to_component: Path) -> bool:
+    """Test if a component is built with clang (which uses another profile data format than gcc)."""
+    return 'clang' in compiler_version(compiler(path_to_component)).lower()
+
+
+def pgo_flags(path_to_component: Path, path_to_profile_dir: Path, generate: bool = False) -> tuple:
+    """Return the compile and link flags for profile-guided optimization of a component.
+
+    Args:
+        path_to_component: path to the component.
+        path_to_profile_dir: directory where the profile data of the component are stored.
+        generate: if True, return the flags for an instrumented build, writing profile data to
+            `path_to_profile_dir` when the binary extension module is used. Otherwise, return the flags for
+            an optimized build using the profile data in `path_to_profile_dir`, or no flags if there are none.
+
+    Returns:
+        a (compile_flags, link_flags) tuple of lists.
+    """
+    if generate:
+        flags = [f'-fprofile-generate={path_to_profile_dir}', '-fprofile-update=atomic']
+        return flags, flags
+    if is_clang(path_to_component):
+        path_to_profdata = path_to_profile_dir / CLANG_PROFDATA
+        if not path_to_profdata.is_file():
+            return [], []
+        flags = [f'-fprofile-use={path_to_profdata}']
+        return flags + ['-Wno-profile-instr-unprofiled', '-Wno-profile-instr-out-of-date'], flags
+    if not path_to_profile_dir.is_dir() or not any(path_to_profile_dir.rglob('*.gcda')):
+        return [], []
+    flags = [f'-fprofile-use={path_to_profile_dir}', '-fprofile-correction']
+    # Functions that were modified after the profile data were collected are not optimized, but build fine.
+    return flags + ['-Wno-missing-profile', '-Wno-error=coverage-mismatch'], flags
+
+
+def profile_digest(path_to_profile_dir: Path) -> str:
+    """Compute a hash of the profile data in a directory (empty string if there are none)."""
+    files = sorted(p for p in path_to_profile_dir.rglob('*') if p.suffix in ('.gcda', '.profdata'))
+    if not files:
+        return ''
+    h = hashlib.sha256()
+    for path in files:
+        h.update(str(path.relative_to(path_to_profile_dir)).encode())
+        h.update(b'\0')
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def pgo_training_command(cookiecutter_params: dict, path_to_component: Path, training_commands: dict) -> str:
+    """Return the command that exercises a component to collect profile data.
+
+    This is the training command declared for the component in the `[tool.wip.build.pgo]` table of
+    `pyproject.toml`, e.g.
+
+        [tool.wip.build.pgo]
+        "foo/bar_cpp" = "python scripts/train_bar.py"
+
+    (component paths are relative to the package directory), or else running the component's tests with pytest.
+    The command is executed in the project directory.
+
+    Args:
+        cookiecutter_params: the project's cookiecutter parameters.
+        path_to_component: path to the component.
+        training_commands: the `[tool.wip.build.pgo]` table.
+    """
+    project_path = Path(cookiecutter_params['project_path'])
+    component = path_to_component.relative_to(project_path / cookiecutter_params['package_name']).as_posix()
+    command = training_commands.get(component)
+    if command:
+        return command
+    path_to_tests = component_tests(cookiecutter_params, path_to_component)
+    if not path_to_tests:
+        messages.error_message( f"No tests found for component `{component}`, and no training command declared "
+                                f"in the [tool.wip.build.pgo] table of `pyproject.toml`."
+                              )
+    return f"python -m pytest {path_to_tests.relative_to(project_path)}"
+
+
+def component_tests(cookiecutter_params: dict, path_to_component: Path):
+    """Return the path to the tests directory of a component, or None if it does not exist."""
+    project_path = Path(cookiecutter_params['project_path'])
+    path_to_tests = project_path / 'tests' / path_to_component.relative_to(project_path)
+    return path_to_tests if path_to_tests.is_dir() else None
+
+
+# Watch mode ###########################################################################################################
+WATCH_DEBOUNCE = 0.3
+"""Time (in seconds) without changes after which a burst of changes is considered finished."""
+
+
+def component_of(path: Path, components: list):
+    """Return the (innermost) component that contains a path, or None."""
+    containing = [c for c in components if c == path or c in path.parents]
+    return max(containing, key=lambda c: len(c.parts)) if containing else None
+
+
+def watch_components( build, components: list, jobs: int = 1
+                    , nb_shared_components: list = None, run_tests: bool = False
+                    ):
+    """Rebuild binary extension modules when their source files change, until interrupted with Ctrl-C.
+
+    Only the components whose source files changed, and the components depending on them, are rebuilt.
+    Bursts of changes (e.g. saving several files) are collected before rebuilding.
+
+    Args:
+        build: the BinaryExtensionBuilder.
+        components: the components to watch.
+        jobs: global job budget (see `job_budget`).
+        nb_shared_components: if not None, the C++ components which are built together with a shared nanobind
+            core library (see `BinaryExtensionBuilder.build_nanobind_shared`).
+        run_tests: run the tests of a component after rebuilding it.
+    """
+    cookiecutter_params = build.cookiecutter_params
+    project_path = Path(cookiecutter_params['project_path'])
+    components = [c for c in components if utils.component_type(c) in ('cpp', 'f90')]
+    dependents = {}
+    for path_to_component, dependencies in build.dependencies.items():
+        for dependency in dependencies:
+            dependents.setdefault(dependency, []).append(path_to_component)
+
+    with watcher.watcher(components) as watcher_:
+        click.secho( f"\nWatching {len(components)} binary extension module(s) for changes "
+                     f"({type(watcher_).__name__}). Press Ctrl-C to stop."
+                   , fg='bright_blue'
+                   )
+        try:
+            while True:
+                changes = watcher_.wait()
+                while True:
+                    more = watcher_.wait(timeout=WATCH_DEBOUNCE)
+                    if not more:
+                        break
+                    changes |= more
+                changed = {component_of(path, components) for path in changes if is_source_file(path)} - {None}
+                if not changed:
+                    continue
+                affected = with_dependencies(sorted(changed), dependents)
+
+                failures = {}
+                if nb_shared_components and any(utils.component_type(c) == 'cpp' for c in affected):
+                    failures = build.build_nanobind_shared(nb_shared_components, jobs=jobs)
+                failures.update(build.build_all(affected, jobs=jobs, keep_going=True))
+                if failures:
+                    report_failures(failures, cookiecutter_params, return_code=0)
+                if run_tests:
+                    for path_to_component in affected:
+                        path_to_tests = component_tests(cookiecutter_params, path_to_component)
+                        if path_to_component in failures or not path_to_tests:
+                            continue
+                        try:
+                            utils.subprocess_run_cmds( f"python -m pytest {path_to_tests.relative_to(project_path)}"
+                                                     , cwd=project_path, exit_on_failure=False
+                                                     )
+                        except subprocess.CalledProcessError:
+                            messages.warning_message(f"Tests of `{path_to_component.relative_to(project_path)}` failed.")
+        except KeyboardInterrupt:
+            click.secho("\nStopped watching.", fg='bright_blue')
+
+
+class BuildError(subprocess.CalledProcessError):
+    """Raised when building a binary extension module fails."""
+    def __str__(self):
+        return f"Command `{self.cmd}` failed (return code {self.returncode})"
+
+
+class DependencyError(BuildError):
+    """Raised for a component that is not built because a component it depends on failed to build."""
+    def __init__(self, dependency: Path):
+        super().__init__(0, '')
+        self.dependency = dependency
+
+    def __str__(self):
+        return f"Not built, because its dependency `{self.dependency.name}` failed to build"
 
 
 class BinaryExtensionBuilder:
-    """A functor for building binary extension modules."""
-    def __init__(self, cookiecutter_params):
+    """A functor for building binary extension modules.
+
+    Args:
+        cookiecutter_params: the parameters of the project (see `utils.read_wip_cookiecutter_json`).
+        python: the Python interpreter to build for (see `running_python`), by default the one found by `wip env`
+            (see `python_interpreter`).
+    """
+    def __init__(self, cookiecutter_params, python: dict = None):
         self.cookiecutter_params = cookiecutter_params
         self.f90_flag = False
         self.cpp_flag = False
+        self.parallel = 1            # number of compiler jobs per component
+        self.capture_output = False  # capture the output of the build commands (for concurrent builds)
+        self.build_type = 'Release'
+        self.force = False           # build even if the component is up to date
+        self.generator = ''          # CMake generator, empty for CMake's default
+        self.compiler_launcher = ''  # path to ccache or sccache, empty for none
+        self.nanobind_shared = False # C++ components are linked against a shared nanobind core library
+        self.timings = None          # if a dict, the build timings of every component are stored in it
+        self.pgo_generate = False    # build instrumented binary extension modules, for profile-guided optimization
+        self.profile = 'portable'    # build profile, see BUILD_PROFILES
+        self.fast_math = False       # add FAST_MATH_FLAGS to the build profile
+        self.dependencies = {}       # component dependency graph, see dependency_graph()
+        self.artifact_cache = None   # an ArtifactCache for restoring and storing binary extension modules, or None
+        self.stubs = True            # generate .pyi stub files for the binary extension modules, see stubs
+        self.python = python or python_interpreter()  # the Python interpreter to build for
+        self.python_pinned = python is not None       # the Python interpreter is not the one found by `wip env`
+        # the machine profile (see `wip env --hw`), or None
+        self.machine = hardware.load(Path(cookiecutter_params['project_path']))
+
+    def language(self, path_to_component: Path):
+        """Return the language of this component if it must be built, None otherwise."""
+        component_type = utils.component_type(path_to_component)
+        return 'C++'            if (component_type == 'cpp' and self.cpp_flag) else \
+               'Modern Fortran' if (component_type == 'f90' and self.f90_flag) else \
+               None
 
     def __call__(self, path_to_component: Path):
         """Build this component's binary extension module."""
-        component_type = utils.component_type(path_to_component)
-        language = 'C++'            if (component_type == 'cpp' and self.cpp_flag) else \
-                   'Modern Fortran' if (component_type == 'f90' and self.f90_flag) else \
-                   None
+        language = self.language(path_to_component)
         if language:
-            with messages.TaskInfo(
-                f"Building {language} binary extension `{path_to_component.relative_to(self.cookiecutter_params['project_path'])}`"
-            ):
+            component = path_to_component.relative_to(self.cookiecutter_params['project_path'])
+            fingerprint_ = self.fingerprint(path_to_component)
+            if not self.force and is_up_to_date(path_to_component, fingerprint_, self.python['ext_suffix']):
+                click.secho(f"\n{language} binary extension `{component}` is up to date.", fg='green')
+                self.update_stub(path_to_component, missing_only=True)
+                return
+            record = self.build_record(fingerprint_, path_to_component)
+            cacheable = self.is_cacheable(path_to_component)
+            key = ArtifactCache.key(fingerprint_, path_to_component.name) if cacheable else None
+            if cacheable and not self.force:
+                build_profile = self.artifact_cache.restore(key, path_to_component)
+                if build_profile is not None:
+                    click.secho( f"\n{language} binary extension `{component}` restored from the artifact cache."
+                               , fg='green'
+                               )
+                    write_build_record(path_to_component, record, build_profile, self.python['ext_suffix'])
+                    self.update_stub(path_to_component)
+                    return
+            with messages.TaskInfo(f"Building {language} binary extension `{component}` ({self.profile})"):
                 self.build_ext(path_to_component)
+            build_profile = self.build_profile(path_to_component)
+            write_build_record(path_to_component, record, build_profile, self.python['ext_suffix'])
+            path_to_extension = installed_extension(path_to_component, self.python['ext_suffix'])
+            if cacheable and path_to_extension:
+                self.artifact_cache.store(key, path_to_component, path_to_extension, build_profile)
+            self.update_stub(path_to_component)
+
+    def update_stub(self, path_to_component: Path, missing_only: bool = False):
+        """Generate the `.pyi` stub file of the installed binary extension module of a component, and write it if
+        the interface of the module changed (see `stubs.update_stub`).
+
+        Args:
+            path_to_component: path to the component.
+            missing_only: only generate the stub file if there is none (for components that are up to date).
+        """
+        path_to_extension = installed_extension(path_to_component, self.python['ext_suffix'])
+        if not self.stubs or not path_to_extension:
+            return
+        path_to_stub = stubs.path_to_stub(path_to_extension)
+        if missing_only and path_to_stub.is_file():
+            return
+        project_path = Path(self.cookiecutter_params['project_path'])
+        component = path_to_component.relative_to(project_path)
+        try:
+            if stubs.update_stub( project_path, path_to_component, utils.component_type(path_to_component)
+                                , path_to_extension, self.python['executable']
+                                ):
+                click.echo(f"Stub file of `{component}` updated: `{path_to_stub.relative_to(project_path)}`.")
+        except stubs.StubError as error:
+            messages.warning_message(f"No stub file generated for `{component}`:\n{error}")
+
+    def shares_nanobind(self, path_to_component: Path) -> bool:
+        """Test if a component is linked against the shared nanobind core library (see `build_nanobind_shared`).
+
+        Only C++ components are, Modern Fortran components built in the same run are built on their own.
+        """
+        return self.nanobind_shared and utils.component_type(path_to_component) == 'cpp'
+
+    def fingerprint(self, path_to_component: Path) -> str:
+        """Compute the fingerprint of a component build with the current build settings."""
+        settings = [self.build_type, self.profile, self.python['version'], self.python['ext_suffix']]
+        if self.shares_nanobind(path_to_component):
+            settings.append('nanobind-shared')
+        compile_flags, link_flags = self.flags(path_to_component)
+        if compile_flags or link_flags:
+            settings.extend([' '.join(compile_flags), ' '.join(link_flags)])
+            if not self.pgo_generate:
+                settings.append(profile_digest(self.profile_dir(path_to_component)))
+        if '-march=native' in compile_flags:
+            settings.append(native_target(compiler(path_to_component)))
+        definitions = machine_definitions(self.machine, utils.component_type(path_to_component) or 'cpp')
+        if definitions:
+            settings.append(' '.join(f"{variable}={value}" for variable, value in definitions.items()))
+        # a component must be rebuilt if a component it depends on changes
+        for dependency in self.dependencies.get(path_to_component, []):
+            settings.append(self.fingerprint(dependency))
+        return fingerprint(path_to_component, *settings)
+
+    def is_cacheable(self, path_to_component: Path) -> bool:
+        """Test if the binary extension module of a component may be restored from and stored in the artifact cache.
+
+        Instrumented builds (wip build --pgo) are not cached, their profile data are written to this project. Neither
+        are builds with `-march=native`, if it cannot be determined what it stands for on this machine (see
+        `native_target`).
+        """
+        if self.artifact_cache is None or self.pgo_generate:
+            return False
+        return '-march=native' not in self.flags(path_to_component)[0] \
+            or bool(native_target(compiler(path_to_component)))
+
+    def profile_dir(self, path_to_component: Path) -> Path:
+        """Return the directory where the profile data of a component are stored."""
+        build_profile = f"{self.profile}-fast-math" if self.fast_math else self.profile
+        return pgo_profile_dir(Path(self.cookiecutter_params['project_path']), path_to_component, build_profile)
+
+    def flags(self, path_to_component: Path) -> tuple:
+        """Return the extra (compile_flags, link_flags) for building a component.
+
+        These are the flags of the build profile, and, for components built on their own, the flags for
+        profile-guided optimization. `-march=native` is replaced by the architecture in the machine profile, if any.
+        """
+        compile_flags, link_flags = build_profile_flags(self.profile, self.fast_math)
+        # The nanobind-shared CMake project (see `build_nanobind_shared`) is not a component, it builds C++ components.
+        march = native_architecture(self.machine, utils.component_type(path_to_component) or 'cpp')
+        if march:
+            compile_flags = [f"-march={march}" if flag == '-march=native' else flag for flag in compile_flags]
+        if utils.component_type(path_to_component) in ('cpp', 'f90') and not self.shares_nanobind(path_to_component):
+            pgo_compile_flags, pgo_link_flags = \
+                pgo_flags(path_to_component, self.profile_dir(path_to_component), generate=self.pgo_generate)
+            compile_flags.extend(pgo_compile_flags)
+            link_flags.extend(pgo_link_flags)
+        return compile_flags, link_flags
+
+    def build_record(self, fingerprint_: str, path_to_component: Path) -> dict:
+        """Return the build record of a component built with the current build settings (see `write_build_record`).
+
+        The build settings are recorded, so that the fingerprint can be recomputed later, and the compiler and Python
+        versions, so that they can be checked without recomputing the fingerprint (see `wip info --status`).
+        """
+        return { 'fingerprint'    : fingerprint_
+               , 'build_type'     : self.build_type
+               , 'profile'        : self.profile
+               , 'fast_math'      : self.fast_math
+               , 'nanobind_shared': self.shares_nanobind(path_to_component)
+               , 'compiler'       : compiler_version(compiler(path_to_component))
+               , 'python'         : self.python['version']
+               }
+
+    def build_profile(self, path_to_component: Path) -> dict:
+        """Return the build profile of a component, as recorded next to its binary extension module."""
+        compile_flags, link_flags = self.flags(path_to_component)
+        return { 'profile'      : self.profile
+               , 'build_type'   : self.build_type
+               , 'compile_flags': compile_flags
+               , 'link_flags'   : link_flags
+               , 'compiler'     : compiler_version(compiler(path_to_component))
+               , 'python'       : self.python['version']
+               }
+
+    def build_pgo(self, path_to_component: Path, training_command: str):
+        """Build a component with profile-guided optimization.
+
+        This is done in three stages:
+
+        1. build an instrumented binary extension module,
+        2. run the training command, which writes the profile data (see `pgo_training_command`),
+        3. rebuild the binary extension module, optimized using the profile data.
+
+        The profile data are stored in the `.wip/pgo/<build profile>` directory of the project, and are used by all
+        later builds of the component with the same build profile, until they are regenerated with `wip build --pgo`.
+
+        Raises:
+            BuildError: if a build fails.
+        """
+        project_path = Path(self.cookiecutter_params['project_path'])
+        component = path_to_component.relative_to(project_path)
+        path_to_profile_dir = self.profile_dir(path_to_component)
+        self.force = True
+        self.cpp_flag = self.f90_flag = True
+
+        with messages.TaskInfo(f"Profile-guided optimization of `{component}`"):
+            # Stage 1: instrumented build, starting from scratch
+            shutil.rmtree(path_to_profile_dir, ignore_errors=True)
+            path_to_profile_dir.mkdir(parents=True)
+            self.pgo_generate = True
+            self(path_to_component)
+
+            # Stage 2: training
+            with messages.TaskInfo(f"Collecting profile data: `{training_command}`"):
+                utils.subprocess_run_cmds(training_command, cwd=project_path)
+            if is_clang(path_to_component):
+                profiles = ' '.join(str(p) for p in sorted(path_to_profile_dir.glob('*.profraw')))
+                utils.subprocess_run_cmds(f"llvm-profdata merge -output={CLANG_PROFDATA} {profiles}"
+                                         , cwd=path_to_profile_dir
+                                         )
+            self.pgo_generate = False
+            if not self.flags(path_to_component)[0]:
+                messages.warning_message(f"The training command did not produce profile data for `{component}`.")
+
+            # Stage 3: optimized build
+            self(path_to_component)
+
+    def build_all(self, components: list, jobs: int = 1, keep_going: bool = False) -> dict:
+        """Build a list of components, concurrently if `jobs > 1`.
+
+        Components are built after the components they depend on (see `self.dependencies`), components that do
+        not depend on each other are built concurrently. Components that depend on a component that failed to
+        build are not built.
+
+        Args:
+            components: list of paths to components. Components which are not selected for building are ignored.
+            jobs: global job budget, shared between concurrent component builds and the compiler. 0 means all
+                available cores.
+            keep_going: if False, stop building as soon as a component fails (pending builds are cancelled, running
+                builds are finished). Otherwise, build all components.
+
+        Returns:
+            a dict with (path_to_component, BuildError) pairs for the failed builds.
+        """
+        components = topological_order([c for c in components if self.language(c)], self.dependencies)
+        failures = {}
+        if not components:
+            return failures
+
+        workers, self.parallel = job_budget(jobs, len(components))
+        self.capture_output = workers > 1
+        # components that still have to be built, with the dependencies that are built in this call
+        pending = {c: {d for d in self.dependencies.get(c, []) if d in components} for c in components}
+        built = set()
+        stop = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while pending or running:
+                for path_to_component, dependencies in list(pending.items()):  # in topological order
+                    failed = [d for d in dependencies if d in failures]
+                    if failed:
+                        failures[path_to_component] = DependencyError(failed[0])
+                        del pending[path_to_component]
+                if not stop:
+                    ready = [c for c, dependencies in pending.items() if dependencies <= built]
+                    for path_to_component in ready[:workers - len(running)]:
+                        running[executor.submit(self, path_to_component)] = path_to_component
+                        del pending[path_to_component]
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    path_to_component = running.pop(future)
+                    try:
+                        future.result()
+                        built.add(path_to_component)
+                    except BuildError as error:
+                        failures[path_to_component] = error
+                        stop = stop or not keep_going
+        return failures
+
+    def build_nanobind_shared(self, components: list, jobs: int = 1) -> dict:
+        """Build C++ components together, against a shared nanobind core library and with a shared precompiled header.
+
+        The nanobind core library is built once per project, rather than once per component, and installed in
+        the package directory as a shared library, which is loaded only once, however many components are
+        imported.
+
+        Args:
+            components: list of paths to all C++ components of the project.
+            jobs: job budget for the compiler. 0 means all available cores.
+
+        Returns:
+            a dict with a (path to the CMake project, BuildError) pair if the build failed, empty otherwise.
+        """
+        project_path = Path(self.cookiecutter_params['project_path'])
+        package_path = project_path / self.cookiecutter_params['package_name']
+        if not components:
+            return {}
+
+        # Module names are CMake target names, which must be unique within a CMake project.
+        names = [c.name for c in components]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            messages.error_message( f"C++ components with the same name cannot be built with a shared nanobind core "
+                                    f"library: {', '.join(duplicates)}."
+                                  )
+
+        self.nanobind_shared = True
+        fingerprints = {c: self.fingerprint(c) for c in components}
+        if not self.force and all(is_up_to_date(c, fp, self.python['ext_suffix']) for c, fp in fingerprints.items()):
+            click.secho("\nC++ binary extensions (shared nanobind core library) are up to date.", fg='green')
+            for path_to_component in components:
+                self.update_stub(path_to_component, missing_only=True)
+            return {}
+
+        # Only write the CMakeLists.txt file if it changed, so that CMake is not reconfigured needlessly.
+        path_to_project = project_path / NANOBIND_SHARED
+        path_to_project.mkdir(parents=True, exist_ok=True)
+        path_to_cmakelists = path_to_project / 'CMakeLists.txt'
+        cmakelists = nanobind_shared_cmakelists(components, package_path, self.dependencies)
+        if not path_to_cmakelists.is_file() or path_to_cmakelists.read_text() != cmakelists:
+            path_to_cmakelists.write_text(cmakelists)
+
+        _, self.parallel = job_budget(jobs, 1)
+        self.capture_output = False
+        try:
+            with messages.TaskInfo(f"Building C++ binary extensions with a shared nanobind core library ({self.profile})"):
+                self.build_ext(path_to_project)
+        except BuildError as error:
+            return {path_to_project: error}
+
+        for path_to_component, fingerprint_ in fingerprints.items():
+            write_build_record( path_to_component, self.build_record(fingerprint_, path_to_component)
+                              , self.build_profile(path_to_component), self.python['ext_suffix']
+                              )
+            self.update_stub(path_to_component)
+        return {}
+
+    def configure_stamp(self, path_to_component: Path) -> dict:
+        """The settings which, when changed, require the CMake configure step to be rerun."""
+        compile_flags, link_flags = self.flags(path_to_component)
+        # The nanobind-shared CMake project (see `build_nanobind_shared`) is not a component, it builds C++ components.
+        component_type = utils.component_type(path_to_component) or 'cpp'
+        return { 'build_type': self.build_type
+               , 'compile_flags': compile_flags
+               , 'link_flags': link_flags
+               , 'dependency_dirs': dependency_dirs(path_to_component, self.dependencies)
+               , 'generator' : self.generator
+               , 'launcher'  : self.compiler_launcher
+               , 'cmake'     : shutil.which('cmake')
+               , 'python'    : self.python['executable']
+               , 'CC'        : os.environ.get('CC', '')
+               , 'CXX'       : os.environ.get('CXX', '')
+               , 'FC'        : os.environ.get('FC', '')
+               , 'toolchain' : toolchain_definitions( component_type, self.generator
+                                                    , self.python['executable'] if self.python_pinned else ''
+                                                    )
+               , 'machine'   : machine_definitions(self.machine, component_type)
+               }
 
     def build_ext(self, path_to_component):
-        """Build binary extension module."""
+        """Build binary extension module.
+
+        The CMake configure step is skipped if the build directory `_cmake_build` is still valid (unless `self.force`
+        is set, which also rebuilds all targets from scratch).
+        """
+        stamp = self.configure_stamp(path_to_component)
+        path_to_stamp = path_to_component / '_cmake_build' / CONFIGURE_STAMP
+        configure = self.force or not configure_is_valid(path_to_component, stamp)
+        clean_first = ' --clean-first' if self.force else ''
         cmds = [
-            "cmake -S . -B _cmake_build",
-            "cmake --build _cmake_build",
+            f"cmake --build _cmake_build --parallel {self.parallel}{clean_first}",
             "cmake --install _cmake_build"
         ]
-        with utils.in_directory(path_to_component):
-            utils.subprocess_run_cmds(cmds)
\ No newline at end of file
+        if configure:
+            clear_generator(path_to_component / '_cmake_build', self.generator)  # before the stamp is removed
+            path_to_stamp.unlink(missing_ok=True)
+            generator = f' -G "{self.generator}"' if self.generator else ''
+            compile_flags, link_flags = stamp['compile_flags'], stamp['link_flags']
+            toolchain_flags = ''.join(f" {shlex.quote(f'-D{variable}={value}')}"
+                                      for variable, value in {**stamp['toolchain'], **stamp['machine']}.items())
+            cmds.insert(0, f"cmake -S . -B _cmake_build{generator} -DCMAKE_BUILD_TYPE={self.build_type}"
+                           f" --no-warn-unused-cli{toolchain_flags}"
+                           f" {shlex.quote('-DWIP_COMPILER_LAUNCHER=' + self.compiler_launcher)}"
+                           f" {shlex.quote('-DWIP_COMPILE_FLAGS=' + shlex.join(compile_flags))}"
+                           f" {shlex.quote('-DWIP_LINK_FLAGS=' + shlex.join(link_flags))}"
+                           f" {shlex.quote('-DWIP_DEPENDENCY_DIRS=' + ';'.join(stamp['dependency_dirs']))}")
+        kwargs = {'capture_output': True, 'text': True} if self.capture_output else {}
+        timings = None
+        if self.timings is not None:
+            timings = []
+            ninja_log_before = ninja_log(path_to_component / '_cmake_build')
+        path_to_stats_log = None
+        if Path(self.compiler_launcher).stem == 'ccache':
+            # Let ccache log the result of every compilation of this component.
+            path_to_stats_log = path_to_component / '_cmake_build' / 'wip-ccache-stats.log'
+            path_to_stats_log.unlink(missing_ok=True)
+            kwargs['env'] = {**os.environ, 'CCACHE_STATSLOG': str(path_to_stats_log)}
+        try:
+            utils.subprocess_run_cmds(cmds, cwd=path_to_component, exit_on_failure=False, timings=timings, **kwargs)
+        except subprocess.CalledProcessError as error:
+            raise BuildError(error.returncode, error.cmd, output=error.output, stderr=error.stderr)
+        finally:
+            if path_to_stats_log:
+                report_cache_statistics( f"ccache `{path_to_component.relative_to(self.cookiecutter_params['project_path'])}`"
+                                       , *ccache_statistics(path_to_stats_log)
+                                       )
+        if configure:
+            with open(path_to_stamp, mode='w') as fp:
+                json.dump(stamp, fp, indent=2)
+        if timings is not None:
+            component = str(path_to_component.relative_to(self.cookiecutter_params['project_path']))
+            ninja_log_after = ninja_log(path_to_component / '_cmake_build')
+            self.timings[component] = phase_timings(timings, ninja_log_timings(ninja_log_before, ninja_log_after))
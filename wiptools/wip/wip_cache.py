@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import sysconfig
+import uuid
+
+import click
+
+import wiptools.messages as messages
+from wiptools.utils import format_size, parse_size
+
+
+def wip_cache(ctx: click.Context):
+    """Manage the artifact cache of binary extension modules."""
+    cache = ArtifactCache()
+    if ctx.info_name == 'stats':
+        stats = cache.stats()
+        print(f"Location : {cache.path}")
+        print(f"Entries  : {stats['entries']}")
+        print(f"Size     : {format_size(stats['size'])} (limit {format_size(cache.max_size)})")
+        if stats['entries']:
+            print(f"Oldest   : {stats['oldest']}")
+            print(f"Newest   : {stats['newest']}")
+            print("Components:")
+            for component, (n, size) in sorted(stats['components'].items()):
+                print(f"  {component}: {n} artifact(s), {format_size(size)}")
+
+    elif ctx.info_name == 'prune':
+        if ctx.params['all']:
+            max_size = 0
+        elif ctx.params['max_size'] is not None:
+            max_size = parse_size(ctx.params['max_size'])
+        else:
+            max_size = cache.max_size
+        n, freed = cache.prune(max_size)
+        click.secho(f"Removed {n} artifact(s) from the cache, freed {format_size(freed)}.", fg='green')
+
+
+DEFAULT_MAX_SIZE = 2 * 1024**3
+"""Default maximum size of the artifact cache (2 GiB)."""
+
+EXT_SUFFIX = sysconfig.get_config_var('EXT_SUFFIX')
+"""Filename suffix of binary extension modules for this Python version (including the ABI tag)."""
+
+
+def default_cache_path() -> Path:
+    """Return the location of the artifact cache.
+
+    This is `$WIP_ARTIFACT_CACHE` if set, otherwise `$XDG_CACHE_HOME/wip/artifacts`, or `~/.cache/wip/artifacts`.
+    """
+    if os.environ.get('WIP_ARTIFACT_CACHE'):
+        return Path(os.environ['WIP_ARTIFACT_CACHE'])
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'wip' / 'artifacts'
+
+
+class ArtifactCache:
+    """A user-level, content-addressed cache of built binary extension modules.
+
+    The cache is shared by all checkouts (and worktrees) of all projects of the user. Every entry is a directory
+    containing the binary extension module and a `meta.json` file, which also contains the build profile (see
+    `wip build --profile`). The modification time of `meta.json` is the time the entry was last used, and the least
+    recently used entries are removed when the cache grows larger than its maximum size.
+
+    Entries are written to a temporary directory first, and then renamed, so that concurrent builds never see
+    incomplete entries.
+    """
+    def __init__(self, path: Path = None, max_size: int = None):
+        self.path = Path(path) if path else default_cache_path()
+        if max_size is None:
+            max_size = parse_size(os.environ['WIP_ARTIFACT_CACHE_SIZE']) if os.environ.get('WIP_ARTIFACT_CACHE_SIZE') \
+                       else DEFAULT_MAX_SIZE
+        self.max_size = max_size
+
+    @staticmethod
+    def key(fingerprint: str, module_name: str) -> str:
+        """Compute the key of an artifact.
+
+        Args:
+            fingerprint: the fingerprint of the component build, which covers the contents of its source files,
+                the compiler identity, the Python version, and the build settings, including the build profile,
+                and, for builds with `-march=native`, the CPU of the build machine.
+            module_name: name of the binary extension module.
+        """
+        return hashlib.sha256(f"{fingerprint}\0{module_name}\0{EXT_SUFFIX}".encode()).hexdigest()
+
+    def entry(self, key: str) -> Path:
+        """Return the directory of the cache entry with this key."""
+        return self.path / key[:2] / key
+
+    def restore(self, key: str, path_to_component: Path):
+        """Install a cached binary extension module for a component.
+
+        Returns:
+            the build profile of the installed binary extension module (a dict), or None if the artifact is not in
+            the cache.
+        """
+        path_to_entry = self.entry(key)
+        try:
+            with open(path_to_entry / 'meta.json') as fp:
+                meta = json.load(fp)
+            path_to_extension = path_to_component.parent / meta['extension']
+            tmp = path_to_extension.with_name(f".{path_to_extension.name}.{uuid.uuid4().hex}")
+            shutil.copyfile(path_to_entry / path_to_extension.name, tmp)
+            os.replace(tmp, path_to_extension)  # atomic, a concurrent import never sees a partial file
+            os.utime(path_to_entry / 'meta.json')  # mark as recently used
+        except (FileNotFoundError, KeyError, json.JSONDecodeError):
+            return None
+        return meta.get('build_profile', {})
+
+    def store(self, key: str, path_to_component: Path, path_to_extension: Path, build_profile: dict = None):
+        """Store the binary extension module of a component in the cache, and evict old entries if necessary."""
+        path_to_entry = self.entry(key)
+        if path_to_entry.is_dir():
+            return
+        tmp = self.path / 'tmp' / uuid.uuid4().hex
+        tmp.mkdir(parents=True)
+        try:
+            shutil.copyfile(path_to_extension, tmp / path_to_extension.name)
+            with open(tmp / 'meta.json', mode='w') as fp:
+                json.dump( { 'component'    : path_to_component.name
+                           , 'extension'    : str(path_to_extension.relative_to(path_to_component.parent))
+                           , 'size'         : path_to_extension.stat().st_size
+                           , 'created'      : datetime.datetime.now().isoformat(timespec='seconds')
+                           , 'build_profile': build_profile or {}
+                           }
+                         , fp, indent=2
+                         )
+            path_to_entry.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(tmp, path_to_entry)
+        except OSError:
+            pass  # e.g. stored concurrently by another build
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.prune(self.max_size)
+
+    def entries(self) -> list:
+        """Return a list of (path_to_entry, meta, size, last_used) tuples, least recently used first."""
+        entries = []
+        if not self.path.is_dir():
+            return entries
+        for path_to_shard in self.path.iterdir():
+            if path_to_shard.name == 'tmp' or not path_to_shard.is_dir():
+                continue
+            for path_to_entry in path_to_shard.iterdir():
+                try:
+                    with open(path_to_entry / 'meta.json') as fp:
+                        meta = json.load(fp)
+                    last_used = (path_to_entry / 'meta.json').stat().st_mtime
+                    size = sum(p.stat().st_size for p in path_to_entry.iterdir())
+                except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                    continue
+                entries.append((path_to_entry, meta, size, last_used))
+        return sorted(entries, key=lambda entry: entry[3])
+
+    def stats(self) -> dict:
+        """Return statistics of the cache: number of entries, total size, and entries and size per component."""
+        entries = self.entries()
+        components = {}
+        for _, meta, size, _ in entries:
+            n, total = components.get(meta['component'], (0, 0))
+            components[meta['component']] = (n + 1, total + size)
+        stats = { 'entries'   : len(entries)
+                , 'size'      : sum(entry[2] for entry in entries)
+                , 'components': components
+                }
+        if entries:
+            stats['oldest'] = datetime.datetime.fromtimestamp(entries[0][3]).isoformat(timespec='seconds')
+            stats['newest'] = datetime.datetime.fromtimestamp(entries[-1][3]).isoformat(timespec='seconds')
+        return stats
+
+    def prune(self, max_size: int) -> tuple:
+        """Remove the least recently used entries until the cache is not larger than `max_size` bytes.
+
+        Returns:
+            a (number of removed entries, number of freed bytes) tuple.
+        """
+        entries = self.entries()
+        size = sum(entry[2] for entry in entries)
+        n = freed = 0
+        for path_to_entry, _, entry_size, _ in entries:
+            if size <= max_size:
+                break
+            shutil.rmtree(path_to_entry, ignore_errors=True)
+            size -= entry_size
+            freed += entry_size
+            n += 1
+        return n, freed
@@ -1,27 +1,43 @@
 # -*- coding: utf-8 -*-
 
-import os
 from pathlib import Path
-import shutil
-import subprocess
 
 import click
-from cookiecutter.main import cookiecutter
 
+import wiptools.docs_sync as docs_sync
 import wiptools.messages as messages
+from wiptools.project_state import ProjectState
+import wiptools.templates as templates
 import wiptools.utils as utils
 
 
-def wip_docs(ctx: click.Context):
-    """Add project documentation"""
+def wip_docs(ctx: click.Context, project: ProjectState = None):
+    """Add project documentation
 
-    cookiecutter_params = utils.read_wip_cookiecutter_json()
-    package_name = cookiecutter_params['package_name']
+    Args:
+        ctx: the click context of `wip docs` or `wip init`.
+        project: the state of the project, if the calling command already opened it (`wip init`). Otherwise, the
+            project state is opened here, and committed at the end.
+    """
+    if project is None:
+        with ProjectState() as project:
+            return wip_docs(ctx, project)
+
+    cookiecutter_params = project.cookiecutter_params
 
     # Verify that the project is not already configured for documentation generation:
     docs_path = Path.cwd() / 'docs'
     docs_format = 'markdown'         if (docs_path / 'index.md' ).is_file() else \
                   'restructuredText' if (docs_path / 'index.rst').is_file() else ''
+    if ctx.params.get('sync'):
+        if docs_format == 'markdown':
+            sync_docs(project)
+            return
+        if not ctx.params['md']:
+            messages.warning_message( f"Project {cookiecutter_params['project_name']} is not configured for "
+                                      f"documentation generation with mkdocs (use '--md')."
+                                    )
+            return
     if docs_format:
         messages.warning_message( f"Project {cookiecutter_params['project_name']} is already configured \n"
                                   f"for documentation generation ({docs_format} format)."
@@ -50,56 +66,21 @@ def wip_docs(ctx: click.Context):
         template = str(utils.cookiecutters() / template)
 
     with messages.TaskInfo(f"Expanding cookiecutter template `{template}`"):
-        cookiecutter( template=template
-                    , extra_context=cookiecutter_params
-                    , output_dir=Path.cwd().parent
-                    , no_input=True
-                    , overwrite_if_exists=True
-                    )
-
-    # iterate over all components and add them to `docs/api-reference.md`
-    with messages.TaskInfo(f"Adding documentation for components "):
-        utils.iter_components(
-            Path.cwd() / cookiecutter_params['package_name'],
-            apply=AddComponentDocumentation(cookiecutter_params)
-        )
-
-class AddComponentDocumentation:
-    """A Functor for adding documentation generation skeleton."""
-    def __init__(self, cookiecutter_params):
-        self.cookiecutter_params = cookiecutter_params
-        self.project_path = Path(self.cookiecutter_params['project_path'])
-        self.path_to_api_refence_md = self.project_path / 'docs' / 'api-reference.md'
-
-    def __call__(self, path_to_component: Path):
-        """Add documentation generation skeleton for this component."""
-        component_type = utils.component_type(path_to_component)
-        if component_type == 'py':
-            self.add_docs_py(path_to_component)
-        elif component_type == 'cli':
-            self.add_docs_cli(path_to_component)
-        elif component_type == 'cp':
-            self.add_docs_cpp(path_to_component)
-        elif component_type == 'f90':
-            self.add_docs_f90(path_to_component)
-
-    def add_docs_py(self, path_to_component):
-        """Add documentation generation skeleton for a python module."""
-        with messages.TaskInfo(f"Adding `{path_to_component.relative_to(self.project_path)}` documentation (Python module)."):
-            with self.path_to_api_refence_md.open(mode='a') as fp:
-                p = str(path_to_component.relative_to(self.project_path)).replace(os.sep, '.')
-                fp.write(f'\n\n::: {p}')
-
-    def add_docs_cli(self, path_to_component):
-        """Add documentation generation skeleton for a CLI."""
-        with messages.TaskInfo(f"Adding `{path_to_component.relative_to(self.project_path)}` documentation (CLI)."):
-            messages.warning_message("to be implemented!\n")
-    def add_docs_cpp(self, path_to_component):
-        """Add documentation generation skeleton for a C++ module"""
-        with messages.TaskInfo(f"Adding `{path_to_component.relative_to(self.project_path)}` documentation (C++)."):
-            messages.warning_message("to be implemented!\n")
-
-    def add_docs_f90(self, path_to_component):
-        """Add documentation generation skeleton for a Fortran module"""
-        with messages.TaskInfo(f"Adding `{path_to_component.relative_to(self.project_path)}` documentation (Modern Fortran)."):
-            messages.warning_message("to be implemented!\n")
+        templates.expand( template=template
+                        , extra_context=cookiecutter_params
+                        , output_dir=Path.cwd().parent
+                        , overwrite_if_exists=True
+                        )
+
+    sync_docs(project)
+
+
+def sync_docs(project: ProjectState):
+    """Synchronize the API reference with the components of the project (see `docs_sync`)."""
+    with messages.TaskInfo("Synchronizing the API reference with the components"):
+        result = docs_sync.sync(project)
+        for module in result['written']:
+            click.echo(f"  updated `{docs_sync.PAGES.as_posix()}/{module}.md`")
+        for module in result['removed']:
+            click.echo(f"  removed `{docs_sync.PAGES.as_posix()}/{module}.md`")
+        click.echo(f"  {result['unchanged']} page(s) unchanged.")
@@ -1,26 +1,77 @@
 # -*- coding: utf-8 -*-
 import json
 from pathlib import Path
-import subprocess
 
 import click
 
-import wiptools.messages as messages
+import wiptools.hardware as hardware
+import wiptools.toolchain as toolchain
+from wiptools.utils import format_size
+
+
+NEEDED_FOR = { 'python'     : 'everything'
+             , 'git'        : 'version control'
+             , 'gh'         : 'remote GitHub repositories'
+             , 'bumpversion': 'bumping version numbers'
+             , 'cmake'      : 'building binary extension modules'
+             , 'c++'        : 'C++ binary extension modules'
+             , 'gfortran'   : 'Modern Fortran binary extension modules'
+             , 'nanobind'   : 'C++ binary extension modules'
+             , 'f2py'       : 'Modern Fortran binary extension modules'
+             , 'ninja'      : 'faster builds (optional)'
+             , 'ccache'     : 'compiler cache (optional)'
+             , 'sccache'    : 'compiler cache (optional)'
+             }
+"""What the tools in `toolchain.TOOLS` are needed for."""
 
 
 def wip_env(ctx: click.Context):
     """Check the current environment for necessary components."""
 
-    for cmd in ['python', 'git', 'gh']:
-        completed_process = subprocess.run([cmd, '--version'])
-        if completed_process.returncode:
-            messages.error_message(f"Command `{cmd}` is missing from the current environment.", return_code=0)
-
-    cmd = 'bumpversion'
-    completed_process = subprocess.run([cmd, '-h'], capture_output=True)
-    if not completed_process.returncode:
-        lines = completed_process.stdout.decode('utf-8').split('\n')
-        for line in lines:
-            if 'bumpversion:' in line:
-                print(line)
-                break
+    if ctx.params['hw']:
+        wip_env_hw(ctx)
+        return
+
+    results = toolchain.probe(refresh=ctx.params['refresh'])
+    if ctx.params['json']:
+        click.echo(json.dumps(results, indent=2))
+        return
+
+    width = max(len(name) for name in results)
+    for name, result in results.items():
+        if result['found']:
+            click.echo(f"{name:{width}}  {click.style(result['version'], fg='green')}  ({result['executable']})")
+        else:
+            color = 'cyan' if NEEDED_FOR[name].endswith('(optional)') else 'red'
+            click.echo(f"{name:{width}}  {click.style('not found', fg=color)}  (needed for {NEEDED_FOR[name]})")
+
+
+def wip_env_hw(ctx: click.Context):
+    """Detect the hardware capabilities of this machine, and store the machine profile in the project directory."""
+
+    profile = hardware.detect()
+    if ctx.params['json']:
+        click.echo(json.dumps(profile, indent=2))
+    else:
+        smt = f"{profile['threads_per_core']} threads per core" if profile['threads_per_core'] > 1 else 'no SMT'
+        click.echo(f"cpu        {profile['cpu']} ({profile['machine']})")
+        click.echo(f"cores      {profile['physical_cores']} physical cores, {profile['logical_cpus']} logical cpus "
+                   f"({smt}), {profile['sockets']} socket(s), {profile['available_cpus']} cpus available")
+        click.echo(f"SIMD       {click.style(profile['simd']['level'] or 'none', fg='green')}  "
+                   f"({' '.join(profile['simd']['instruction_sets'])})")
+        for cache in profile['caches']:
+            shared = f", shared by {cache['shared_by']} cpus" if cache['shared_by'] > 1 else ''
+            click.echo(f"cache      L{cache['level']} {cache['type']:11} {format_size(cache['size'])}{shared}")
+        click.echo(f"NUMA       {len(profile['numa_nodes']) or 1} node(s)"
+                   + ''.join(f", node{node['node']}: cpus {node['cpus']}" for node in profile['numa_nodes']))
+        for name, compiler in profile['compilers'].items():
+            openmp = click.style('OpenMP', fg='green') if compiler['openmp'] else click.style('no OpenMP', fg='red')
+            click.echo(f"{name:10} -march={compiler['march'] or 'native'}, {openmp}  ({compiler['executable']})")
+
+    project_path = Path.cwd()
+    if (project_path / 'wip-cookiecutter.json').is_file():
+        hardware.save(profile, project_path)
+        if not ctx.params['json']:
+            click.secho(f"Machine profile stored in `{hardware.PROFILE}`.", fg='green')
+    elif not ctx.params['json']:
+        click.secho("Not in a project directory, the machine profile is not stored.", fg='cyan')
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 import json
+import os
 from pathlib import Path
-from typing import Callable
 
 import click
 
-import wiptools.messages as messages
+import wiptools.component_index as component_index
 import wiptools.utils as utils
 
 
@@ -16,12 +16,29 @@ def wip_info(ctx: click.Context):
 
     project_path = Path.cwd()
     package_name = cookiecutter_params['package_name']
+    max_depth = ctx.params['depth']
+    components_only = ctx.params['components_only']
 
     # project version
     toml = utils.read_pyproject_toml()
     version    = toml['tool']['poetry']['version']
     repository = toml['tool']['poetry']['repository']
     homepage   = toml['tool']['poetry']['homepage']
+
+    if ctx.params['json']:
+        info = { 'project'   : project_path.name
+               , 'version'   : str(version)
+               , 'package'   : package_name
+               , 'repository': str(repository)
+               , 'homepage'  : str(homepage)
+               , 'location'  : str(project_path)
+               , 'structure' : tree_json(project_path / package_name, max_depth, components_only)
+               }
+        if ctx.params['status']:
+            info['status'] = build_status(cookiecutter_params)
+        click.echo(json.dumps(info, indent=2))
+        return
+
     print(f"Project    : {project_path.name}")
     print(f"Version    : {version}")
     print(f"Package    : {package_name}")
@@ -31,96 +48,233 @@ def wip_info(ctx: click.Context):
 
     # Package structure
     click.secho(f"\nStructure of Python package {package_name}", fg='bright_blue')
-    paths = DisplayablePath.make_tree(
-        project_path / package_name
-      , criteria=criteria
-    )
-    for path in paths:
-        click.echo('  ' + path.displayable())
+    for line in tree_lines(project_path / package_name, max_depth, components_only):
+        click.echo('  ' + line)
 
-def criteria(path: Path):
-    if path.is_dir():
-        return path.name != '__pycache__'
-    else:
-        return path.suffix in ['.py', '.cpp', '.f90', '.md', 'rst']
+    if ctx.params['status']:
+        report_build_status(build_status(cookiecutter_params), project_path)
+
+
+DISPLAYED_SUFFIXES = ('.py', '.cpp', '.f90', '.md', '.rst')
+"""Files with these suffixes are shown in the structure of the package."""
 
+PREFIX_MIDDLE = '├──'
+PREFIX_LAST   = '└──'
+INDENT_MIDDLE = '│   '
+INDENT_LAST   = '    '
 
-class DisplayablePath:
-    """Class for printing the tree structure of a python package.
 
-    Adapted from https://stackoverflow.com/questions/9727673/list-directory-tree-structure-in-python.
+def list_dir(path) -> list:
+    """Return the entries of a directory, sorted case-insensitively by name."""
+    with os.scandir(path) as it:
+        return sorted(it, key=lambda entry: entry.name.lower())
+
+
+def children(entries: list, components_only: bool = False) -> list:
+    """Select the entries of a directory which are shown in the structure of the package.
+
+    Build directories, `__pycache__` and hidden directories are not shown. Subdirectories are scanned once, here,
+    to determine their component type.
+
+    Args:
+        entries: the entries of the directory (see `list_dir`).
+        components_only: only select the component subdirectories.
+
+    Returns:
+        a list of (entry, component type, entries) tuples. For files, the component type and entries are None.
     """
-    display_filename_prefix_middle = '├──'
-    display_filename_prefix_last = '└──'
-    display_parent_prefix_middle = '    '
-    display_parent_prefix_last = '│   '
-
-    def __init__(self, path: Path, parent_path: Path, is_last: bool):
-        self.path = Path(str(path))
-        self.parent = parent_path
-        self.is_last = is_last
-        if self.parent:
-            self.depth = self.parent.depth + 1
+    selected = []
+    for entry in entries:
+        if entry.is_dir():
+            if component_index.skip_dir(entry.name):
+                continue
+            child_entries = list_dir(entry.path)
+            component_type = component_index.directory_type([e.name for e in child_entries])
+            if components_only and not component_type:
+                continue
+            selected.append((entry, component_type, child_entries))
+        elif not components_only and os.path.splitext(entry.name)[1] in DISPLAYED_SUFFIXES:
+            selected.append((entry, None, None))
+    return selected
+
+
+def directory_label(path: Path, component_type: str) -> str:
+    """The label of a directory in the structure of the package: its name and its component type."""
+    return click.style(utils.component_string(path, component_type or '?'), fg='blue')
+
+
+def tree_lines(path: Path, max_depth: int = None, components_only: bool = False):
+    """Generate the lines of the tree structure of a package, as the directory tree is scanned.
+
+    Every directory is scanned only once, and every line costs O(1), regardless of its depth.
+
+    Args:
+        path: path to the package directory.
+        max_depth: only show entries up to this depth below the package directory (None for all).
+        components_only: only show components.
+    """
+    entries = list_dir(path)
+    yield directory_label(path, component_index.directory_type([e.name for e in entries]))
+    yield from _tree_lines(entries, '', 1, max_depth, components_only)
+
+
+def _tree_lines(entries: list, indent: str, depth: int, max_depth: int, components_only: bool):
+    if max_depth is not None and depth > max_depth:
+        return
+    selected = children(entries, components_only)
+    for i, (entry, component_type, child_entries) in enumerate(selected):
+        is_last = i == len(selected) - 1
+        prefix = PREFIX_LAST if is_last else PREFIX_MIDDLE
+        if child_entries is None:
+            yield f"{indent}{prefix} {click.style(entry.name, fg='cyan')}"
         else:
-            self.depth = 0
-
-    @property
-    def displayname(self):
-        if self.path.is_dir():
-            component_string = utils.component_string(self.path)
-            return click.style(component_string, fg='blue')
-        return click.style(self.path.name, fg='cyan')
-
-    @classmethod
-    def make_tree( cls,
-        root: Path,
-        parent: Path=None,
-        is_last: bool=False,
-        criteria: Callable=None
-    ):
-        """Create a generator that produces a tree structure of a python package."""
-        root = Path(str(root))
-        criteria = criteria or cls._default_criteria
-
-        displayable_root = cls(root, parent, is_last)
-        yield displayable_root
-
-        children = sorted(
-            list(path for path in root.iterdir() if criteria(path)),
-            key=lambda s: str(s).lower()
-        )
-        count = 1
-        for path in children:
-            is_last = count == len(children)
-            if path.is_dir():
-                yield from cls.make_tree(path,
-                                         parent=displayable_root,
-                                         is_last=is_last,
-                                         criteria=criteria)
-            else:
-                yield cls(path, displayable_root, is_last)
-            count += 1
-
-    @classmethod
-    def _default_criteria(cls, path: Path):
-        return True
-
-    def displayable(self):
-        if self.parent is None:
-            return self.displayname
-
-        _filename_prefix = (self.display_filename_prefix_last
-                            if self.is_last
-                            else self.display_filename_prefix_middle)
-
-        parts = ['{!s} {!s}'.format(_filename_prefix,
-                                    self.displayname)]
-
-        parent = self.parent
-        while parent and parent.parent is not None:
-            parts.append(self.display_parent_prefix_middle
-                         if parent.is_last
-                         else self.display_parent_prefix_last)
-            parent = parent.parent
-
-        return ''.join(reversed(parts))
+            yield f"{indent}{prefix} {directory_label(Path(entry.path), component_type)}"
+            yield from _tree_lines( child_entries, indent + (INDENT_LAST if is_last else INDENT_MIDDLE)
+                                  , depth + 1, max_depth, components_only
+                                  )
+
+
+def tree_json(path: Path, max_depth: int = None, components_only: bool = False) -> dict:
+    """Return the tree structure of a package as a dict (see `tree_lines`).
+
+    Directories are represented as `{"name": ..., "type": ..., "path": ..., "children": [...]}`, with `type` the
+    component type (`cpp`, `f90`, `py`, `cli`) or `dir`, and `path` relative to the package's parent directory.
+    Files are represented as `{"name": ..., "type": "file"}`. Directories at the maximum depth have no `children`.
+    """
+    entries = list_dir(path)
+    return _tree_json( path, path.parent, component_index.directory_type([e.name for e in entries]), entries
+                     , 1, max_depth, components_only
+                     )
+
+
+def _tree_json( path: Path, root: Path, component_type: str, entries: list
+              , depth: int, max_depth: int, components_only: bool
+              ) -> dict:
+    node = {'name': path.name, 'type': component_type or 'dir', 'path': path.relative_to(root).as_posix()}
+    if max_depth is not None and depth > max_depth:
+        return node
+    node['children'] = [
+        {'name': entry.name, 'type': 'file'} if child_entries is None else
+        _tree_json(Path(entry.path), root, child_type, child_entries, depth + 1, max_depth, components_only)
+        for entry, child_type, child_entries in children(entries, components_only)
+    ]
+    return node
+
+
+# Build status #########################################################################################################
+STATUS_COLORS = { 'up to date': 'green', 'stale': 'yellow', 'modified': 'yellow', 'unknown': 'yellow'
+                , 'missing': 'red', 'other ABI': 'red'
+                }
+"""Colors of the build statuses of binary extension modules (see `component_status`)."""
+
+
+def build_status(cookiecutter_params: dict) -> list:
+    """Return the build status of all binary extension modules of the project (see `component_status`)."""
+    import wiptools.wip.wip_build as wip_build  # only needed with --status
+    package_path = Path(cookiecutter_params['project_path']) / cookiecutter_params['package_name']
+    dependencies = wip_build.dependency_graph(package_path, wip_build.pyproject_build_config().get('dependencies', {}))
+    return [ component_status(cookiecutter_params, path_to_component, dependencies)
+             for path_to_component, component_type in component_index.components(package_path).items()
+             if component_type in ('cpp', 'f90')
+           ]
+
+
+def versions_match(record: dict, path_to_component: Path) -> bool:
+    """Test if the compiler and Python versions in the build record of a component are the current ones.
+
+    (Build records written by earlier versions of wip have no compiler and Python versions.)
+    """
+    import wiptools.wip.wip_build as wip_build  # only needed with --status
+    if 'compiler' in record and record['compiler'] != wip_build.compiler_version(wip_build.compiler(path_to_component)):
+        return False
+    return 'python' not in record or record['python'] == wip_build.python_interpreter()['version']
+
+
+def component_status(cookiecutter_params: dict, path_to_component: Path, dependencies: dict = None) -> dict:
+    """Determine the build status of the binary extension module of a component.
+
+    The status is one of:
+
+    * `missing`: there is no binary extension module.
+    * `other ABI`: there is only a binary extension module for another Python version or ABI.
+    * `unknown`: there is no build record, e.g. because the binary extension module was built before `wip build`
+      kept build records.
+    * `modified`: the binary extension module is not the one recorded by the last `wip build`.
+    * `stale`: the sources of the component, or of the components it depends on, changed since the last build,
+      or the compiler or the Python version changed.
+    * `up to date`.
+
+    This is cheap: the compiler and Python versions in the build record are compared with the current ones, which
+    are taken from the cached probe results (see `toolchain.probe`), and the fingerprint of the component (see
+    `BinaryExtensionBuilder.fingerprint`) is only computed if source files were modified after the binary extension
+    module was built.
+
+    Returns:
+        a dict with the component (relative to the project directory), its status, and the file name, size, build
+        profile, build type and build time of its binary extension module (if any).
+    """
+    import wiptools.wip.wip_build as wip_build  # only needed with --status
+    project_path = Path(cookiecutter_params['project_path'])
+    dependencies = dependencies or {}
+    status = {'component': path_to_component.relative_to(project_path).as_posix(), 'status': 'missing'}
+    path_to_extension = wip_build.installed_extension(path_to_component)
+    if not path_to_extension:
+        others = sorted( p.name for directory in (path_to_component, path_to_component.parent)
+                         for p in directory.glob(f"{path_to_component.name}.*")
+                         if p.suffix in ('.so', '.pyd')
+                       )
+        if others:
+            status.update({'status': 'other ABI', 'extension': others[0]})
+        return status
+
+    stat = path_to_extension.stat()
+    record = wip_build.read_build_record(path_to_component)
+    status.update(
+      { 'extension' : path_to_extension.name
+      , 'size'      : stat.st_size
+      , 'profile'   : record.get('profile', '') + ('+fast-math' if record.get('fast_math') else '')
+      , 'build_type': record.get('build_type', '')
+      , 'built'     : record.get('built', '')
+      }
+    )
+    if not record.get('fingerprint'):
+        status['status'] = 'unknown'
+    elif record.get('size') != stat.st_size or record.get('mtime_ns') != stat.st_mtime_ns:
+        status['status'] = 'modified'
+    elif not versions_match(record, path_to_component):
+        status['status'] = 'stale'
+    else:
+        status['status'] = 'up to date'
+        sources = [ p for c in wip_build.with_dependencies([path_to_component], dependencies)
+                    for p in wip_build.source_files(c)
+                  ]
+        if any(p.stat().st_mtime_ns > stat.st_mtime_ns for p in sources):
+            # Only now the fingerprint is computed, as the modified sources may have the same contents.
+            build = wip_build.BinaryExtensionBuilder(cookiecutter_params)
+            build.build_type      = record.get('build_type', 'Release')
+            build.profile         = record.get('profile', 'portable')
+            build.fast_math       = record.get('fast_math', False)
+            build.nanobind_shared = record.get('nanobind_shared', False)
+            build.dependencies    = dependencies
+            if build.fingerprint(path_to_component) != record['fingerprint']:
+                status['status'] = 'stale'
+    return status
+
+
+def report_build_status(statuses: list, project_path: Path):
+    """Print the build status of the binary extension modules (see `build_status`) as a table."""
+    click.secho(f"\nBuild status of binary extension modules", fg='bright_blue')
+    if not statuses:
+        click.echo("  (no binary extension modules)")
+        return
+    width = max(len(status['component']) for status in statuses)
+    for status in statuses:
+        state = click.style(f"{status['status']:10}", fg=STATUS_COLORS[status['status']])
+        columns = [f"{status['component']:{width}}", state]
+        if 'size' in status:
+            columns += [ f"{utils.format_size(status['size']):>10}", f"{status['profile'] or '--':24}"
+                       , f"{status['build_type'] or '--':14}", status['built'] or '--'
+                       ]
+        elif 'extension' in status:
+            columns.append(status['extension'])
+        click.echo('  ' + '  '.join(columns))
@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
-import json
 from pathlib import Path
 import shutil
 import subprocess
 
 import click
-from cookiecutter.main import cookiecutter
 
 from wiptools.wip.wip_docs import wip_docs
 import wiptools.messages as messages
+from wiptools.project_state import ProjectState
+import wiptools.templates as templates
 import wiptools.utils as utils
 
 def wip_init(ctx: click.Context):
@@ -71,42 +71,40 @@ def wip_init(ctx: click.Context):
 
     template = str(utils.cookiecutters() / 'project')
     with messages.TaskInfo(f"Expanding cookiecutter template `{template}`"):
-        cookiecutter( template=template
-                    , extra_context=cookiecutter_params
-                    , output_dir=Path.cwd()
-                    , no_input=True
-                    )
-
-    # write cookiecutter parameters to cookiecutter.json in project folder for use by subsequent wip commands:
-    with open(project_path / 'wip-cookiecutter.json', mode='w') as fp:
-        json.dump(cookiecutter_params, fp, indent=2)
-
-    # add documentation files if requested
-    add_docs = ctx.params['md'] or ctx.params['rst']
-    if not add_docs:
-        # ask the user if we must configure the project for documentation generation:
-        answer = messages.ask("Add documentation templates? press \n"
-                              "  [enter] for no,\n"
-                              "  [m] for markdown format,\n"
-                              "  [r] for restructuredText format"
-                             , default=''
-                             )
-        if answer:
-            if answer == 'm':
-                ctx.params['md'] = True
-            if answer == 'r':
-                ctx.params['rst'] = True
-            add_docs = ctx.params['md'] or ctx.params['rst']
-
-    if add_docs:
-        with utils.in_directory(project_path):
-            wip_docs(ctx)
-
-    if not cookiecutter_params['github_username'] or ctx.params['remote_visibility']:
-        with utils.in_directory(project_path):
-            with utils.PyProjectTOML("rw") as pyproject:
-                pyproject.toml['tool']['poetry']['repository'] = r""
-                pyproject.toml['tool']['poetry']['homepage']   = r""
+        templates.expand( template=template
+                        , extra_context=cookiecutter_params
+                        , output_dir=Path.cwd()
+                        )
+
+    # All modifications of pyproject.toml, wip-cookiecutter.json and the documentation are committed at once.
+    with ProjectState(project_path) as project:
+        # write cookiecutter parameters to cookiecutter.json in project folder for use by subsequent wip commands:
+        project.cookiecutter_params = cookiecutter_params
+
+        # add documentation files if requested
+        add_docs = ctx.params['md'] or ctx.params['rst']
+        if not add_docs:
+            # ask the user if we must configure the project for documentation generation:
+            answer = messages.ask("Add documentation templates? press \n"
+                                  "  [enter] for no,\n"
+                                  "  [m] for markdown format,\n"
+                                  "  [r] for restructuredText format"
+                                 , default=''
+                                 )
+            if answer:
+                if answer == 'm':
+                    ctx.params['md'] = True
+                if answer == 'r':
+                    ctx.params['rst'] = True
+                add_docs = ctx.params['md'] or ctx.params['rst']
+
+        if add_docs:
+            with utils.in_directory(project_path):
+                wip_docs(ctx, project)
+
+        if not cookiecutter_params['github_username'] or ctx.params['remote_visibility']:
+            project.pyproject['tool']['poetry']['repository'] = r""
+            project.pyproject['tool']['poetry']['homepage']   = r""
 
     # Take care of git version control
     with utils.in_directory(project_path):